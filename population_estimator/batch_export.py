@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+
+"""
+Module for exporting the Annual Estimates of the Resident Population to CSV
+or JSON Lines files without the text-based user interface.
+
+To export the counties sorted by compound annual growth rate:
+
+    $ python batch_export.py export --division county --sort cagr --out counties
+
+To export the counties sorted by their 2030 population estimates projected from
+log-linear trends fitted to every year, rather than from compound annual
+growth rates:
+
+    $ python batch_export.py export --division county --sort projected-pop \\
+          --year 2030 --model log-linear --out counties_2030
+
+To export the counties of Texas with 2018 population estimates between 50,000
+and 250,000, or the states growing faster than 1% a year:
+
+    $ python batch_export.py export --division county --min 50000 \\
+          --max 250000 --state Texas --out texas_counties
+    $ python batch_export.py export --division state --sort cagr --min 1 \\
+          --out fast_growing_states
+
+To export every division sorted by every type of estimate in parallel:
+
+    $ python batch_export.py export --all --year 2030 --out exports/
+
+To export the counties as gzip-compressed JSON Lines, for large exports that
+are bound by the speed of the disk:
+
+    $ python batch_export.py export --division county --format jsonl \\
+          --compress gzip --out counties
+
+To export simulated P10, P50, and P90 bands of the counties' projected
+estimates for every year up to 2048, from 10,000 bootstrapped draws of each
+county's year-over-year growth rates, which take about 30 seconds of CPU time
+with NumPy installed:
+
+    $ python batch_export.py bands --division county --year 2048 \\
+          --draws 10000 --seed 1 --out county_bands
+
+To publish every division once for many text-based user interface sessions on
+one host, which then memory-map and share it:
+
+    $ python batch_export.py publish --folder /srv/population-estimator
+    $ POP_EST_BACKEND=mmap POP_EST_SHARED_FOLDER=/srv/population-estimator \\
+          python tui_app.py
+
+To roll the counties up into their states, or into the groups of a custom
+grouping CSV file such as sales territories, and export the aggregated annual
+estimates, growth rates, and projections:
+
+    $ python batch_export.py rollup --by state --check --out states
+    $ python batch_export.py rollup --grouping territories.csv --out territories
+"""
+
+from constants import *
+import argparse
+import collections
+import export_writer
+import growth_models
+import instrumentation
+import os
+import sys
+import tui_app
+
+# Command line names of the geographical divisions and the Geographic Divisions
+# Menu options and CSV files that they stand for.
+DIVISIONS = collections.OrderedDict([
+    ('nation', (NATION, NATION_POP_CSV)),
+    ('region', (REGION, REGION_POP_CSV)),
+    ('division', (DIVISION, DIVISION_POP_CSV)),
+    ('state', (STATE, STATE_POP_CSV)),
+    ('county', (COUNTY, COUNTY_POP_CSV)),
+    ('metro', (METRO, METRO_POP_CSV)),
+    ('micro', (MICRO, MICRO_POP_CSV))])
+
+# Command line names of the types of estimates and the Population Estimates
+# Menu options that they stand for.
+SORTS = collections.OrderedDict([
+    ('most-recent-pop', MOST_RECENT_POP),
+    ('cagr', CAGR),
+    ('projected-pop', PROJECTED_POP)])
+
+
+def export_division(division, sort, year, file_name, output_format='csv',
+                    compression=None, model=DEFAULT_GROWTH_MODEL, low=None,
+                    high=None, id_prefix=None):
+    """Exports the geographies of a division sorted by a type of estimate.
+
+    The export can be filtered to the geographies whose values of the type of
+    estimate are in a range, and whose FIPS codes start with a prefix, which
+    are found with the division's sorted indexes rather than a full scan.
+
+    Args:
+        division: A string that contains the command line name of a
+            geographical division, such as 'county'.
+        sort: A string that contains the command line name of a type of
+            estimate, such as 'cagr'.
+        year: An integer that represents the future year of projected
+            population estimates. Ignored for other types of estimates.
+        file_name: A string that contains the path of the export file that is
+            created, without its extension.
+        output_format: A string that contains 'csv' or 'jsonl'.
+        compression: An optional string that contains the compression of the
+            export file, such as 'gzip'.
+        model: A string that contains the name of the growth model of the
+            projected population estimates, such as 'log-linear'.
+        low: An optional number that represents the lowest value of the type
+            of estimate that is exported. Growth rates are fractions, such as
+            0.01 for 1%.
+        high: An optional number that represents the highest value of the
+            type of estimate that is exported.
+        id_prefix: An optional string that the FIPS codes of the exported
+            geographies start with, such as the two-digit FIPS code of a state
+            for counties.
+
+    Returns:
+        An ExportStats of the export file that was created.
+    """
+    geo_division, csv_file = DIVISIONS[division]
+    sorted_by = SORTS[sort]
+    user_selections = {
+        GEOGRAPHIES: tui_app.DATASETS.get(csv_file),
+        GEO_DIVISION: geo_division,
+        SORTED_BY: sorted_by,
+        YEAR: year if sorted_by == PROJECTED_POP else LAST_YEAR,
+        GROWTH_MODEL: model}
+
+    rows = None
+    if low is not None or high is not None or id_prefix is not None:
+        rows = tui_app.filter_geographies(user_selections, low, high,
+                                          id_prefix)
+    else:
+        tui_app.sort_geographies(user_selections)
+
+    return export_writer.write_dicts(
+        tui_app.iter_geography_dicts(user_selections, rows), file_name,
+        tui_app.get_geography_dict_keys(user_selections), output_format,
+        compression)
+
+
+def export_all_divisions(year, out_folder, max_workers=None,
+                         output_format='csv', compression=None,
+                         model=DEFAULT_GROWTH_MODEL):
+    # Exports every division sorted by every type of estimate to a folder on a
+    # pool of processes and returns the ExportStats of the export files that
+    # were created.
+    import concurrent.futures
+
+    if not os.path.isdir(out_folder):
+        os.makedirs(out_folder)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = []
+        for division in DIVISIONS:
+            for sort in SORTS:
+                name = '%s_%s' % (division, sort)
+                if SORTS[sort] == PROJECTED_POP:
+                    name = '%s_%s' % (name, year)
+                futures.append(executor.submit(
+                    instrumentation.get_worker_function(export_division),
+                    division, sort, year,
+                    os.path.join(out_folder, name), output_format,
+                    compression, model))
+
+        return [instrumentation.get_worker_result(future.result())
+                for future in futures]
+
+
+def export_rollup(grouping, sort, year, file_name, check=False,
+                  output_format='csv', compression=None,
+                  model=DEFAULT_GROWTH_MODEL):
+    """Exports a rollup of the counties sorted by a type of estimate.
+
+    Args:
+        grouping: A string that contains 'state' to roll the counties up into
+            their states, or the path to a custom grouping CSV file.
+        sort: A string that contains the command line name of a type of
+            estimate, such as 'cagr'.
+        year: An integer that represents the last future year of projected
+            population estimates that are exported for each group, or None to
+            export none.
+        file_name: A string that contains the path of the export file that is
+            created, without its extension.
+        check: A boolean that determines whether a rollup into states is
+            compared with the state totals.
+        output_format: A string that contains 'csv' or 'jsonl'.
+        compression: An optional string that contains the compression of the
+            export file, such as 'gzip'.
+        model: A string that contains the name of the growth model of the
+            projected population estimates, such as 'log-linear'.
+
+    Returns:
+        A tuple that contains the ExportStats of the export file that was
+        created and a list of the dicts returned by 'rollups.cross_check',
+        which is empty unless 'check' is True.
+    """
+    import rollups
+
+    counties = tui_app.DATASETS.get(COUNTY_POP_CSV)
+    mismatches = []
+    if grouping == 'state':
+        states = tui_app.DATASETS.get(STATE_POP_CSV)
+        rolled_up = rollups.rollup_by_state(counties, states)
+        if check:
+            mismatches = rollups.cross_check(rolled_up, states, FIRST_YEAR)
+    else:
+        rolled_up = rollups.rollup_by_grouping(
+            counties, rollups.read_grouping_csv(grouping))
+
+    sorted_by = SORTS[sort]
+    projected_years = []
+    if year is not None:
+        projected_years = list(range(LAST_YEAR + 1, year + 1))
+    tui_app.sort_geographies({
+        GEOGRAPHIES: rolled_up, SORTED_BY: sorted_by,
+        YEAR: year if sorted_by == PROJECTED_POP else LAST_YEAR,
+        GROWTH_MODEL: model})
+    export_stats = export_writer.write_dicts(
+        rollups.iter_rollup_dicts(rolled_up, FIRST_YEAR, projected_years,
+                                  model),
+        file_name,
+        rollups.get_rollup_dict_keys(FIRST_YEAR, rolled_up.num_years,
+                                     projected_years),
+        output_format, compression)
+
+    return export_stats, mismatches
+
+
+def export_bands(division, sort, first_year, last_year, file_name,
+                 num_draws=None, percentiles=None, seed=None, max_workers=None,
+                 output_format='csv', compression=None):
+    """Exports simulated percentile bands of a division's projected estimates.
+
+    Args:
+        division: A string that contains the command line name of a
+            geographical division, such as 'county'.
+        sort: A string that contains the command line name of a type of
+            estimate, such as 'cagr', that the geographies are sorted by.
+            Projected estimates are sorted by the last year.
+        first_year: An integer that represents the first future year of the
+            bands.
+        last_year: An integer that represents the last future year of the
+            bands.
+        file_name: A string that contains the path of the export file that is
+            created, without its extension.
+        num_draws: An optional integer that represents the number of draws of
+            each geography's projections. Defaults to simulation.DEFAULT_DRAWS.
+        percentiles: An optional list of the percentiles of each band.
+            Defaults to simulation.DEFAULT_PERCENTILES.
+        seed: An optional integer that seeds the random number generator.
+            Defaults to simulation.DEFAULT_SEED.
+        max_workers: An optional integer that represents the number of
+            processes that the simulation runs on.
+        output_format: A string that contains 'csv' or 'jsonl'.
+        compression: An optional string that contains the compression of the
+            export file, such as 'gzip'.
+
+    Returns:
+        An ExportStats of the export file that was created.
+    """
+    import simulation
+
+    if num_draws is None:
+        num_draws = simulation.DEFAULT_DRAWS
+    if percentiles is None:
+        percentiles = simulation.DEFAULT_PERCENTILES
+    if seed is None:
+        seed = simulation.DEFAULT_SEED
+    geo_division, csv_file = DIVISIONS[division]
+    geographies = tui_app.DATASETS.get(csv_file)
+    sorted_by = SORTS[sort]
+    tui_app.sort_geographies({
+        GEOGRAPHIES: geographies, SORTED_BY: sorted_by,
+        YEAR: last_year if sorted_by == PROJECTED_POP else LAST_YEAR})
+
+    projected_years = list(range(first_year, last_year + 1))
+    bands = simulation.simulate_bands(geographies, LAST_YEAR, projected_years,
+                                      num_draws, percentiles, seed,
+                                      max_workers)
+
+    return export_writer.write_dicts(
+        simulation.iter_band_dicts(geographies, projected_years, bands,
+                                   percentiles),
+        file_name,
+        simulation.get_band_dict_keys(projected_years, percentiles),
+        output_format, compression)
+
+
+def make_out_folder(path):
+    # Creates the folder of an output file if it does not exist.
+    out_folder = os.path.dirname(path)
+    if out_folder and not os.path.isdir(out_folder):
+        os.makedirs(out_folder)
+
+
+def get_file_name(path, output_format='csv', compression=None):
+    # Returns a path without the extension of an export format, such as
+    # '.csv.gz', if it has one.
+    extension = export_writer.get_export_path('', output_format, compression)
+    if path.lower().endswith(extension):
+        return path[:-len(extension)]
+    return path
+
+
+def add_model_argument(parser):
+    # Adds the option of the growth model of projected estimates to a command
+    # line parser.
+    parser.add_argument('--model', choices=list(growth_models.MODEL_TITLES),
+                        default=DEFAULT_GROWTH_MODEL,
+                        help='growth model of projected estimates')
+
+
+def add_output_arguments(parser):
+    # Adds the options of the format and compression of export files to a
+    # command line parser.
+    parser.add_argument('--format', choices=sorted(export_writer.FORMATS),
+                        default='csv', help='format of the export files')
+    parser.add_argument('--compress',
+                        choices=sorted(export_writer.COMPRESSIONS),
+                        help='compression of the export files')
+
+
+def print_export_stats(export_stats):
+    # Prints the path of an export file to standard output and a summary of how
+    # quickly it was written to standard error.
+    print(export_stats.path)
+    print(export_stats.get_summary(), file=sys.stderr)
+
+
+def main(args=None):
+    import simulation
+
+    parser = argparse.ArgumentParser(
+        description='Export Annual Estimates of the Resident Population to '
+                    'CSV files.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    export_parser = subparsers.add_parser(
+        'export', help='export one division, or every division with --all')
+    export_parser.add_argument('--division', choices=list(DIVISIONS),
+                               help='geographical division to export')
+    export_parser.add_argument('--sort', choices=list(SORTS),
+                               default='most-recent-pop',
+                               help='type of estimate to sort by')
+    export_parser.add_argument('--year', type=int,
+                               help='future year of projected estimates')
+    export_parser.add_argument('--all', action='store_true',
+                               help='export every division sorted by every '
+                                    'type of estimate in parallel')
+    export_parser.add_argument('--workers', type=int,
+                               help='number of processes used by --all')
+    export_parser.add_argument('--min', type=float,
+                               help='lowest value of the type of estimate to '
+                                    'export, as a percentage for --sort cagr')
+    export_parser.add_argument('--max', type=float,
+                               help='highest value of the type of estimate to '
+                                    'export, as a percentage for --sort cagr')
+    export_parser.add_argument('--state',
+                               help='name or FIPS code of the state of the '
+                                    'counties to export')
+    export_parser.add_argument('--out', required=True,
+                               help='export file, or folder with --all')
+    add_model_argument(export_parser)
+    add_output_arguments(export_parser)
+
+    rollup_parser = subparsers.add_parser(
+        'rollup', help='roll the counties up into states or custom groups')
+    grouping_group = rollup_parser.add_mutually_exclusive_group(required=True)
+    grouping_group.add_argument('--by', choices=['state'],
+                                help='roll the counties up into their states')
+    grouping_group.add_argument('--grouping',
+                                help='CSV file of county FIPS codes and the '
+                                     'names of their groups')
+    rollup_parser.add_argument('--sort', choices=list(SORTS),
+                               default='most-recent-pop',
+                               help='type of estimate to sort by')
+    rollup_parser.add_argument('--year', type=int,
+                               help='last future year of projected estimates')
+    rollup_parser.add_argument('--check', action='store_true',
+                               help='compare a rollup into states with the '
+                                    'state totals')
+    rollup_parser.add_argument('--out', required=True, help='export file')
+    add_model_argument(rollup_parser)
+    add_output_arguments(rollup_parser)
+
+    bands_parser = subparsers.add_parser(
+        'bands', help='export simulated percentile bands of the projected '
+                      'estimates of a division')
+    bands_parser.add_argument('--division', choices=list(DIVISIONS),
+                              required=True,
+                              help='geographical division to export')
+    bands_parser.add_argument('--sort', choices=list(SORTS),
+                              default='most-recent-pop',
+                              help='type of estimate to sort by')
+    bands_parser.add_argument('--first-year', type=int,
+                              help='first future year of the bands (default: '
+                                   'the year after the estimates)')
+    bands_parser.add_argument('--year', type=int, required=True,
+                              help='last future year of the bands')
+    bands_parser.add_argument('--draws', type=int,
+                              default=simulation.DEFAULT_DRAWS,
+                              help='number of draws of each geography '
+                                   '(default: %(default)s)')
+    bands_parser.add_argument('--percentiles', type=float, nargs='+',
+                              default=list(simulation.DEFAULT_PERCENTILES),
+                              help='percentiles of each band')
+    bands_parser.add_argument('--seed', type=int,
+                              default=simulation.DEFAULT_SEED,
+                              help='seed of the random number generator')
+    bands_parser.add_argument('--workers', type=int,
+                              help='number of processes of the simulation')
+    bands_parser.add_argument('--out', required=True, help='export file')
+    add_output_arguments(bands_parser)
+
+    publish_parser = subparsers.add_parser(
+        'publish', help='write every division to a shared folder that the '
+                        'mmap backend maps')
+    publish_parser.add_argument('--folder', default=SHARED_FOLDER,
+                                help='shared folder of the cache files')
+    args = parser.parse_args(args)
+
+    try:
+        if args.command == 'rollup':
+            return rollup_main(parser, args)
+        elif args.command == 'bands':
+            return bands_main(parser, args)
+        elif args.command == 'publish':
+            for cache_file in tui_app.publish_geographies(POP_CSVS,
+                                                          args.folder):
+                print(cache_file)
+            return 0
+        return export_main(parser, args)
+    except growth_models.ProjectionError as error:
+        parser.exit(1, '%s: error: %s\n' % (parser.prog, error))
+
+
+def check_projected_year(parser, name, year, min_year=LAST_YEAR):
+    # Exits with an error unless a future year is after 'min_year' and no
+    # later than MAX_PROJECTED_YEAR.
+    if not (min_year < year <= MAX_PROJECTED_YEAR):
+        parser.error('%s must be from %s to %s' % (name, min_year + 1,
+                                                   MAX_PROJECTED_YEAR))
+
+
+def export_main(parser, args):
+    # Exports one division, or every division, and prints the paths of the
+    # export files that were created.
+    if args.all and args.year is None:
+        parser.error('--year is required with --all')
+    if not args.all and args.division is None:
+        parser.error('--division is required without --all')
+    if not args.all and SORTS[args.sort] == PROJECTED_POP and (
+            args.year is None):
+        parser.error('--year is required with --sort projected-pop')
+    if args.year is not None:
+        check_projected_year(parser, '--year', args.year)
+    if args.all and (args.min is not None or args.max is not None or
+                     args.state is not None):
+        parser.error('--min, --max, and --state cannot be used with --all')
+    if args.state is not None and args.division != 'county':
+        parser.error('--state can only be used with --division county')
+
+    low, high, id_prefix = args.min, args.max, None
+    if SORTS[args.sort] == CAGR:
+        low = None if low is None else low / 100
+        high = None if high is None else high / 100
+    if args.state is not None:
+        state = tui_app.find_state(args.state)
+        if state is None:
+            parser.error('no state matches --state %s' % (args.state))
+        id_prefix = state[0]
+
+    if args.all:
+        all_export_stats = export_all_divisions(args.year, args.out,
+                                                args.workers, args.format,
+                                                args.compress, args.model)
+    else:
+        make_out_folder(args.out)
+        all_export_stats = [export_division(
+            args.division, args.sort, args.year,
+            get_file_name(args.out, args.format, args.compress), args.format,
+            args.compress, args.model, low, high, id_prefix)]
+
+    for export_stats in all_export_stats:
+        print_export_stats(export_stats)
+
+    return 0
+
+
+def rollup_main(parser, args):
+    # Exports a rollup and prints the path of the CSV file that was created and
+    # any estimates that do not match the state totals. Returns 1 if any do not
+    # match.
+    if SORTS[args.sort] == PROJECTED_POP and args.year is None:
+        parser.error('--year is required with --sort projected-pop')
+    if args.year is not None:
+        check_projected_year(parser, '--year', args.year)
+    if args.check and args.by != 'state':
+        parser.error('--check requires --by state')
+
+    make_out_folder(args.out)
+    export_stats, mismatches = export_rollup(
+        args.by or args.grouping, args.sort, args.year,
+        get_file_name(args.out, args.format, args.compress), args.check,
+        args.format, args.compress, args.model)
+    print_export_stats(export_stats)
+    for mismatch in mismatches:
+        print('Mismatch: %s' % (', '.join('%s: %s' % item
+                                          for item in mismatch.items())))
+    if args.check:
+        print('%s estimates do not match the state totals' % (
+            '{:,}'.format(len(mismatches))))
+
+    return 1 if mismatches else 0
+
+
+def bands_main(parser, args):
+    # Exports simulated bands and prints the path of the export file that was
+    # created.
+    first_year = args.first_year
+    if first_year is None:
+        first_year = LAST_YEAR + 1
+    check_projected_year(parser, '--first-year', first_year)
+    check_projected_year(parser, '--year', args.year, first_year - 1)
+    if args.draws < 1:
+        parser.error('--draws must be at least 1')
+    if not all(0 <= percentile <= 100 for percentile in args.percentiles):
+        parser.error('--percentiles must be from 0 to 100')
+
+    make_out_folder(args.out)
+    percentiles = [int(percentile) if percentile == int(percentile)
+                   else percentile for percentile in args.percentiles]
+    print_export_stats(export_bands(
+        args.division, args.sort, first_year, args.year,
+        get_file_name(args.out, args.format, args.compress), args.draws,
+        percentiles, args.seed, args.workers, args.format, args.compress))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+
+"""
+Module for benchmarking the population_estimator against synthetic CSV files
+that have the same layout as the Census Bureau's PEP CSV files.
+
+To run the benchmark suite and save its results:
+
+    $ python benchmarks.py --rows 1000 10000 100000 --output results.json
+
+To run it again and fail if any benchmark has become slower:
+
+    $ python benchmarks.py --rows 1000 10000 100000 --compare results.json
+
+To benchmark the query server under load:
+
+    $ python benchmarks.py --query-server
+
+Every run also times how long the text-based user interface and the batch
+exports take to import in a new interpreter, and fails if either exceeds its
+budget or imports a module that is only meant to be imported on first use.
+"""
+
+from constants import *
+import argparse
+import asyncio
+import collections
+import csv_dicts
+import data_store
+import datetime
+import export_writer
+import geography
+import geography_cache
+import instrumentation
+import json
+import os
+import platform
+import query_server
+import shutil
+import subprocess
+import synthetic_data
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import tui_app
+
+# Largest allowed ratio between the peak memory of streaming the largest and the
+# smallest synthetic CSV file through the ingest and export pipeline.
+MAX_STREAMING_MEMORY_RATIO = 1.5
+
+# Module of the standard library that the import time of each entry point is
+# compared with, so that the budgets hold on slower or busier machines, where
+# every import is slower.
+BASELINE_MODULE = 'argparse'
+
+# Largest allowed time that importing each entry point takes, as reported by
+# 'python -X importtime', which leaves out the startup of the interpreter
+# itself, as a multiple of the time that importing BASELINE_MODULE takes.
+IMPORT_TIME_BUDGETS = collections.OrderedDict([
+    ('tui_app', 5.0),
+    ('batch_export', 6.0)])
+
+# Modules that the entry points only import the first time that they are used,
+# and that must not be imported at startup.
+DEFERRED_MODULES = ['concurrent.futures', 'cProfile', 'csv_dicts', 'data_store',
+                    'geography_cache', 'geography_search', 'gzip', 'json',
+                    'logging', 'numpy', 'rollups', 'simulation', 'sqlite3',
+                    'sqlite_store']
+
+# Largest number of rows that the benchmarks that hold every row of a CSV file
+# in memory as a dict are run with.
+MAX_MATERIALIZED_ROWS = 10**6
+
+# Largest allowed slowdown, as a fraction of the compared time, before a
+# benchmark is reported as a regression, and the smallest compared time in
+# seconds that is checked for regressions, since shorter times are too noisy.
+DEFAULT_TOLERANCE = 0.25
+MIN_COMPARED_SECONDS = 0.001
+
+# Terms searched for by the search benchmark, including prefixes, words,
+# FIPS codes, and misspellings.
+SEARCH_TERMS = ['al', 'Berca', 'county, ohio', 'kelmo', 'New Yrok', '01000',
+                'sanwa', 'Grahamto County']
+
+# Lowest and highest estimates and FIPS code prefixes of the queries run by the
+# filter benchmark: a size band, a floor, a state, and a state's size band.
+FILTER_QUERIES = [(10000, 100000, None), (50000, None, None),
+                  (None, None, '06'), (10000, 100000, '48')]
+
+
+def time_call(function, *args):
+    # Returns the number of seconds that a function call takes and the value
+    # that the call returns.
+    start = time.perf_counter()
+    value = function(*args)
+    return time.perf_counter() - start, value
+
+
+def time_best(repeat, function, *args, **kwargs):
+    # Returns the fewest seconds that a function call takes out of 'repeat'
+    # calls. The 'setup' keyword argument is a function that is called before
+    # each call without being timed.
+    setup = kwargs.get('setup')
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        seconds, _ = time_call(function, *args)
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def get_result(benchmark, num_rows, seconds):
+    # Returns a dict that records how long a benchmark took for a number of
+    # rows.
+    return {'benchmark': benchmark, 'rows': num_rows, 'seconds': seconds,
+            'rows_per_second': num_rows / seconds if seconds else None}
+
+
+def get_import_time(module_name):
+    # Returns the number of seconds that importing a module takes in a new
+    # interpreter, as reported by 'python -X importtime', and a set of the
+    # names of the modules that the import loads.
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % (module_name)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        stderr=subprocess.PIPE, text=True).stderr
+
+    seconds = None
+    loaded_modules = set()
+    for line in output.splitlines():
+        # Each line contains the microseconds that a module took to import
+        # by itself and with its own imports, and the module's name.
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        loaded_modules.add(name)
+        if name == module_name:
+            seconds = int(fields[1]) / 1e6
+
+    return seconds, loaded_modules
+
+
+def benchmark_import_time(module_name, repeat):
+    # Returns a dict that records the fewest seconds that importing a module
+    # takes out of 'repeat' imports, after an untimed import that compiles
+    # any changed files, its ratio to the fewest seconds that importing
+    # BASELINE_MODULE takes out of as many imports in between, and the
+    # deferred modules that it imports.
+    _, loaded_modules = get_import_time(module_name)
+    times = [(get_import_time(module_name)[0],
+              get_import_time(BASELINE_MODULE)[0]) for _ in range(repeat)]
+    seconds = min(module_seconds for module_seconds, _ in times)
+    baseline_seconds = min(baseline_seconds for _, baseline_seconds in times)
+
+    return {'benchmark': 'import_%s' % (module_name), 'rows': 0,
+            'seconds': seconds, 'rows_per_second': None, 'module': module_name,
+            'baseline_ratio': seconds / baseline_seconds,
+            'deferred_imports': sorted(loaded_modules.intersection(
+                DEFERRED_MODULES))}
+
+
+def benchmark_streaming_memory(csv_file, export_file):
+    # Returns the peak number of bytes allocated while streaming every row of a
+    # CSV file through the ingest and export pipeline.
+    tracemalloc.start()
+    try:
+        rows = csv_dicts.iter_csv_rows_to_dicts(csv_file, HEADER_ROW_NUM)
+        csv_dicts.dicts_to_csv(rows, export_file,
+                               [GEO_ID_KEY, GEO_KEY, ANN_POP_EST_KEYS[-1]])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def benchmark_geography_memory(geographies):
+    # Returns the number of bytes allocated per geography when every row of a
+    # GeographyTable is stored as its own Geography object, excluding the
+    # names, which are shared with the table.
+    rows = [list(geographies.get_annual_pop_ests(row))
+            for row in range(len(geographies))]
+    tracemalloc.start()
+    try:
+        geography_objects = [geography.Geography(name, pop_ests)
+                             for name, pop_ests in zip(geographies.names, rows)]
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del geography_objects
+
+    return size / float(len(rows))
+
+
+def run_pep_suite(temp_folder, repeat):
+    # Returns a list of dicts that record how long the Census Bureau's PEP CSV
+    # files in the CSV folder take to load cold, both by merging every vintage
+    # of each division into its store and by reading the newest vintage's
+    # needed columns, the two ways that divisions are loaded without a cache.
+    results = []
+    for csv_file in POP_CSVS:
+        match = VINTAGE_CSV_PATTERN.match(os.path.basename(csv_file))
+        if match is None or not os.path.exists(csv_file):
+            continue
+        division = match.group(1)
+        store_file = data_store.get_store_file(division, temp_folder)
+
+        def remove_store_file():
+            if os.path.exists(store_file):
+                os.remove(store_file)
+
+        num_rows = len(data_store.load_division_store(division, CSV_PATH,
+                                                      temp_folder))
+        results.append(get_result('pep_%s_load_division_store' % (division),
+                                  num_rows, time_best(
+                                      repeat, data_store.load_division_store,
+                                      division, CSV_PATH, temp_folder,
+                                      setup=remove_store_file)))
+        results.append(get_result('pep_%s_read_geographies' % (division),
+                                  num_rows, time_best(
+                                      repeat, tui_app.read_geographies,
+                                      csv_file)))
+        remove_store_file()
+
+    return results
+
+
+def run_suite(num_rows, temp_folder, repeat):
+    """Runs every benchmark against a synthetic CSV file.
+
+    Args:
+        num_rows: An integer that represents the number of rows in the
+            synthetic CSV file.
+        temp_folder: A string that contains the path of a folder for the
+            synthetic CSV file, cache files, and exports.
+        repeat: An integer that represents the number of times each benchmark
+            is run. The fastest run is recorded.
+
+    Returns:
+        A list of dicts that record the results of each benchmark.
+    """
+    csv_file = os.path.join(temp_folder, 'synthetic_%s.csv' % (num_rows))
+    export_file = os.path.join(temp_folder, 'export')
+    synthetic_data.write_synthetic_pep_csv(csv_file, num_rows)
+    results = []
+
+    def remove_cache_file():
+        cache_file = geography_cache.get_cache_file(csv_file, temp_folder)
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+
+    if num_rows <= MAX_MATERIALIZED_ROWS:
+        seconds, csv_rows = time_call(csv_dicts.csv_rows_to_dicts, csv_file,
+                                      HEADER_ROW_NUM)
+        results.append(get_result('csv_rows_to_dicts', num_rows, seconds))
+        seconds, _ = time_call(tui_app.get_geographies, csv_rows)
+        results.append(get_result('get_geographies', num_rows, seconds))
+        del csv_rows
+
+    results.append(get_result('read_csv_columns', num_rows, time_best(
+        repeat, csv_dicts.read_csv_columns, csv_file, HEADER_ROW_NUM,
+        [GEO_KEY, GEO_ID_KEY], ANN_POP_EST_KEYS)))
+    results.append(get_result('read_geographies', num_rows, time_best(
+        repeat, tui_app.read_geographies, csv_file)))
+
+    results.append(get_result('load_geographies_cold', num_rows, time_best(
+        repeat, tui_app.load_geographies, csv_file,
+        setup=remove_cache_file)))
+    results.append(get_result('load_geographies_warm', num_rows, time_best(
+        repeat, tui_app.load_geographies, csv_file)))
+    geographies = tui_app.load_geographies(csv_file)
+
+    for sort_geographies, args in (
+            (tui_app.sort_geographies_by_most_recent_pop, ()),
+            (tui_app.sort_geographies_by_cagr, ()),
+            (tui_app.sort_geographies_by_projected_pop, (LAST_YEAR + 12,))):
+        seconds = time_best(repeat, sort_geographies, geographies, *args,
+                            setup=geographies.clear_sort_orders)
+        results.append(get_result(sort_geographies.__name__, num_rows,
+                                  seconds))
+
+    user_selections = {GEOGRAPHIES: geographies, GEO_DIVISION: COUNTY,
+                       SORTED_BY: MOST_RECENT_POP, YEAR: LAST_YEAR}
+    tui_app.sort_geographies(user_selections)
+    if num_rows <= MAX_MATERIALIZED_ROWS:
+        results.append(get_result('get_geography_dicts', num_rows, time_best(
+            repeat, tui_app.get_geography_dicts, user_selections)))
+    results.append(get_result('get_ranked_geography_dicts', num_rows, time_best(
+        repeat, tui_app.get_ranked_geography_dicts, user_selections, 0, 5,
+        setup=geographies.clear_sort_orders)))
+
+    def build_search_index():
+        geographies.search_index = None
+        tui_app.get_search_index(geographies)
+
+    results.append(get_result('search_index_build', num_rows, time_best(
+        repeat, build_search_index)))
+
+    def search():
+        for search_term in SEARCH_TERMS:
+            geographies.search_index.search(search_term, SEARCH_RESULTS_LIMIT)
+
+    search_result = get_result('search', num_rows,
+                               time_best(repeat, search) / len(SEARCH_TERMS))
+    search_result['rows_per_second'] = None  # Seconds per search term.
+    results.append(search_result)
+
+    def filter_geographies():
+        for low, high, id_prefix in FILTER_QUERIES:
+            tui_app.filter_geographies(user_selections, low, high, id_prefix)
+
+    tui_app.filter_geographies(user_selections)  # Builds the indexes.
+    filter_result = get_result('filter_geographies', num_rows, time_best(
+        repeat, filter_geographies) / len(FILTER_QUERIES))
+    filter_result['rows_per_second'] = None  # Seconds per query.
+    results.append(filter_result)
+
+    def export():
+        csv_dicts.dicts_to_csv(
+            tui_app.iter_geography_dicts(user_selections), export_file,
+            tui_app.get_geography_dict_keys(user_selections))
+
+    results.append(get_result('dicts_to_csv', num_rows, time_best(
+        repeat, export)))
+
+    def export_compressed():
+        export_writer.write_dicts(
+            tui_app.iter_geography_dicts(user_selections), export_file,
+            tui_app.get_geography_dict_keys(user_selections), 'jsonl', 'gzip')
+
+    results.append(get_result('write_dicts_jsonl_gzip', num_rows, time_best(
+        repeat, export_compressed)))
+
+    results.append({'benchmark': 'streaming_peak_bytes', 'rows': num_rows,
+                    'peak_bytes': benchmark_streaming_memory(csv_file,
+                                                             export_file)})
+    results.append({'benchmark': 'geography_table_bytes_per_row',
+                    'rows': num_rows,
+                    'bytes_per_row': geographies.get_size() / float(num_rows)})
+    if num_rows <= MAX_MATERIALIZED_ROWS:
+        results.append({'benchmark': 'geography_object_bytes_per_row',
+                        'rows': num_rows,
+                        'bytes_per_row': benchmark_geography_memory(
+                            geographies)})
+    os.remove(csv_file)
+    remove_cache_file()
+
+    return results
+
+
+def compare_results(results, baseline_results, tolerance):
+    # Returns a list of strings that describe each benchmark that took more
+    # than 'tolerance' longer than the same benchmark in a list of baseline
+    # results. Import times are checked against their budgets instead, since
+    # they vary too much between runs to compare.
+    baseline_seconds = dict(
+        ((result['benchmark'], result['rows']), result['seconds'])
+        for result in baseline_results if 'seconds' in result)
+
+    regressions = []
+    for result in results:
+        key = (result['benchmark'], result['rows'])
+        if ('seconds' not in result or 'module' in result or
+                key not in baseline_seconds):
+            continue
+        old_seconds = baseline_seconds[key]
+        if max(old_seconds, result['seconds']) < MIN_COMPARED_SECONDS:
+            continue
+        if result['seconds'] > old_seconds * (1 + tolerance):
+            regressions.append('%s (%s rows): %.4fs -> %.4fs' % (
+                result['benchmark'], '{:,}'.format(result['rows']),
+                old_seconds, result['seconds']))
+
+    return regressions
+
+
+def format_result(result):
+    # Returns a line of text that describes the result of a benchmark.
+    if 'peak_bytes' in result:
+        value = '%s bytes peak' % ('{:,}'.format(result['peak_bytes']))
+    elif 'bytes_per_row' in result:
+        value = '%.1f bytes per row' % (result['bytes_per_row'])
+    else:
+        value = '%.6fs' % (result['seconds'])
+        if result['rows_per_second']:
+            value += ' (%s rows/s)' % ('{:,.0f}'.format(
+                result['rows_per_second']))
+
+    if 'module' in result:
+        value += ' (%.1fx %s)' % (result['baseline_ratio'], BASELINE_MODULE)
+        return '%-36s %17s  %s' % (result['benchmark'], 'startup', value)
+    return '%-36s %12s rows  %s' % (result['benchmark'],
+                                    '{:,}'.format(result['rows']), value)
+
+
+# Requests sent by the query server benchmark, in rotation.
+QUERY_SERVER_TARGETS = [
+    '/top?division=county&sort=most-recent-pop&k=5',
+    '/top?division=county&sort=cagr&k=25&offset=100',
+    '/top?division=metro&sort=projected-pop&year=2030&k=10',
+    '/bottom?division=state&sort=cagr&k=5',
+    '/search?division=county&q=los+angles',
+    '/search?division=micro&q=city',
+    '/projection?division=county&id=06037&first_year=2019&last_year=2050']
+
+
+def start_query_server_thread():
+    # Starts a query server on a free localhost port on its own thread and
+    # event loop and returns the port.
+    datasets = query_server.load_datasets()
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        query_server.start_server(datasets, '127.0.0.1', 0))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server.sockets[0].getsockname()[1]
+
+
+async def send_requests(port, num_requests, first_target, latencies):
+    # Sends requests over one keep-alive connection one after another and adds
+    # the number of seconds that each one takes to a list.
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for i in range(num_requests):
+        target = QUERY_SERVER_TARGETS[
+            (first_target + i) % len(QUERY_SERVER_TARGETS)]
+        start = time.perf_counter()
+        writer.write(('GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % (
+                      target)).encode('latin-1'))
+        status_line = await reader.readline()
+        content_length = 0
+        while True:
+            header_line = await reader.readline()
+            if not header_line.strip():
+                break
+            name, _, value = header_line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length':
+                content_length = int(value)
+        await reader.readexactly(content_length)
+        latencies.append(time.perf_counter() - start)
+        if b' 200 ' not in status_line:
+            raise RuntimeError('%s returned %s' % (target, status_line))
+    writer.close()
+
+
+async def generate_load(port, num_requests, concurrency):
+    # Sends requests over concurrent connections and returns the latency of
+    # each request in seconds.
+    latencies = []
+    await asyncio.gather(*[
+        send_requests(port, num_requests // concurrency, i, latencies)
+        for i in range(concurrency)])
+    return latencies
+
+
+def benchmark_query_server(num_requests, concurrency):
+    # Returns the p50 and p99 latencies in seconds and the throughput in
+    # requests per second of a query server on localhost.
+    port = start_query_server_thread()
+    start = time.perf_counter()
+    latencies = asyncio.run(generate_load(port, num_requests, concurrency))
+    seconds = time.perf_counter() - start
+    latencies.sort()
+
+    return (instrumentation.get_percentile(latencies, 50),
+            instrumentation.get_percentile(latencies, 99),
+            len(latencies) / seconds)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the population_estimator against synthetic PEP '
+                    'CSV files.')
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help='numbers of rows in the synthetic CSV files, '
+                             'from 1000 up to 10000000')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each benchmark; the fastest '
+                             'is recorded')
+    parser.add_argument('--output', help='JSON file to save the results to')
+    parser.add_argument('--compare',
+                        help='JSON file of earlier results to compare with')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown before a benchmark is reported '
+                             'as a regression, as a fraction')
+    parser.add_argument('--query-server', action='store_true',
+                        help='only benchmark the query server under load')
+    parser.add_argument('--requests', type=int, default=10000,
+                        help='number of requests sent to the query server')
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='number of concurrent query server connections')
+    args = parser.parse_args(args)
+
+    if args.query_server:
+        p50, p99, throughput = benchmark_query_server(args.requests,
+                                                      args.concurrency)
+        print('query server: p50 %.3fms, p99 %.3fms, %.0f requests/second' %
+              (p50 * 1000, p99 * 1000, throughput))
+        return
+
+    results = []
+    for module_name in IMPORT_TIME_BUDGETS:
+        result = benchmark_import_time(module_name, args.repeat)
+        print(format_result(result))
+        results.append(result)
+
+    temp_folder = tempfile.mkdtemp()
+    tui_app.CACHE_FOLDER = temp_folder
+    try:
+        for result in run_pep_suite(temp_folder, args.repeat):
+            print(format_result(result))
+            results.append(result)
+        for num_rows in args.rows:
+            for result in run_suite(num_rows, temp_folder, args.repeat):
+                print(format_result(result))
+                results.append(result)
+    finally:
+        shutil.rmtree(temp_folder)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'created': datetime.datetime.now().isoformat(),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'results': results}, output_file, indent=2)
+
+    problems = []
+    if args.compare:
+        with open(args.compare) as compare_file:
+            baseline_results = json.load(compare_file)['results']
+        problems.extend('Regression: %s' % (regression) for regression in
+                        compare_results(results, baseline_results,
+                                        args.tolerance))
+
+    peaks = [result['peak_bytes'] for result in results
+             if 'peak_bytes' in result]
+    ratio = max(peaks) / float(min(peaks))
+    if ratio > MAX_STREAMING_MEMORY_RATIO:
+        problems.append('Streaming peak memory grew %.2fx with input size '
+                        '(limit %.2fx).' % (ratio, MAX_STREAMING_MEMORY_RATIO))
+
+    for result in results:
+        if 'module' not in result:
+            continue
+        budget = IMPORT_TIME_BUDGETS[result['module']]
+        if result['baseline_ratio'] > budget:
+            problems.append('Importing %s took %.1fx as long as importing %s '
+                            '(budget %.1fx).' % (
+                                result['module'], result['baseline_ratio'],
+                                BASELINE_MODULE, budget))
+        if result['deferred_imports']:
+            problems.append('Importing %s also imported %s, which should only '
+                            'be imported on first use.' % (
+                                result['module'],
+                                ', '.join(result['deferred_imports'])))
+
+    if problems:
+        sys.exit('\n'.join(problems))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
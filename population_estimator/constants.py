@@ -1,18 +1,59 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 """
 Constants used in the population_estimator.py module.
 """
 
 import os
-
-# First and last years in the data set.
-FIRST_YEAR = 2010  # Modify if a previous year of data is added.
-LAST_YEAR = 2018  # Modify if a future year of data is added.
+import re
 
 # Path to CSV files
 CSV_PATH = '%s/data/' % (os.path.dirname(__file__))
 
+# Pattern of the names of the CSV files, which contain the name of the division
+# and the vintage, the last year that the file has estimates for.
+VINTAGE_CSV_PATTERN = re.compile(r'^([a-z]+)_PEP_(\d{4})_PEPANNRES.*\.csv$')
+
+# Dict of the names of the divisions and dicts of the vintages and paths of
+# their CSV files in the CSV folder, which is only listed the first time that
+# get_vintage_csvs is called.
+_vintage_csvs = None
+
+
+def get_vintage_csvs():
+    # Returns a dict of the names of the divisions and dicts of the vintages
+    # and paths of their CSV files in CSV_PATH.
+    global _vintage_csvs
+    if _vintage_csvs is None:
+        _vintage_csvs = {}
+        for file_name in sorted(os.listdir(CSV_PATH)):
+            match = VINTAGE_CSV_PATTERN.match(file_name)
+            if match:
+                _vintage_csvs.setdefault(match.group(1), {})[
+                    int(match.group(2))] = CSV_PATH + file_name
+
+    return _vintage_csvs
+
+
+def get_vintage_years():
+    # Returns a sorted list of the complete vintages in CSV_PATH, which have a
+    # CSV file for every division in VINTAGE_DIVISIONS.
+    vintage_csvs = get_vintage_csvs()
+    return sorted(set.intersection(*[
+        set(vintage_csvs.get(division, ())) for division in VINTAGE_DIVISIONS]))
+
+
+# Names of the divisions in the names of the CSV files.
+VINTAGE_DIVISIONS = ['nation', 'region', 'division', 'state', 'county',
+                     'metro', 'micro']
+
+# First and last years in the data set. The last year is the newest complete
+# vintage of the CSV files, so a new vintage is picked up once the files of
+# every division are added to CSV_PATH, and a division whose newer file is
+# added first keeps using the files of the same vintage as the others.
+FIRST_YEAR = 2010  # Modify if a previous year of data is added.
+LAST_YEAR = (get_vintage_years() or [2018])[-1]
+
 # Names of the CSV files.
 NATION_POP_CSV = (
     '%snation_PEP_%s_PEPANNRES_with_ann.csv' % (CSV_PATH, LAST_YEAR))
@@ -28,6 +69,30 @@ METRO_POP_CSV = (
     '%smetro_PEP_%s_PEPANNRES_with_ann.csv' % (CSV_PATH, LAST_YEAR))
 MICRO_POP_CSV = (
     '%smicro_PEP_%s_PEPANNRES_with_ann.csv' % (CSV_PATH, LAST_YEAR))
+POP_CSVS = [NATION_POP_CSV, REGION_POP_CSV, DIVISION_POP_CSV, STATE_POP_CSV,
+            COUNTY_POP_CSV, METRO_POP_CSV, MICRO_POP_CSV]
+
+# Path to the folder that contains the cache files of the parsed CSV files.
+CACHE_FOLDER = '%s/cache' % (os.path.dirname(__file__))
+
+# Storage backend of the parsed CSV files: 'cache' for the binary cache files,
+# 'mmap' for cache files published to SHARED_FOLDER and memory-mapped by every
+# process, or 'sqlite' for a SQLite database shared by every tool. Set with the
+# POP_EST_BACKEND environment variable.
+BACKEND = os.environ.get('POP_EST_BACKEND', 'cache')
+
+# Path to the folder of the cache files that the 'mmap' backend maps, written
+# by 'python batch_export.py publish'. Set with the POP_EST_SHARED_FOLDER
+# environment variable.
+SHARED_FOLDER = os.environ.get('POP_EST_SHARED_FOLDER', CACHE_FOLDER)
+
+# Path to the SQLite database of the 'sqlite' backend.
+SQLITE_DB_FILE = '%s/population_estimates.sqlite' % (CACHE_FOLDER)
+
+# Maximum number of divisions and bytes of memory that are kept loaded between
+# passes through the menus. Set either to None for no limit.
+REGISTRY_MAX_ENTRIES = 7
+REGISTRY_MAX_BYTES = 256 * 1024 * 1024
 
 # Row number of the header row in the CSV files.
 HEADER_ROW_NUM = 2
@@ -35,11 +100,19 @@ HEADER_ROW_NUM = 2
 # Name of the column that contains the geography names in the CSV files.
 GEO_KEY = 'Geography'
 
+# Name of the column that contains the geography FIPS codes in the CSV files.
+GEO_ID_KEY = 'Id2'
+
 # Names of the columns that contain the annual population estimates in the CSV
 # files.
 ANN_POP_EST_KEYS = ['Population Estimate (as of July 1) - %s' %
                     year for year in range(FIRST_YEAR, LAST_YEAR + 1)]
 
+# Pattern of the names of the columns that contain the annual population
+# estimates in the CSV files.
+ANN_POP_EST_PATTERN = re.compile(
+    r'^Population Estimate \(as of July 1\) - (\d{4})$')
+
 # Main Menu options.
 START = 'Start'
 QUIT = 'Quit'
@@ -63,13 +136,44 @@ PROJECTED_POP = 'Projected Population Estimates for a Specific Year'
 # SEARCH = 'Search'
 # VIEW = 'View'
 # EXPORT = 'Export'
+EXPORT_PROJECTIONS = 'Export Projections for a Range of Years to CSV'
+EXPORT_PROJECTION_BANDS = ('Export Simulated Projection Bands for a Range of ' +
+                           'Years to CSV')
+FILTER_GEOGRAPHIES = 'Filter by a Range of Estimates'
+
+# Filter Results Menu options.
+VIEW_FILTERED = 'View the Matching Geographies'
+EXPORT_FILTERED = 'Export the Matching Geographies to CSV'
+
+# Search Results Menu options. At most SEARCH_RESULTS_LIMIT results are listed
+# so that each one can be selected with a single digit.
+SEARCH_RESULTS_LIMIT = 8
+SEARCH_AGAIN = 'Search Again'
+
+# Name of the growth model that projections use unless another one is selected:
+# 'cagr', 'log-linear', or 'linear'. Set with the POP_EST_GROWTH_MODEL
+# environment variable.
+DEFAULT_GROWTH_MODEL = os.environ.get('POP_EST_GROWTH_MODEL', 'cagr')
+
+# Latest future year that population estimates are projected to. Projections
+# further out are meaningless, and those of fast-growing geographies outgrow
+# the 64-bit integers that they are stored in.
+MAX_PROJECTED_YEAR = LAST_YEAR + 100
 
 # Name of the folder that contains the exported files.
 EXPORT_FOLDER = '%s/export' % (os.path.dirname(__file__))
 
+# Format ('csv' or 'jsonl') and compression ('gzip', 'zstd', or none) of the
+# exported files. Set with the POP_EST_EXPORT_FORMAT and
+# POP_EST_EXPORT_COMPRESSION environment variables.
+EXPORT_FORMAT = os.environ.get('POP_EST_EXPORT_FORMAT', 'csv')
+EXPORT_COMPRESSION = os.environ.get('POP_EST_EXPORT_COMPRESSION') or None
+
 # Names of the keys in the dictionary that store thes user's selections.
 GEOGRAPHIES = 'Geographies'
 GEO_DIVISION = 'Geographic Division'
 SORTED_BY = 'Sorted By'
 YEAR = 'Year'
 SEARCH_GEO = 'Search Geography'
+SEARCH_ROW = 'Search Row'
+GROWTH_MODEL = 'Growth Model'
@@ -1,13 +1,47 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 """
 Module for storing the rows of a CSV file to dictionaries and vice versa.
 """
 
+import array
 import csv
+import export_writer
+import instrumentation
+import operator
 
 
-def csv_rows_to_dicts(csv_file, header_row_num):
+@instrumentation.timed
+def iter_csv_rows_to_dicts(csv_file, header_row_num, encoding='latin-1'):
+    """Yields the rows of a CSV file as dictionaries.
+
+    Reads the rows from a CSV file one at a time and yields the content of each
+    row in its own dictionary using the column names of the header row as the
+    keys for the dictionary. Only one row is held in memory at a time, so files
+    of any size can be read in bounded memory.
+
+    Args:
+        csv_file: A string that contains the path to a CSV file.
+        header_row_num: An integer that represents the row number of the header
+            row in the CSV file.
+        encoding: A string that contains the name of the CSV file's encoding.
+            Defaults to Latin-1, the encoding of the Census Bureau's files.
+
+    Yields:
+        A dictionary containing the content of a row in the CSV file. For
+        example:
+
+        {'Animal': 'cat', 'Name': 'Frank', 'Age': 8}
+    """
+    with open(csv_file, encoding=encoding, newline='') as input_file:
+        for i in range(header_row_num - 1):
+            next(input_file)  # Skip to the header row.
+        for row in csv.DictReader(input_file):
+            yield row
+
+
+@instrumentation.timed
+def csv_rows_to_dicts(csv_file, header_row_num, encoding='latin-1'):
     """Stores the rows of a CSV file in dictionaries.
 
     Retrieves the rows from a CSV file, stores the content of each row in its
@@ -18,6 +52,8 @@ def csv_rows_to_dicts(csv_file, header_row_num):
         csv_file: A string that contains the path to a CSV file.
         header_row_num: An integer that represents the row number of the header
             row in the CSV file.
+        encoding: A string that contains the name of the CSV file's encoding.
+            Defaults to Latin-1, the encoding of the Census Bureau's files.
 
     Returns:
         A list of dictonaries with each dictionary containing the content of a
@@ -27,30 +63,109 @@ def csv_rows_to_dicts(csv_file, header_row_num):
          {'Animal': 'dog', 'Name': 'Buddy', 'Age': 2},
          {'Animal': 'bird', 'Name': 'Jim', 'Age': 4}]
     """
-    csv_dicts = []
+    return list(iter_csv_rows_to_dicts(csv_file, header_row_num, encoding))
+
 
-    with open(csv_file) as input_file:
+@instrumentation.timed
+def read_csv_header(csv_file, header_row_num, encoding='latin-1'):
+    # Returns a list of the column names in the header row of a CSV file.
+    with open(csv_file, encoding=encoding, newline='') as input_file:
         for i in range(header_row_num - 1):
-            input_file.next()  # Skip to the header row.
-        csv_reader = csv.DictReader(input_file)
-        for row in csv_reader:
-            csv_dicts.append(row)
+            next(input_file)  # Skip to the header row.
+        return next(csv.reader(input_file), [])
 
-    return csv_dicts
 
+@instrumentation.timed
+def read_csv_columns(csv_file, header_row_num, text_column_names,
+                     int_column_names, encoding='latin-1', missing=None):
+    """Reads only the named columns of a CSV file into lists and an array.
 
-def dicts_to_csv(list_of_dicts, file_name):
+    Resolves the index of each named column from the header row once and then
+    takes only those columns from each row parsed by csv.reader, so no
+    dictionary is built for any row and the other columns are never converted.
+    The values of the integer columns are parsed straight into an array of
+    64-bit integers.
+
+    Args:
+        csv_file: A string that contains the path to a CSV file.
+        header_row_num: An integer that represents the row number of the header
+            row in the CSV file.
+        text_column_names: A list of the names of the columns whose values are
+            read as strings.
+        int_column_names: A list of the names of the columns whose values are
+            read as integers.
+        encoding: A string that contains the name of the CSV file's encoding.
+            Defaults to Latin-1, the encoding of the Census Bureau's files.
+        missing: An optional integer that empty values of the integer columns
+            are read as. By default, empty values raise a ValueError.
+
+    Returns:
+        A tuple that contains a list of lists of the values of each text column
+        and an array of the values of the integer columns in row-major order.
+        For example:
+
+        ([['cat', 'dog'], ['Frank', 'Buddy']], array('q', [8, 3, 2, 1]))
+
+    Raises:
+        KeyError: A named column is not in the header row.
+    """
+    with open(csv_file, encoding=encoding, newline='') as input_file:
+        for i in range(header_row_num - 1):
+            next(input_file)  # Skip to the header row.
+        reader = csv.reader(input_file)
+        header = dict((name, index)
+                      for index, name in enumerate(next(reader, [])))
+        text_indices = [header[name] for name in text_column_names]
+        int_indices = [header[name] for name in int_column_names]
+        if len(int_indices) == 1:
+            # itemgetter returns a single value rather than a tuple for one
+            # index.
+            def get_ints(row):
+                return (row[int_indices[0]],)
+        else:
+            get_ints = operator.itemgetter(*int_indices)
+
+        text_columns = [[] for _ in text_indices]
+        appends = [(column.append, index)
+                   for column, index in zip(text_columns, text_indices)]
+        int_values = array.array('q')
+        extend = int_values.extend
+        to_int = int
+        if missing is not None:
+            def to_int(value):
+                return int(value) if value else missing
+        for row in reader:
+            if not row:
+                continue  # Skip blank lines.
+            for append, index in appends:
+                append(row[index])
+            extend(map(to_int, get_ints(row)))
+
+    return text_columns, int_values
+
+
+@instrumentation.timed
+def dicts_to_csv(list_of_dicts, file_name, header_column_names=None):
     """Stores the content of a list of dictionaries as rows in a CSV file.
 
     Retrieves the keys and values of each dictionary and adds the values of each
     dictionary to their own row in a CSV file. The keys of each dictionary are
-    used as the column names of the CSV file's header row.
+    used as the column names of the CSV file's header row unless the column
+    names are given.
+
+    The dictionaries can come from any iterable, such as a generator, and are
+    written a chunk at a time by export_writer, so exports of any size are
+    written in bounded memory, and the CSV file only appears once it is
+    complete.
 
     Args:
-        list_of_dicts: A list that contains dictionaries whose values will be
-            added to a CSV file as rows.
+        list_of_dicts: An iterable that contains dictionaries whose values will
+            be added to a CSV file as rows.
         file_name: A string that contains the name of the CSV file that is
             created.
+        header_column_names: An optional list of the column names of the CSV
+            file's header row. Defaults to the keys of the first dictionary.
+            When the column names are given, any other keys are left out.
 
     Returns:
         A CSV file whose header row is composed of each dictionary's keys and
@@ -61,10 +176,4 @@ def dicts_to_csv(list_of_dicts, file_name):
         dog, Buddy, 2
         bird, Jim, 4
     """
-    with open('%s.csv' % (file_name), 'w') as csvfile:
-        header_column_names = list_of_dicts[0].keys()  # CSV file header row.
-        writer = csv.DictWriter(csvfile, fieldnames=header_column_names)
-        writer.writeheader()
-
-        for dct in list_of_dicts:
-            writer.writerow(dct)
+    export_writer.write_dicts(list_of_dicts, file_name, header_column_names)
@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 """
 Module for painting output on and obtaining input from a text-based terminal
@@ -6,9 +6,21 @@ window using the curses library.
 """
 
 import curses
+import instrumentation
 import textwrap
 
 
+def get_string(screen, output_line, output_column):
+    # Returns a string that the user enters in as input at a location of a
+    # text-based terminal window. Python 3 returns the input as bytes, which
+    # are decoded.
+    input = screen.getstr(output_line, output_column)
+    if isinstance(input, bytes):
+        input = input.decode('utf-8', 'replace')
+
+    return input
+
+
 def display_string(screen, a_string, output_line):
     # Paints a string on a text-based terminal window.
     _, width = screen.getmaxyx()
@@ -60,17 +72,18 @@ def display_string_with_prompt(screen, first_line_num, a_string, prompt):
     Returns:
         A string that the user enters in as input.
     """
-    screen.clear()
+    with instrumentation.span('curses_io.display_string_with_prompt'):
+        screen.clear()
 
-    output_line = first_line_num
-    output_line = display_string(screen, a_string, output_line)
+        output_line = first_line_num
+        output_line = display_string(screen, a_string, output_line)
 
-    output_line += 3
-    output_line = display_string(screen, prompt, output_line)
+        output_line += 3
+        output_line = display_string(screen, prompt, output_line)
 
-    screen.refresh()
+        screen.refresh()
 
-    return screen.getstr(output_line, len(prompt) + 1)
+    return get_string(screen, output_line, len(prompt) + 1)
 
 
 def display_list_items_with_prompt(screen, first_line_num, a_string, a_list,
@@ -94,20 +107,21 @@ def display_list_items_with_prompt(screen, first_line_num, a_string, a_list,
     Returns:
         A string that the user enters in as input.
     """
-    screen.clear()
+    with instrumentation.span('curses_io.display_list_items_with_prompt'):
+        screen.clear()
 
-    output_line = first_line_num
-    output_line = display_string(screen, a_string, output_line)
+        output_line = first_line_num
+        output_line = display_string(screen, a_string, output_line)
 
-    output_line += 2
-    output_line = display_list_items(screen, a_list, output_line)
+        output_line += 2
+        output_line = display_list_items(screen, a_list, output_line)
 
-    output_line += 1
-    output_line = display_string(screen, prompt, output_line)
+        output_line += 1
+        output_line = display_string(screen, prompt, output_line)
 
-    screen.refresh()
+        screen.refresh()
 
-    return screen.getstr(output_line, len(prompt) + 1)
+    return get_string(screen, output_line, len(prompt) + 1)
 
 
 def display_formatted_dicts_with_prompt(screen, first_line_num, a_string,
@@ -132,22 +146,24 @@ def display_formatted_dicts_with_prompt(screen, first_line_num, a_string,
     Returns:
         A string that the user enters in as input.
     """
-    screen.clear()
+    with instrumentation.span(
+            'curses_io.display_formatted_dicts_with_prompt'):
+        screen.clear()
 
-    output_line = first_line_num
-    output_line = display_string(screen, a_string, output_line)
+        output_line = first_line_num
+        output_line = display_string(screen, a_string, output_line)
 
-    output_line += 2
-    for dct in list_of_dicts:
-        output_line = display_formatted_dict(screen, dct, output_line)
-        output_line += 1
+        output_line += 2
+        for dct in list_of_dicts:
+            output_line = display_formatted_dict(screen, dct, output_line)
+            output_line += 1
 
-    output_line += 1
-    output_line = display_string(screen, prompt, output_line)
+        output_line += 1
+        output_line = display_string(screen, prompt, output_line)
 
-    screen.refresh()
+        screen.refresh()
 
-    return screen.getstr(output_line, len(prompt) + 1)
+    return get_string(screen, output_line, len(prompt) + 1)
 
 
 def get_user_menu_selection(screen, first_line_num, a_string, menu_items,
@@ -185,25 +201,251 @@ def get_user_menu_selection(screen, first_line_num, a_string, menu_items,
         item_key += 1
     # Display the menu and prompt the user for a selection.
     while True:
-        screen.clear()
+        with instrumentation.span('curses_io.get_user_menu_selection'):
+            screen.clear()
 
-        output_line = first_line_num
-        output_line = display_string(screen, a_string, output_line)
+            output_line = first_line_num
+            output_line = display_string(screen, a_string, output_line)
 
-        output_line += 3
-        for menu_num in sorted(selection_items.iterkeys()):
-            item_line = '%s) %s' % (menu_num, selection_items[menu_num])
-            output_line = display_string(screen, item_line, output_line)
-            output_line += 1
+            output_line += 3
+            for menu_num in sorted(selection_items):
+                item_line = '%s) %s' % (menu_num, selection_items[menu_num])
+                output_line = display_string(screen, item_line, output_line)
+                output_line += 1
 
-        output_line += 1
-        output_line = display_string(screen, prompt, output_line)
+            output_line += 1
+            output_line = display_string(screen, prompt, output_line)
 
-        screen.refresh()
+            screen.refresh()
 
-        input = screen.getstr(output_line, len(prompt) + 1)
+        input = get_string(screen, output_line, len(prompt) + 1)
 
         if input not in selection_items.keys():
             continue  # Force the user to enter a valid selection.
         else:
             return selection_items[input]
+
+
+# Keys that move the viewport of a RowViewer, and the number of pages that each
+# one moves it by. Moving by None pages moves the viewport by one row.
+SCROLL_KEYS = {curses.KEY_DOWN: (1, None), ord('j'): (1, None),
+               curses.KEY_UP: (-1, None), ord('k'): (-1, None),
+               curses.KEY_NPAGE: (None, 1), ord(' '): (None, 1),
+               ord('f'): (None, 1), curses.KEY_PPAGE: (None, -1),
+               ord('b'): (None, -1)}
+FIRST_ROW_KEYS = (curses.KEY_HOME, ord('g'))
+LAST_ROW_KEYS = (curses.KEY_END, ord('G'))
+JUMP_KEYS = (ord('#'), ord(':'))
+RETURN_KEYS = (ord('r'), ord('R'), ord('q'), ord('Q'))
+
+VIEWER_HELP = ('j/k: scroll  f/b: page  g/G: first/last  #: jump to rank  '
+               'r: return')
+
+
+class RowViewer:
+    """Scrollable viewport of ranked rows painted on a curses pad.
+
+    Only the rows inside the viewport are requested and formatted, and each
+    pass only repaints the lines of the viewport that differ from the lines
+    painted by the previous pass, so scrolling through thousands of rows sends
+    little more than the changed lines to the terminal.
+
+    Attributes:
+        screen: A window object that represents the text-based terminal window.
+        first_line_num: An integer that represents the location along the y-axis
+            of the terminal window where the heading is painted.
+        a_string: A string that is painted as the heading above the rows.
+        column_names: A list of the names of the columns of each row.
+        num_rows: An integer that represents the number of rows.
+        get_rows: A function that takes a start and stop rank and returns a list
+            of the dictionaries of the rows ranked from 'start' up to, but not
+            including, 'stop', keyed by 'column_names'.
+        top: An integer that represents the rank, counted from 0, of the row at
+            the top of the viewport.
+        pad: A pad object that the rows inside the viewport are painted on.
+        painted_lines: A list of the strings painted on each line of the pad by
+            the previous pass, or None for lines that must be repainted.
+        status: The string painted on the status line by the previous pass,
+            or None if the status line must be repainted.
+    """
+
+    def __init__(self, screen, first_line_num, a_string, column_names,
+                 num_rows, get_rows):
+        self.screen = screen
+        self.first_line_num = first_line_num
+        self.a_string = a_string
+        self.column_names = column_names
+        self.num_rows = num_rows
+        self.get_rows = get_rows
+        self.top = 0
+        self.pad = None
+        self.painted_lines = []
+        self.status = None
+        self.layout()
+
+    def layout(self):
+        # Sizes the viewport and its pad to the terminal window and paints the
+        # heading, column names, and help, which only change when the window
+        # is resized.
+        height, self.width = self.screen.getmaxyx()
+        heading = textwrap.wrap(self.a_string, self.width - 1) or ['']
+        self.header_line = self.first_line_num + len(heading) + 1
+        self.viewport_top = self.header_line + 1
+        # Leave room for the help and status lines below the viewport.
+        self.viewport_height = max(1, height - self.viewport_top - 2)
+        self.rank_width = len('{:,}'.format(self.num_rows))
+        self.value_width = max([16] + [len(name)
+                                       for name in self.column_names[1:]])
+
+        self.screen.clear()
+        for line_num, line in enumerate(heading):
+            self.add_line(self.screen, self.first_line_num + line_num, line)
+        self.add_line(self.screen, self.header_line,
+                      self.format_line('Rank', self.column_names))
+        self.add_line(self.screen, height - 2, VIEWER_HELP)
+        self.screen.noutrefresh()
+
+        self.pad = curses.newpad(self.viewport_height + 1, self.width)
+        self.painted_lines = [None] * self.viewport_height
+        self.status = None
+        self.scroll_to(self.top)
+
+    def add_line(self, window, line_num, line):
+        # Paints a line on a window, cut to the width of the terminal window,
+        # and clears the rest of the line.
+        try:
+            window.move(line_num, 0)
+            window.clrtoeol()
+            window.addstr(line_num, 0, line[:self.width - 1])
+        except curses.error:
+            pass  # The line is outside of a window that is too small.
+
+    def format_line(self, rank, values):
+        # Returns a line that contains a rank followed by the values of a row,
+        # with the first value left-aligned and the others right-aligned.
+        name_width = max(1, self.width - 1 - self.rank_width - 2 -
+                         (self.value_width + 2) * (len(values) - 1))
+        cells = ['%*s' % (self.rank_width, rank),
+                 '%-*s' % (name_width, values[0])[:name_width]]
+        for value in values[1:]:
+            if isinstance(value, int):
+                value = '{:,}'.format(value)
+            cells.append('%*s' % (self.value_width, value))
+
+        return '  '.join(cells)
+
+    def scroll_to(self, top):
+        # Moves the top of the viewport to a rank, keeping the last page full.
+        last_top = max(0, self.num_rows - self.viewport_height)
+        self.top = min(max(0, top), last_top)
+
+    def scroll(self, rows=None, pages=None):
+        # Moves the viewport by a number of rows or pages.
+        if pages is not None:
+            rows = pages * self.viewport_height
+        self.scroll_to(self.top + rows)
+
+    def paint(self):
+        # Repaints the lines of the viewport and the status line that changed
+        # since the previous pass and updates the terminal once.
+        with instrumentation.span('curses_io.RowViewer.paint'):
+            stop = min(self.num_rows, self.top + self.viewport_height)
+            rows = self.get_rows(self.top, stop)
+            for line_num in range(self.viewport_height):
+                line = ''
+                if line_num < len(rows):
+                    line = self.format_line(
+                        '{:,}'.format(self.top + line_num + 1),
+                        [rows[line_num][name] for name in self.column_names])
+                if line != self.painted_lines[line_num]:
+                    self.add_line(self.pad, line_num, line)
+                    self.painted_lines[line_num] = line
+            self.pad.noutrefresh(0, 0, self.viewport_top, 0,
+                                 self.viewport_top + self.viewport_height - 1,
+                                 self.width - 1)
+
+            status = 'Rows %s-%s of %s' % ('{:,}'.format(min(self.top + 1,
+                                                             stop)),
+                                           '{:,}'.format(stop),
+                                           '{:,}'.format(self.num_rows))
+            if status != self.status:
+                height, _ = self.screen.getmaxyx()
+                self.add_line(self.screen, height - 1, status)
+                self.screen.noutrefresh()
+                self.status = status
+
+            curses.doupdate()
+
+    def get_rank_from_user(self):
+        # Prompts for a rank on the status line and returns it, or None if the
+        # input is not a number.
+        height, _ = self.screen.getmaxyx()
+        prompt = 'Jump to rank:'
+        self.add_line(self.screen, height - 1, prompt)
+        self.status = None
+        curses.echo()
+        try:
+            return int(self.screen.getstr(height - 1, len(prompt) + 1))
+        except ValueError:
+            return None
+        finally:
+            curses.noecho()
+
+    def run(self):
+        # Paints the viewport and handles keys until the user returns.
+        while True:
+            self.paint()
+            key = self.screen.getch()
+            if key in RETURN_KEYS:
+                return
+            elif key in SCROLL_KEYS:
+                self.scroll(*SCROLL_KEYS[key])
+            elif key in FIRST_ROW_KEYS:
+                self.scroll_to(0)
+            elif key in LAST_ROW_KEYS:
+                self.scroll_to(self.num_rows)
+            elif key in JUMP_KEYS:
+                rank = self.get_rank_from_user()
+                if rank is not None:
+                    self.scroll_to(rank - 1)
+            elif key == curses.KEY_RESIZE:
+                self.layout()
+
+
+def view_rows(screen, first_line_num, a_string, column_names, num_rows,
+              get_rows):
+    """Paints a string and a scrollable viewport of rows until the user returns.
+
+    Paints a string and the rows ranked inside a viewport that fills the rest
+    of the text-based terminal window. The user scrolls the viewport by rows
+    or pages, jumps to the first or last row or to a rank, and returns by
+    entering "r".
+
+    Args:
+        screen: A window object that represents the text-based terminal window.
+        first_line_num: An integer that represents the location along the y-axis
+            of the terminal window where the first character of the string is
+            painted.
+        a_string: The string that is painted above the rows.
+        column_names: A list of the names of the columns of each row.
+        num_rows: An integer that represents the number of rows.
+        get_rows: A function that takes a start and stop rank and returns a list
+            of the dictionaries of the rows ranked from 'start' up to, but not
+            including, 'stop', keyed by 'column_names'.
+    """
+    curses.noecho()
+    screen.keypad(True)
+    try:
+        curses.curs_set(0)
+    except curses.error:
+        pass  # The terminal cannot hide the cursor.
+    try:
+        RowViewer(screen, first_line_num, a_string, column_names, num_rows,
+                  get_rows).run()
+    finally:
+        try:
+            curses.curs_set(1)
+        except curses.error:
+            pass
+        screen.keypad(False)
+        curses.echo()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+
+"""
+Module for merging every vintage of a division's PEP CSV files into one store
+of annual population estimates.
+
+The Census Bureau releases a new vintage of each division's CSV file every year,
+named like 'county_PEP_2019_PEPANNRES_with_ann.csv', that adds the estimates of
+one more year. A DivisionStore keeps the estimates of each year in its own
+column, keyed by GEO.id, so a new vintage is merged by parsing and appending
+only its new year columns, and only the compound annual growth rates of the
+geographies in the new vintage are recalculated. Stores are saved to the cache
+folder between runs along with the size and modification time of each vintage
+that they were built from.
+"""
+
+from constants import *
+import array
+import csv_dicts
+import geography
+import os
+import pickle
+
+# Version of the layout of saved stores.
+STORE_VERSION = 2
+
+# Value stored for the years that a geography has no estimate for, such as the
+# years before a new county was created.
+MISSING = -1
+
+# Names of the columns of the GEO.id and GEO.id2 codes in the CSV files.
+KEY_COLUMN = 'Id'
+
+
+def discover_vintages(csv_path, division):
+    # Returns a list of (year, path) tuples for every vintage of a division's
+    # CSV files in a folder, from oldest to newest.
+    vintages = []
+    for file_name in os.listdir(csv_path):
+        match = VINTAGE_CSV_PATTERN.match(file_name)
+        if match and match.group(1) == division:
+            vintages.append((int(match.group(2)),
+                             os.path.join(csv_path, file_name)))
+
+    return sorted(vintages)
+
+
+def get_year_columns(header_column_names):
+    # Returns a dict of years and the names of the columns that contain the
+    # annual population estimates of each year.
+    year_columns = {}
+    for column_name in header_column_names:
+        match = ANN_POP_EST_PATTERN.match(column_name)
+        if match:
+            year_columns[int(match.group(1))] = column_name
+
+    return year_columns
+
+
+def get_file_key(csv_file):
+    # Returns the size and modification time of a file.
+    stat = os.stat(csv_file)
+    return stat.st_size, stat.st_mtime
+
+
+class DivisionStore:
+    """Class for storing the merged vintages of a division's estimates.
+
+    Attributes:
+        division: A string that contains the name of the division, such as
+            'county'.
+        keys: A list of the GEO.id code of each geography.
+        rows: A dict of GEO.id codes and the row of each geography.
+        names: A list of the name of each geography from the newest vintage
+            that contains it.
+        ids: A list of the GEO.id2 (FIPS) code of each geography.
+        years: A list of the years that the store has estimates for, in order.
+        columns: A dict of years and arrays of integers that contain every
+            geography's estimate for each year, or MISSING.
+        cagrs: An array of floats that contains each geography's compound
+            annual growth rate over the years that it has estimates for.
+        vintages: A dict of the paths of the merged CSV files and their vintage
+            years, sizes, and modification times.
+        version: An integer that represents the layout of the store.
+    """
+
+    def __init__(self, division):
+        self.division = division
+        self.keys = []
+        self.rows = {}
+        self.names = []
+        self.ids = []
+        self.years = []
+        self.columns = {}
+        self.cagrs = array.array('d')
+        self.vintages = {}
+        self.version = STORE_VERSION
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get_row(self, key):
+        # Returns the row of a GEO.id code, adding a row of missing estimates
+        # for it if the store does not contain it yet.
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            self.rows[key] = row
+            self.keys.append(key)
+            self.names.append('')
+            self.ids.append('')
+            self.cagrs.append(0.0)
+            for column in self.columns.values():
+                column.append(MISSING)
+
+        return row
+
+    def add_year(self, year):
+        # Adds a column of missing estimates for a year after the last year.
+        self.years.append(year)
+        self.columns[year] = array.array('q', [MISSING]) * len(self.keys)
+
+    def merge_vintage(self, vintage_year, csv_file):
+        """Merges a vintage of the division's CSV files into the store.
+
+        Only the columns of the years after the store's last year are parsed
+        and appended, unless the store is empty, in which case every year of
+        the vintage is added. The names of the geographies in the vintage are
+        updated, and their compound annual growth rates are recalculated.
+
+        Args:
+            vintage_year: An integer that represents the vintage of the CSV
+                file, which is the last year that it has estimates for.
+            csv_file: A string that contains the path to the CSV file.
+
+        Returns:
+            A list of the rows of the geographies in the vintage.
+        """
+        header_column_names = csv_dicts.read_csv_header(csv_file,
+                                                        HEADER_ROW_NUM)
+        year_columns = get_year_columns(header_column_names)
+        last_year = self.years[-1] if self.years else None
+        new_years = [year for year in sorted(year_columns)
+                     if last_year is None or year > last_year]
+        for year in new_years:
+            self.add_year(year)
+
+        # Only the columns of the years that the store has are parsed, with
+        # csv_dicts.read_csv_columns rather than a dictionary for each row.
+        years = [year for year in self.years if year in year_columns]
+        text_column_names = [KEY_COLUMN, GEO_KEY]
+        if GEO_ID_KEY in header_column_names:
+            text_column_names.append(GEO_ID_KEY)
+        text_columns, pop_ests = csv_dicts.read_csv_columns(
+            csv_file, HEADER_ROW_NUM, text_column_names,
+            [year_columns[year] for year in years], missing=MISSING)
+        keys, names = text_columns[:2]
+        ids = text_columns[2] if len(text_columns) > 2 else [''] * len(keys)
+
+        columns = [self.columns[year] for year in years]
+        new_columns = columns[len(years) - len(new_years):]
+        affected_rows = []
+        for i, key in enumerate(keys):
+            # Geographies that are new in the vintage get every year that the
+            # store has, rather than only the new years.
+            row_columns = new_columns if key in self.rows else columns
+            row = self.get_row(key)
+            self.names[row] = names[i]
+            self.ids[row] = ids[i]
+            start = (i + 1) * len(years) - len(row_columns)
+            for index, column in enumerate(row_columns, start):
+                column[row] = pop_ests[index]
+            affected_rows.append(row)
+
+        self.vintages[csv_file] = (vintage_year,) + get_file_key(csv_file)
+        self.update_cagrs(affected_rows)
+
+        return affected_rows
+
+    def update_cagrs(self, rows):
+        # Recalculates the compound annual growth rates of the geographies in
+        # a list of rows from their first and last estimates.
+        for row in rows:
+            pop_ests = [self.columns[year][row] for year in self.years
+                        if self.columns[year][row] != MISSING]
+            if len(pop_ests) < 1 or pop_ests[0] <= 0:
+                self.cagrs[row] = 0.0
+                continue
+            self.cagrs[row] = (pop_ests[-1] / float(pop_ests[0]))**(
+                1 / float(max(len(pop_ests) - 1, 1))) - 1
+
+    def is_up_to_date(self, vintages):
+        # Returns True if the store was built from exactly a list of (year,
+        # path) vintages and none of them have changed since.
+        if set(self.vintages) != set(path for _, path in vintages):
+            return False
+        return all(self.vintages[path] == (year,) + get_file_key(path)
+                   for year, path in vintages)
+
+    def get_new_vintages(self, vintages):
+        # Returns the vintages in a list of (year, path) tuples that are newer
+        # than every merged vintage, or None if a merged vintage has changed or
+        # an older vintage has been added, which requires the store to be
+        # rebuilt.
+        for path, key in self.vintages.items():
+            if not os.path.exists(path) or key[1:] != get_file_key(path):
+                return None
+        last_year = max([key[0] for key in self.vintages.values()] or [None])
+        new_vintages = [(year, path) for year, path in vintages
+                        if path not in self.vintages]
+        if last_year is not None and any(year <= last_year
+                                         for year, _ in new_vintages):
+            return None
+
+        return new_vintages
+
+    def to_geography_table(self, years=None):
+        """Returns a GeographyTable of the geographies with every estimate.
+
+        Args:
+            years: An optional list of the consecutive years that the table
+                contains estimates for. Defaults to every year in the store.
+
+        Returns:
+            A GeographyTable that contains the geographies that have estimates
+            for every one of the years, in the order that they were first
+            merged, with the compound annual growth rates of the store when the
+            years are every year in the store.
+        """
+        if years is None:
+            years = self.years
+        columns = [self.columns[year] for year in years]
+        use_cagrs = list(years) == self.years
+
+        names = []
+        ids = []
+        pop_ests = array.array('q')
+        cagrs = array.array('d')
+        for row in range(len(self.keys)):
+            row_pop_ests = [column[row] for column in columns]
+            if MISSING in row_pop_ests:
+                continue
+            names.append(self.names[row])
+            ids.append(self.ids[row])
+            pop_ests.extend(row_pop_ests)
+            cagrs.append(self.cagrs[row])
+
+        return geography.GeographyTable(names, pop_ests, len(years),
+                                        cagrs if use_cagrs else None, ids)
+
+
+def get_store_file(division, cache_folder):
+    # Returns the path of the saved store of a division.
+    return os.path.join(cache_folder, '%s.store' % (division))
+
+
+def read_store(store_file):
+    # Returns the DivisionStore saved in a file, or None if the file does not
+    # exist, cannot be unpickled, or was saved with another layout. Stores
+    # saved by other versions of the classes that they contain can fail to
+    # unpickle with almost any error, and are rebuilt like a missing store.
+    try:
+        with open(store_file, 'rb') as input_file:
+            store = pickle.load(input_file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError, IndexError, TypeError, ValueError):
+        return None
+    if getattr(store, 'version', None) != STORE_VERSION:
+        return None
+
+    return store
+
+
+def write_store(store, store_file):
+    # Saves a DivisionStore to a file, writing a temporary file first so that
+    # a partially written store is never read. Errors are ignored because the
+    # saved store is only an optimization.
+    temp_file = '%s.%s.tmp' % (store_file, os.getpid())
+    try:
+        folder = os.path.dirname(store_file)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(temp_file, 'wb') as output_file:
+            pickle.dump(store, output_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_file, store_file)
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def load_division_store(division, csv_path=CSV_PATH,
+                        cache_folder=CACHE_FOLDER):
+    """Loads a division's store and merges any new vintages into it.
+
+    Reads the division's saved store from the cache folder and merges the
+    vintages in the CSV folder that are newer than every vintage in it. The
+    store is rebuilt from every vintage if it has not been saved, if a merged
+    vintage has changed, or if an older vintage has been added. The store is
+    saved again whenever it changes.
+
+    Args:
+        division: A string that contains the name of the division, such as
+            'county'.
+        csv_path: A string that contains the path to the folder of CSV files.
+        cache_folder: A string that contains the path to the folder of saved
+            stores.
+
+    Returns:
+        A DivisionStore.
+    """
+    vintages = discover_vintages(csv_path, division)
+    store_file = get_store_file(division, cache_folder)
+    store = read_store(store_file)
+
+    new_vintages = None
+    if store is not None:
+        if store.is_up_to_date(vintages):
+            return store
+        new_vintages = store.get_new_vintages(vintages)
+    if new_vintages is None:
+        store = DivisionStore(division)
+        new_vintages = vintages
+
+    for year, path in new_vintages:
+        store.merge_vintage(year, path)
+    write_store(store, store_file)
+
+    return store
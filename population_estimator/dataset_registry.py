@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+Module for keeping loaded datasets in memory between uses.
+"""
+
+import collections
+import sys
+import threading
+
+
+class PendingDataset:
+    """Class for storing the outcome of a dataset that is being loaded.
+
+    Requests for a dataset that another thread is loading wait on it until the
+    load finishes. It does the work of a concurrent.futures.Future without
+    importing concurrent.futures, and the logging module that it imports, when
+    the registry is created.
+
+    Attributes:
+        done: A threading.Event that is set when the load finishes.
+        dataset: The loaded dataset, or None.
+        error: The exception raised while loading the dataset, or None.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.dataset = None
+        self.error = None
+
+    def set_result(self, dataset):
+        # Stores the loaded dataset and wakes the waiting requests.
+        self.dataset = dataset
+        self.done.set()
+
+    def set_exception(self, error):
+        # Stores the exception raised while loading the dataset and wakes the
+        # waiting requests.
+        self.error = error
+        self.done.set()
+
+    def exception(self):
+        # Returns the exception raised while loading the dataset, or None,
+        # waiting for the load to finish first.
+        self.done.wait()
+        return self.error
+
+    def result(self):
+        # Returns the loaded dataset, waiting for the load to finish first, or
+        # raises the exception raised while loading it.
+        if self.exception() is not None:
+            raise self.error
+        return self.dataset
+
+
+class DatasetRegistry:
+    """Class for storing loaded datasets with least recently used eviction.
+
+    Loads a dataset the first time that its key is requested and keeps it in
+    memory for later requests. When storing a dataset would exceed the entry or
+    memory budget, the least recently used datasets are evicted first.
+
+    Datasets can also be prefetched on a background thread. The registry is
+    safe to use from several threads, and a request for a dataset that is
+    still being loaded waits for that load instead of starting another one.
+
+    Attributes:
+        load_dataset: A function that takes a key and returns the dataset for
+            that key.
+        max_entries: An integer that represents the maximum number of datasets
+            that are stored, or None for no limit.
+        max_bytes: An integer that represents the maximum combined size of the
+            stored datasets in bytes, or None for no limit.
+        get_size: A function that takes a dataset and returns its size in
+            bytes.
+        datasets: An OrderedDict of keys and datasets ordered from least to
+            most recently used.
+        sizes: A dict of keys and the size of each stored dataset in bytes.
+        hits: An integer that represents the number of requests that were
+            answered by a stored dataset.
+        misses: An integer that represents the number of requests that
+            required a dataset to be loaded.
+        evictions: An integer that represents the number of datasets that have
+            been evicted.
+        waits: An integer that represents the number of requests that waited
+            for a dataset that another thread was loading.
+        pending: A dict of keys and the PendingDatasets of the datasets that
+            are being loaded.
+        lock: A lock that guards the registry's attributes.
+        prefetch_keys: A list of the keys that are being or were prefetched.
+        prefetched: An integer that represents the number of prefetched keys
+            that have finished loading.
+        prefetch_errors: A dict of prefetched keys and the exceptions raised
+            while loading them.
+    """
+
+    def __init__(self, load_dataset, max_entries=None, max_bytes=None,
+                 get_size=sys.getsizeof):
+        self.load_dataset = load_dataset
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.get_size = get_size
+        self.datasets = collections.OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.waits = 0
+        self.pending = {}
+        self.lock = threading.RLock()
+        self.prefetch_keys = []
+        self.prefetched = 0
+        self.prefetch_errors = {}
+
+    def __contains__(self, key):
+        return key in self.datasets
+
+    def __len__(self):
+        return len(self.datasets)
+
+    def get(self, key):
+        # Returns the dataset for a key, loading it if it is not stored, or
+        # waiting for it if another thread is loading it.
+        with self.lock:
+            if key in self.datasets:
+                self.hits += 1
+                self.datasets.move_to_end(key)
+                dataset = self.datasets[key]
+                # Datasets can grow while they are in use, so they are
+                # measured again on every request.
+                self.sizes[key] = self.get_size(dataset)
+                self.evict(keep=key)
+                return dataset
+
+            pending_dataset = self.pending.get(key)
+            if pending_dataset is None:
+                self.misses += 1
+                pending_dataset = self.pending[key] = PendingDataset()
+                loading = True
+            else:
+                self.waits += 1
+                loading = False
+
+        if loading:
+            self.load(key, pending_dataset)
+
+        return pending_dataset.result()
+
+    def load(self, key, pending_dataset):
+        # Loads the dataset for a key, stores it, and resolves the
+        # PendingDataset that requests for the key are waiting on. The lock is
+        # not held while the dataset loads, so other datasets can be requested
+        # in the meantime.
+        try:
+            dataset = self.load_dataset(key)
+        except BaseException as exception:
+            with self.lock:
+                del self.pending[key]
+            pending_dataset.set_exception(exception)
+            return
+
+        with self.lock:
+            self.datasets[key] = dataset
+            self.sizes[key] = self.get_size(dataset)
+            del self.pending[key]
+            self.evict(keep=key)
+        pending_dataset.set_result(dataset)
+
+    def prefetch(self, keys):
+        """Loads datasets on a background thread.
+
+        The datasets are loaded one at a time, in the order of the keys, by a
+        daemon thread, so an unfinished prefetch never keeps the process from
+        exiting. Keys whose datasets are already stored or being loaded are
+        skipped.
+
+        Args:
+            keys: A list of the keys of the datasets to load.
+
+        Returns:
+            The Thread that loads the datasets.
+        """
+        with self.lock:
+            self.prefetch_keys = list(keys)
+            self.prefetched = 0
+            self.prefetch_errors = {}
+        thread = threading.Thread(target=self.prefetch_datasets,
+                                  args=(self.prefetch_keys,),
+                                  name='dataset-prefetch')
+        thread.daemon = True
+        thread.start()
+
+        return thread
+
+    def prefetch_datasets(self, keys):
+        # Loads each dataset that is not stored or being loaded. Errors are
+        # recorded rather than raised, so the dataset is loaded again, and the
+        # error raised, when it is requested.
+        for key in keys:
+            with self.lock:
+                pending_dataset = None
+                if key not in self.datasets and key not in self.pending:
+                    pending_dataset = self.pending[key] = PendingDataset()
+            if pending_dataset is not None:
+                self.load(key, pending_dataset)
+                if pending_dataset.exception() is not None:
+                    with self.lock:
+                        self.prefetch_errors[key] = pending_dataset.exception()
+            with self.lock:
+                self.prefetched += 1
+
+    def get_progress(self):
+        # Returns the number of prefetched keys that have finished loading and
+        # the number of keys that are prefetched.
+        with self.lock:
+            return self.prefetched, len(self.prefetch_keys)
+
+    def get_total_size(self):
+        # Returns the combined size of the stored datasets in bytes.
+        return sum(self.sizes.values())
+
+    def evict(self, keep=None):
+        # Evicts the least recently used datasets until the stored datasets fit
+        # within the budgets. The dataset for the 'keep' key is never evicted.
+        while self.datasets:
+            over_entries = (self.max_entries is not None and
+                            len(self.datasets) > self.max_entries)
+            over_bytes = (self.max_bytes is not None and
+                          self.get_total_size() > self.max_bytes)
+            if not (over_entries or over_bytes):
+                break
+            key = next(iter(self.datasets))
+            if key == keep:
+                if len(self.datasets) == 1:
+                    break
+                self.datasets.move_to_end(key)
+                continue
+            del self.datasets[key]
+            del self.sizes[key]
+            self.evictions += 1
+
+    def clear(self):
+        # Removes every stored dataset.
+        with self.lock:
+            self.datasets.clear()
+            self.sizes.clear()
+
+    def get_stats(self):
+        # Returns a dict of the registry's hit, miss, and eviction counts along
+        # with the number and combined size of the stored datasets.
+        with self.lock:
+            return collections.OrderedDict([
+                ('hits', self.hits),
+                ('misses', self.misses),
+                ('waits', self.waits),
+                ('evictions', self.evictions),
+                ('entries', len(self.datasets)),
+                ('bytes', self.get_total_size())])
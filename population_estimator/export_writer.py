@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+Module for writing exports of any size quickly and safely.
+
+Rows are formatted a chunk at a time into an in-memory buffer and written to
+the export file in one large write per chunk, through a large file buffer, so
+the cost of each write call is shared by thousands of rows. Exports can be
+written as CSV or JSON Lines, and either can be compressed with gzip, or with
+zstd on versions of Python that include it, which cuts the number of bytes that
+reach the disk.
+
+Every export is written to a temporary file in the folder of the export file
+and flushed to disk before it is renamed to the export file's name, so an
+interrupted export never leaves a partial file behind, and an earlier export
+with the same name is only replaced once the new one is complete.
+"""
+
+import csv
+import io
+import itertools
+import operator
+import os
+import time
+
+try:
+    from compression import zstd  # Included with Python 3.14 and later.
+except ImportError:
+    zstd = None
+
+# Output formats and the extensions of their files.
+FORMATS = {'csv': '.csv', 'jsonl': '.jsonl'}
+
+# Compressions and the extensions that they add to the names of files.
+COMPRESSIONS = {'gzip': '.gz'}
+if zstd is not None:
+    COMPRESSIONS['zstd'] = '.zst'
+
+# Number of characters of rows that are formatted before each write. Chunks
+# are kept small enough that the memory of an export does not grow with its
+# size, while the file buffer gathers them into larger writes.
+CHUNK_SIZE = 64 * 1024
+
+# Number of bytes that are buffered before each write to the disk.
+BUFFER_SIZE = 1024 * 1024
+
+# Fastest gzip level, since the disk rather than the compression is the
+# bottleneck of large exports.
+GZIP_LEVEL = 1
+
+ENCODING = 'utf-8'
+
+
+class ExportStats:
+    """Class for storing how much an export wrote and how long it took.
+
+    Attributes:
+        path: A string that contains the path of the export file.
+        num_rows: An integer that represents the number of rows written.
+        num_bytes: An integer that represents the number of bytes of the rows
+            before compression.
+        file_size: An integer that represents the size of the export file in
+            bytes.
+        seconds: A float that represents how long the export took.
+    """
+
+    def __init__(self, path, num_rows, num_bytes, file_size, seconds):
+        self.path = path
+        self.num_rows = num_rows
+        self.num_bytes = num_bytes
+        self.file_size = file_size
+        self.seconds = seconds
+
+    def get_bytes_per_second(self):
+        # Returns the number of bytes of rows written per second.
+        if not self.seconds:
+            return None
+        return self.num_bytes / self.seconds
+
+    def get_summary(self):
+        # Returns a string that describes the export.
+        return '%s: %s rows, %s bytes (%s on disk) in %.2f s, %s' % (
+            self.path, '{:,}'.format(self.num_rows),
+            '{:,}'.format(self.num_bytes), '{:,}'.format(self.file_size),
+            self.seconds, format_rate(self.get_bytes_per_second()))
+
+
+def format_rate(bytes_per_second):
+    # Returns a string that represents a number of bytes per second in
+    # megabytes per second.
+    if bytes_per_second is None:
+        return 'n/a'
+    return '%.1f MB/s' % (bytes_per_second / 1e6)
+
+
+def get_export_path(file_name, output_format='csv', compression=None):
+    # Returns the path of the export file of a file name without an extension.
+    return '%s%s%s' % (file_name, FORMATS[output_format],
+                       COMPRESSIONS[compression] if compression else '')
+
+
+def open_compressed(output_file, compression):
+    # Returns a binary file object that compresses what is written to it into
+    # an open file, or the file itself if there is no compression.
+    if compression is None:
+        return output_file
+    elif compression == 'gzip':
+        import gzip
+
+        return gzip.GzipFile(fileobj=output_file, mode='wb',
+                             compresslevel=GZIP_LEVEL, mtime=0)
+    elif compression == 'zstd' and zstd is not None:
+        return zstd.ZstdFile(output_file, mode='wb')
+
+    raise ValueError('Unsupported compression: %s' % (compression))
+
+
+def iter_csv_chunks(dicts, header_column_names):
+    # Yields strings of CSV rows, starting with the header row, of about
+    # CHUNK_SIZE characters each, along with their number of rows. Keys that
+    # are not column names are left out, and missing keys are written as empty
+    # values.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header_column_names)
+    writerow = writer.writerow
+    tell = buffer.tell
+    get_values = get_values_getter(header_column_names)
+    chunk_rows = 0
+    for row in dicts:
+        try:
+            writerow(get_values(row))
+        except KeyError:
+            writerow([row.get(name, '') for name in header_column_names])
+        chunk_rows += 1
+        if tell() >= CHUNK_SIZE:
+            yield buffer.getvalue(), chunk_rows
+            buffer.seek(0)
+            buffer.truncate()
+            chunk_rows = 0
+    yield buffer.getvalue(), chunk_rows
+
+
+def get_values_getter(header_column_names):
+    # Returns a function that returns the values of the column names' keys of
+    # a dictionary in a sequence.
+    if not header_column_names:
+        return lambda row: ()
+    elif len(header_column_names) == 1:
+        # itemgetter returns a single value rather than a tuple for one key.
+        name = header_column_names[0]
+        return lambda row: (row[name],)
+    return operator.itemgetter(*header_column_names)
+
+
+def iter_jsonl_chunks(dicts, header_column_names):
+    # Yields strings of JSON Lines rows of about CHUNK_SIZE characters each,
+    # along with their number of rows. Each row is an object of the
+    # columns' names and values in the order of the column names.
+    import json
+
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    lines = []
+    chunk_size = 0
+    for row in dicts:
+        line = encode(dict((name, row.get(name, ''))
+                           for name in header_column_names))
+        lines.append(line)
+        chunk_size += len(line) + 1
+        if chunk_size >= CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n', len(lines)
+            lines = []
+            chunk_size = 0
+    yield ''.join(line + '\n' for line in lines), len(lines)
+
+
+CHUNK_WRITERS = {'csv': iter_csv_chunks, 'jsonl': iter_jsonl_chunks}
+
+
+def write_dicts(list_of_dicts, file_name, header_column_names=None,
+                output_format='csv', compression=None):
+    """Writes the content of dictionaries to an export file.
+
+    The dictionaries can come from any iterable, such as a generator, and are
+    written a chunk at a time, so exports of any size are written in bounded
+    memory. The export is written to a temporary file and renamed once it is
+    complete.
+
+    Args:
+        list_of_dicts: An iterable that contains dictionaries whose values will
+            be added to the export file as rows.
+        file_name: A string that contains the path of the export file that is
+            created, without its extension.
+        header_column_names: An optional list of the column names of the
+            export. Defaults to the keys of the first dictionary. When the
+            column names are given, any other keys are left out.
+        output_format: A string that contains 'csv' or 'jsonl'.
+        compression: An optional string that contains 'gzip' or, on versions
+            of Python that include it, 'zstd'.
+
+    Returns:
+        An ExportStats of the export file that was created.
+
+    Raises:
+        KeyError: The output format or the compression is not supported.
+    """
+    start = time.perf_counter()
+    path = get_export_path(file_name, output_format, compression)
+    dicts = iter(list_of_dicts)
+    if header_column_names is None:
+        first_dicts = list(itertools.islice(dicts, 1))
+        header_column_names = list(first_dicts[0].keys()) if first_dicts else []
+        dicts = itertools.chain(first_dicts, dicts)
+    chunks = CHUNK_WRITERS[output_format](dicts, header_column_names)
+
+    num_rows = 0
+    num_bytes = 0
+    temp_file = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        with open(temp_file, 'wb', buffering=BUFFER_SIZE) as output_file:
+            output = open_compressed(output_file, compression)
+            for text, chunk_rows in chunks:
+                data = text.encode(ENCODING)
+                output.write(data)
+                num_rows += chunk_rows
+                num_bytes += len(data)
+            if output is not output_file:
+                output.close()  # Writes the end of the compressed stream.
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    return ExportStats(path, num_rows, num_bytes, os.path.getsize(path),
+                       time.perf_counter() - start)
@@ -1,12 +1,24 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
+
+import array
+import bisect
+import growth_models
+import heapq
+import sys
 
 
 class Geography:
     """Class for storing a geography's population data.
 
+    Uses __slots__ instead of an instance dict and stores the annual population
+    estimates in an array of 64-bit integers rather than a list of int objects,
+    so each geography takes a fraction of the memory. The first and most recent
+    population estimates are read from the array rather than stored twice.
+
     Attributes:
         name: A string containing the name of a geography.
-        annual_pop_ests: A list of population estimates represented as integers.
+        annual_pop_ests: An array of population estimates represented as
+            integers.
         first_pop_est: An integer that represents a geography's first population
             estimate.
         most_recent_pop_est: An integer that represents a geography's most
@@ -14,27 +26,344 @@ class Geography:
         cagr: A float that represents a geography's compound annual growth rate.
     """
 
+    __slots__ = ('name', 'annual_pop_ests', 'cagr')
+
     def __init__(self, name, annual_population_estimates):
         self.name = name
-        self.annual_pop_ests = annual_population_estimates
-        self.first_pop_est = self.annual_pop_ests[0]
-        self.most_recent_pop_est = self.annual_pop_ests[-1]
+        self.annual_pop_ests = array.array('q', annual_population_estimates)
         self.cagr = self.get_compound_annual_growth_rate()
 
+    @property
+    def first_pop_est(self):
+        return self.annual_pop_ests[0]
+
+    @property
+    def most_recent_pop_est(self):
+        return self.annual_pop_ests[-1]
+
     def get_compound_annual_growth_rate(self):
-        # Calculates and returns a geography's compound annual growth rate.
+        # Calculates and returns a geography's compound annual growth rate over
+        # the years between its first and most recent population estimates.
         beginning_pop = float(self.first_pop_est)
         ending_pop = self.most_recent_pop_est
-        num_years = float(len(self.annual_pop_ests))
+        num_years = float(max(len(self.annual_pop_ests) - 1, 1))
 
         return (ending_pop / beginning_pop)**(1 / num_years) - 1
 
     def get_projected_population(self, most_recent_year, projected_year):
         # Calculates and returns a geography's projected population estimate for
         # a future year.
-        starting_pop = self.most_recent_pop_est
-        cagr_plus_one = self.cagr + 1
-        num_years = projected_year - most_recent_year
-        future_pop = starting_pop * (cagr_plus_one)**num_years
+        return growth_models.project(self.most_recent_pop_est, self.cagr,
+                                     projected_year - most_recent_year)
+
+
+def is_column(values, typecode):
+    # Returns True if values are an array or memoryview, such as a view of a
+    # memory-mapped cache file, with a typecode, which the table stores as is
+    # rather than copying.
+    if isinstance(values, array.array):
+        return values.typecode == typecode
+    return isinstance(values, memoryview) and values.format == typecode
+
+
+class GeographyTable:
+    """Class for storing the population data of many geographies in columns.
+
+    Stores the annual population estimates of every geography in a division as
+    a single row-major matrix of 64-bit integers instead of one Geography
+    object per geography, which lets derived values such as compound annual
+    growth rates and projections be computed for the whole division in one
+    pass. The numeric columns can also be read-only memoryviews with the same
+    typecodes, such as views of a memory-mapped cache file shared by several
+    processes.
+
+    Attributes:
+        names: A list of strings containing the name of each geography.
+        ids: A list of strings containing the ID of each geography, such as its
+            FIPS code, or empty strings if the IDs are unknown.
+        num_years: An integer that represents the number of annual population
+            estimates stored for each geography.
+        pop_ests: An array of integers that stores the annual population
+            estimates of each geography in row-major order, so the estimates of
+            the geography in row i are pop_ests[i * num_years:(i + 1) *
+            num_years].
+        first_pop_ests: An array of integers that contains each geography's
+            first population estimate.
+        most_recent_pop_ests: An array of integers that contains each
+            geography's most recent population estimate.
+        cagrs: An array of floats that contains each geography's compound
+            annual growth rate. Computed from pop_ests unless previously
+            computed rates, such as those read from a cache file, are given.
+        order: A list or array of row indices in the order that the
+            geographies are currently sorted in.
+        sort_orders: A dict of sort names and arrays of the row indices in the
+            order that sorting by each name produced, which are reused when the
+            table is sorted by the same name again.
+        ranks: A dict of sort names and arrays that contain the rank of each
+            row, counted from 0, in the order stored under the same name in
+            sort_orders.
+        range_keys: A dict of sort names and arrays of the negated sort keys
+            of the rows in the order stored under the same name in
+            sort_orders, which ascend so that ranges of keys can be found by
+            bisection.
+        id_buckets: A dict of lengths and dicts of the prefixes of that length
+            of the IDs, such as the two-digit state FIPS codes of counties, and
+            arrays of the rows whose IDs start with each prefix.
+        row_indexes: A dict of 'names' or 'ids' and dicts of each name or ID
+            and the first row that has it.
+        search_index: A GeographySearchIndex of the table's names and IDs, or
+            None until one is built.
+        growth_fits: A dict of the names of growth models and the GrowthFits
+            of the models that have been fitted to the table.
+    """
+
+    def __init__(self, names, pop_ests, num_years, cagrs=None, ids=None):
+        self.names = names
+        self.ids = ids if ids is not None else [''] * len(names)
+        self.num_years = num_years
+        if is_column(pop_ests, 'q'):
+            self.pop_ests = pop_ests
+        else:
+            self.pop_ests = array.array('q', pop_ests)
+        self.first_pop_ests = self.pop_ests[0::num_years]
+        self.most_recent_pop_ests = self.pop_ests[num_years - 1::num_years]
+        if cagrs is None:
+            cagrs = self.get_compound_annual_growth_rates()
+        self.cagrs = cagrs
+        self.order = list(range(len(names)))
+        self.sort_orders = {}
+        self.ranks = {}
+        self.range_keys = {}
+        self.id_buckets = {}
+        self.row_indexes = {}
+        self.search_index = None
+        self.growth_fits = {}
+        self.names_size = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_size(self):
+        # Returns the approximate number of bytes of memory that the table
+        # uses.
+        if self.names_size is None:
+            self.names_size = sum(
+                sys.getsizeof(strings) + sum(sys.getsizeof(string)
+                                             for string in strings)
+                for strings in (self.names, self.ids))
+        columns = [self.pop_ests, self.first_pop_ests,
+                   self.most_recent_pop_ests, self.cagrs]
+        for fit in self.growth_fits.values():
+            columns.extend([fit.bases, fit.rates])
+        orders = ([self.order] + list(self.sort_orders.values()) +
+                  list(self.ranks.values()) + list(self.range_keys.values()))
+        for buckets in self.id_buckets.values():
+            orders.extend(buckets.values())
+        orders.extend(self.row_indexes.values())
+
+        search_index_size = 0
+        if self.search_index is not None:
+            search_index_size = self.search_index.get_size()
+
+        return (self.names_size + search_index_size +
+                sum(sys.getsizeof(column) for column in columns) +
+                sum(sys.getsizeof(order) for order in orders))
+
+    def get_annual_pop_ests(self, row):
+        # Returns the annual population estimates of the geography in a row.
+        start = row * self.num_years
+        return self.pop_ests[start:start + self.num_years]
+
+    def get_pop_ests_for_year(self, year_index):
+        # Returns a column containing every geography's population estimate for
+        # the year at a given index.
+        return self.pop_ests[year_index::self.num_years]
+
+    def get_compound_annual_growth_rates(self):
+        # Calculates and returns every geography's compound annual growth rate
+        # over the years between its first and most recent population
+        # estimates.
+        exponent = 1 / float(max(self.num_years - 1, 1))
+        return array.array('d', [
+            (ending_pop / float(beginning_pop))**exponent - 1
+            for beginning_pop, ending_pop in zip(self.first_pop_ests,
+                                                 self.most_recent_pop_ests)])
+
+    def sort_by(self, sort_keys, sort_name=None):
+        # Sorts the rows of the table by a column of sort keys in descending
+        # order. Rows with equal keys keep the order that they appear in the
+        # CSV file. If a sort name is given, the resulting order is stored and
+        # reused the next time that the table is sorted by the same name.
+        if sort_name in self.sort_orders:
+            self.order = self.sort_orders[sort_name]
+            return
+        self.order = sorted(range(len(self)), key=sort_keys.__getitem__,
+                            reverse=True)
+        if sort_name is not None:
+            self.set_sort_order(sort_name, self.order)
+            self.order = self.sort_orders[sort_name]
+
+    def set_sort_order(self, sort_name, order, ranks=None):
+        # Stores an order of row indices under a sort name along with the
+        # inverse of the order, the rank of each row. The ranks are computed
+        # from the order unless previously computed ranks, such as those read
+        # from a cache file, are given.
+        if not is_column(order, 'q'):
+            order = array.array('q', order)
+        if ranks is None:
+            ranks = array.array('q', [0]) * len(order)
+            for rank, row in enumerate(order):
+                ranks[row] = rank
+        self.sort_orders[sort_name] = order
+        self.ranks[sort_name] = ranks
+
+    def clear_sort_orders(self):
+        # Discards every stored order, rank index, and range index.
+        self.sort_orders.clear()
+        self.ranks.clear()
+        self.range_keys.clear()
+
+    def get_rank(self, row, sort_keys, sort_name):
+        # Returns the rank, counted from 1, of the row when the rows are sorted
+        # by a column of sort keys in descending order. Looks the rank up in
+        # the rank index of the sort name, which is built first if it is not
+        # stored.
+        if sort_name not in self.ranks:
+            order = self.order
+            self.sort_by(sort_keys, sort_name)
+            self.order = order
+        return self.ranks[sort_name][row] + 1
+
+    def get_ranked_rows(self, sort_keys, start, stop, sort_name=None):
+        # Returns the row indices ranked from 'start' up to, but not including,
+        # 'stop' when the rows are sorted by a column of sort keys in
+        # descending order. Uses a heap to select only the first 'stop' rows,
+        # unless the full order for the sort name is already stored.
+        if sort_name in self.sort_orders:
+            return self.sort_orders[sort_name][start:stop]
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+
+        return heapq.nlargest(stop, range(len(self)),
+                              key=sort_keys.__getitem__)[start:]
+
+    def get_bottom_rows(self, sort_keys, num_rows, sort_name=None):
+        # Returns the row indices of the 'num_rows' rows ranked last when the
+        # rows are sorted by a column of sort keys in descending order, starting
+        # with the last ranked row.
+        num_rows = min(num_rows, len(self))
+        if num_rows <= 0:
+            return []
+        if sort_name in self.sort_orders:
+            return self.sort_orders[sort_name][:-num_rows - 1:-1]
+
+        # Rows with equal keys are ranked in the order that they appear in the
+        # CSV file, so ties are broken by visiting the rows in reverse.
+        return heapq.nsmallest(num_rows, range(len(self) - 1, -1, -1),
+                               key=sort_keys.__getitem__)
+
+    def get_range_keys(self, sort_keys, sort_name):
+        # Returns the array of the negated sort keys of the rows in the order
+        # stored under a sort name, building the order and the array first if
+        # they are not stored. The sort keys are only needed to build them.
+        if sort_name not in self.range_keys:
+            if sort_name not in self.sort_orders:
+                order = self.order
+                self.sort_by(sort_keys, sort_name)
+                self.order = order
+            typecode = getattr(sort_keys, 'typecode',
+                               getattr(sort_keys, 'format', 'd'))
+            self.range_keys[sort_name] = array.array(typecode, [
+                -sort_keys[row] for row in self.sort_orders[sort_name]])
+        return self.range_keys[sort_name]
+
+    def get_range_bounds(self, sort_keys, low, high, sort_name):
+        # Returns the first rank and the rank after the last rank of the rows
+        # whose sort keys are between 'low' and 'high', inclusive, when the
+        # rows are sorted by the sort keys in descending order. Either bound
+        # may be None.
+        range_keys = self.get_range_keys(sort_keys, sort_name)
+        start = 0 if high is None else bisect.bisect_left(range_keys, -high)
+        stop = (len(range_keys) if low is None
+                else bisect.bisect_right(range_keys, -low))
+        return start, max(start, stop)
+
+    def get_rows_in_range(self, sort_keys, low=None, high=None,
+                          sort_name=None):
+        # Returns the row indices whose sort keys are between 'low' and 'high',
+        # inclusive, ranked in descending order of the sort keys. Either bound
+        # may be None. The rows are found by bisecting the range index of the
+        # sort name rather than by scanning every row.
+        start, stop = self.get_range_bounds(sort_keys, low, high, sort_name)
+        return self.sort_orders[sort_name][start:stop]
+
+    def get_rows_with_id_prefix(self, prefix):
+        # Returns an array of the row indices, in the order that they appear in
+        # the CSV file, whose IDs start with a prefix, such as the two-digit
+        # state FIPS code of a county. Looked up in the bucket index of the
+        # IDs' prefixes of the same length, which is built the first time that
+        # it is needed.
+        buckets = self.id_buckets.get(len(prefix))
+        if buckets is None:
+            buckets = {}
+            for row, geo_id in enumerate(self.ids):
+                bucket = buckets.get(geo_id[:len(prefix)])
+                if bucket is None:
+                    bucket = buckets[geo_id[:len(prefix)]] = array.array('q')
+                bucket.append(row)
+            self.id_buckets[len(prefix)] = buckets
+
+        return buckets.get(prefix, array.array('q'))
+
+    def find_row(self, column_name, value):
+        # Returns the first row whose name or ID, for a column name of 'names'
+        # or 'ids', equals a value, or None. Looked up in a dict of the
+        # column's values, which is built the first time that it is needed.
+        rows = self.row_indexes.get(column_name)
+        if rows is None:
+            rows = {}
+            for row, row_value in enumerate(getattr(self, column_name)):
+                rows.setdefault(row_value, row)
+            self.row_indexes[column_name] = rows
+
+        return rows.get(value)
+
+    def filter_rows(self, sort_keys, low=None, high=None, id_prefix=None,
+                    sort_name=None):
+        """Returns the rows that match a filter, ranked by a column of keys.
+
+        A range of sort keys is found by bisecting the sort name's range index,
+        and an ID prefix is looked up in a bucket index. When both are given,
+        whichever matches fewer rows is filtered by the other, so neither is
+        answered by scanning every row.
+
+        Args:
+            sort_keys: A column of sort keys, which is only needed if the order
+                or the range index of the sort name is not stored.
+            low: The lowest sort key that matches, or None.
+            high: The highest sort key that matches, or None.
+            id_prefix: A string that the IDs of the rows that match start
+                with, such as a two-digit state FIPS code, or None.
+            sort_name: The name that the order and range index of the sort
+                keys are stored under.
+
+        Returns:
+            A list of the row indices that match, ranked in descending order
+            of the sort keys.
+        """
+        if id_prefix is None:
+            return list(self.get_rows_in_range(sort_keys, low, high,
+                                               sort_name))
+
+        start, stop = self.get_range_bounds(sort_keys, low, high, sort_name)
+        bucket = self.get_rows_with_id_prefix(id_prefix)
+        if len(bucket) < stop - start:
+            ranks = self.ranks[sort_name]
+            return sorted((row for row in bucket
+                           if start <= ranks[row] < stop),
+                          key=ranks.__getitem__)
 
-        return int(round(future_pop, 0))
+        ids = self.ids
+        return [row for row in self.sort_orders[sort_name][start:stop]
+                if ids[row].startswith(id_prefix)]
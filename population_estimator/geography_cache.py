@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+"""
+Module for storing parsed GeographyTables in binary cache files so that the
+CSV files they were parsed from do not have to be parsed again.
+
+Each cache file starts with a fixed-size header followed by the table's
+population estimates as 64-bit integers, its compound annual growth rates as
+64-bit floats, the permutation and rank index of each of its stored sort orders
+as 64-bit integers, its geography names and IDs, the names of its sort orders,
+and the path of the CSV file that the table was parsed from. A cache file is
+only used while the size and modification time of its CSV file match the values
+recorded in its header. Cache files are named after the name of their CSV file
+and a hash of its absolute path, so CSV files with the same name in different
+folders have their own cache files.
+
+The header is a multiple of 8 bytes long, so every numeric section is 8-byte
+aligned and a cache file can either be read into each process's own memory or
+memory-mapped, in which case every process that maps it shares one copy of its
+numeric sections.
+"""
+
+import array
+import geography
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+# Identifies a cache file and the version of its layout.
+MAGIC = b'PEPCACHE'
+VERSION = 4
+
+# Magic, version, unused, CSV file size, CSV file modification time, number
+# of rows, number of years, number of sort orders, length of the names section,
+# length of the IDs section, length of the sort order names section, and length
+# of the source path section.
+HEADER = struct.Struct('<8sIIQdQQQQQQQ')
+
+ENCODING = 'utf-8'
+
+# Number of hexadecimal digits of the hash of a CSV file's absolute path in the
+# name of its cache file.
+PATH_HASH_LENGTH = 12
+
+
+def get_cache_file(csv_file, cache_folder):
+    # Returns the path of the cache file for a CSV file.
+    source_path = os.path.abspath(csv_file)
+    path_hash = hashlib.sha1(os.fsencode(source_path)).hexdigest()
+    return os.path.join(cache_folder, '%s.%s.cache' % (
+        os.path.basename(source_path), path_hash[:PATH_HASH_LENGTH]))
+
+
+def get_source_key(csv_file):
+    # Returns the absolute path, size, and modification time of a CSV file.
+    stat = os.stat(csv_file)
+    return os.path.abspath(csv_file), stat.st_size, stat.st_mtime
+
+
+def read_geographies(csv_file, cache_folder):
+    """Reads a GeographyTable from the cache file of a CSV file.
+
+    Args:
+        csv_file: A string that contains the path to the CSV file that the
+            GeographyTable was parsed from.
+        cache_folder: A string that contains the path to the folder that
+            contains the cache file.
+
+    Returns:
+        A GeographyTable, or None if the cache file does not exist, is
+        unreadable, or is stale because the CSV file has changed since the
+        cache file was written.
+    """
+    try:
+        with open(get_cache_file(csv_file, cache_folder), 'rb') as cache:
+            data = cache.read()
+    except OSError:
+        return None
+
+    return get_geographies(csv_file, data, copy_column)
+
+
+def map_geographies(csv_file, cache_folder):
+    """Maps a GeographyTable from the cache file of a CSV file into memory.
+
+    The cache file is memory-mapped read-only, and the table's population
+    estimates, compound annual growth rates, and rank indexes are views of the
+    mapped file rather than copies, so every process that maps the same cache
+    file shares one copy of them in the operating system's page cache. Only
+    the names and IDs are decoded into each process's own memory.
+
+    Args:
+        csv_file: A string that contains the path to the CSV file that the
+            GeographyTable was parsed from.
+        cache_folder: A string that contains the path to the folder that
+            contains the cache file.
+
+    Returns:
+        A GeographyTable, or None if the cache file does not exist, is
+        unreadable, or is stale because the CSV file has changed since the
+        cache file was written.
+    """
+    if sys.byteorder != 'little':
+        # The numbers in cache files are little-endian, so they have to be
+        # copied and swapped.
+        return read_geographies(csv_file, cache_folder)
+
+    try:
+        with open(get_cache_file(csv_file, cache_folder), 'rb') as cache:
+            mapped = mmap.mmap(cache.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None  # ValueError is raised for empty files.
+
+    return get_geographies(csv_file, memoryview(mapped), view_column)
+
+
+def copy_column(data, typecode):
+    # Returns an array that contains a copy of a section of a cache file.
+    column = array.array(typecode)
+    column.frombytes(data)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+def view_column(data, typecode):
+    # Returns a view of a section of a mapped cache file as a column.
+    return data.cast(typecode)
+
+
+def get_geographies(csv_file, data, get_column):
+    # Returns the GeographyTable stored in the bytes of a cache file, with its
+    # numeric columns returned by a function that takes a section of the bytes
+    # and a typecode, or None if the cache file is invalid or stale.
+    source_path, source_size, source_mtime = get_source_key(csv_file)
+    if len(data) < HEADER.size:
+        return None
+    (magic, version, _, size, mtime, num_rows, num_years, num_orders,
+     names_len, ids_len, order_names_len, path_len) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if size != source_size or mtime != source_mtime:
+        return None
+    if (HEADER.size + num_rows * (num_years + 1 + num_orders * 2) * 8 +
+            names_len + ids_len + order_names_len + path_len != len(data)):
+        return None
+
+    offset = HEADER.size
+    pop_ests = get_column(data[offset:offset + num_rows * num_years * 8], 'q')
+    offset += num_rows * num_years * 8
+    cagrs = get_column(data[offset:offset + num_rows * 8], 'd')
+    offset += num_rows * 8
+    indexes = []
+    for _ in range(num_orders * 2):
+        indexes.append(get_column(data[offset:offset + num_rows * 8], 'q'))
+        offset += num_rows * 8
+    names = bytes(data[offset:offset + names_len]).decode(ENCODING)
+    offset += names_len
+    ids = bytes(data[offset:offset + ids_len]).decode(ENCODING)
+    offset += ids_len
+    order_names = bytes(data[offset:offset + order_names_len]).decode(
+        ENCODING)
+    offset += order_names_len
+    path = bytes(data[offset:offset + path_len]).decode(ENCODING)
+
+    if path != source_path:
+        return None
+
+    names = names.split('\n') if num_rows else []
+    ids = ids.split('\n') if num_rows else []
+    order_names = order_names.split('\n') if num_orders else []
+
+    geographies = geography.GeographyTable(names, pop_ests, num_years, cagrs,
+                                           ids)
+    for order_num, sort_name in enumerate(order_names):
+        geographies.set_sort_order(sort_name, indexes[order_num * 2],
+                                   indexes[order_num * 2 + 1])
+
+    return geographies
+
+
+def write_geographies(csv_file, cache_folder, geographies):
+    """Writes a GeographyTable to the cache file of a CSV file.
+
+    The table's stored sort orders and rank indexes are written along with it,
+    except for those that are not named by a string, such as the orders of
+    projections for a specific year. The cache file is written to a temporary
+    file first and then renamed, so a partially written cache file is never
+    read. Errors are ignored because the cache is only an optimization.
+
+    Args:
+        csv_file: A string that contains the path to the CSV file that the
+            GeographyTable was parsed from.
+        cache_folder: A string that contains the path to the folder that the
+            cache file is written to.
+        geographies: A GeographyTable.
+    """
+    source_path, source_size, source_mtime = get_source_key(csv_file)
+    names = '\n'.join(geographies.names).encode(ENCODING)
+    ids = '\n'.join(geographies.ids).encode(ENCODING)
+    path = source_path.encode(ENCODING)
+    sort_names = sorted(sort_name for sort_name in geographies.sort_orders
+                        if isinstance(sort_name, str) and
+                        '\n' not in sort_name)
+    order_names = '\n'.join(sort_names).encode(ENCODING)
+    columns = [array.array('q', geographies.pop_ests),
+               array.array('d', geographies.cagrs)]
+    for sort_name in sort_names:
+        columns.append(array.array('q', geographies.sort_orders[sort_name]))
+        columns.append(array.array('q', geographies.ranks[sort_name]))
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+
+    header = HEADER.pack(MAGIC, VERSION, 0, source_size, source_mtime,
+                         len(geographies), geographies.num_years,
+                         len(sort_names), len(names), len(ids),
+                         len(order_names), len(path))
+
+    cache_file = get_cache_file(csv_file, cache_folder)
+    temp_file = '%s.%s.tmp' % (cache_file, os.getpid())
+    try:
+        if not os.path.isdir(cache_folder):
+            os.makedirs(cache_folder)
+        with open(temp_file, 'wb') as cache:
+            cache.write(header)
+            for column in columns:
+                cache.write(column.tobytes())
+            cache.write(names)
+            cache.write(ids)
+            cache.write(order_names)
+            cache.write(path)
+        os.rename(temp_file, cache_file)
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+"""
+Module for searching the names and IDs of the geographies in a division.
+"""
+
+import bisect
+import collections
+import heapq
+import itertools
+import re
+import sys
+import unicodedata
+
+# Ranks of the kinds of matches, from best to worst.
+EXACT_MATCH = 0
+PREFIX_MATCH = 1
+WORD_PREFIX_MATCH = 2
+SUBSTRING_MATCH = 3
+FUZZY_MATCH = 4
+
+# Smallest share of a search term's trigrams that a name must contain to be a
+# fuzzy match.
+MIN_FUZZY_SIMILARITY = 0.4
+
+# Character that sorts after every other character, which ends the range of
+# the strings in a sorted list that start with a prefix.
+LAST_CHARACTER = chr(sys.maxunicode)
+
+# Longest prefixes of names, words, and IDs whose best matches are indexed, so
+# that short search terms, which match the most geographies, are answered
+# without scanning their matches.
+MAX_INDEXED_PREFIX_LENGTH = 3
+
+# Number of best matches stored for each indexed prefix. Searches for more
+# matches than this scan every match of the prefix instead.
+INDEXED_PREFIX_ROWS = 64
+
+
+def normalize(a_string):
+    # Returns a string in lowercase without accents and with each run of
+    # characters other than letters and digits replaced by a single space.
+    decomposed = unicodedata.normalize('NFKD', a_string)
+    unaccented = ''.join(char for char in decomposed
+                         if not unicodedata.combining(char))
+    return re.sub(r'[\W_]+', ' ', unaccented.lower()).strip()
+
+
+def get_trigrams(normalized_string):
+    # Returns the set of three-character substrings of a normalized string
+    # padded with a space on each side.
+    padded = ' %s ' % (normalized_string)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class GeographySearchIndex:
+    """Class for finding geographies by their names or IDs.
+
+    Normalizes each name to lowercase without accents or punctuation and
+    indexes it by its trigrams and in sorted lists of names and words, so that
+    exact, prefix, word prefix, substring, and typo-tolerant (fuzzy) matches are
+    found without scanning every name. IDs, such as FIPS codes, are indexed
+    for exact and prefix matches. The kinds of matches are found from best to
+    worst, and a search stops once it has found as many matches as it returns.
+
+    Attributes:
+        normalized_names: A list of each geography's normalized name.
+        length_ranks: A list of the position of each row when the rows are
+            ordered from shortest to longest normalized name, and then by row,
+            which is the order that matches of the same kind are ranked in.
+        sorted_names: A sorted list of (normalized name, row) tuples.
+        sorted_words: A sorted list of the distinct words of the normalized
+            names.
+        word_rows: A dict of words and lists of the rows whose normalized names
+            contain them, in the order of length_ranks.
+        sorted_ids: A sorted list of (ID, row) tuples.
+        name_prefix_rows: A dict of the prefixes of the normalized names, up to
+            MAX_INDEXED_PREFIX_LENGTH characters long, and lists of the first
+            INDEXED_PREFIX_ROWS rows, in the order of length_ranks, whose names
+            start with them.
+        word_prefix_rows: A dict like name_prefix_rows of the prefixes of the
+            words of the normalized names.
+        id_prefix_rows: A dict like name_prefix_rows of the prefixes of the IDs.
+        trigrams: A dict of trigrams and lists of the rows whose normalized
+            names contain them.
+        trigram_counts: A list of the number of distinct trigrams in each
+            normalized name.
+    """
+
+    def __init__(self, names, ids=None):
+        self.normalized_names = [normalize(name) for name in names]
+        rows_by_length = sorted(range(len(names)), key=list(
+            map(len, self.normalized_names)).__getitem__)
+        self.length_ranks = [0] * len(names)
+        for rank, row in enumerate(rows_by_length):
+            self.length_ranks[row] = rank
+
+        self.sorted_names = sorted(
+            (name, row) for row, name in enumerate(self.normalized_names))
+        self.sorted_ids = sorted(
+            (geo_id, row) for row, geo_id in enumerate(ids or []) if geo_id)
+        self.word_rows = collections.defaultdict(list)
+        for row in rows_by_length:
+            for word in set(self.normalized_names[row].split()):
+                self.word_rows[word].append(row)
+        self.word_rows = dict(self.word_rows)
+        self.sorted_words = sorted(self.word_rows)
+
+        self.name_prefix_rows = self.index_prefixes(
+            [name for name, _ in self.sorted_names],
+            lambda start, stop: (row for _, row in
+                                 self.sorted_names[start:stop]))
+        self.word_prefix_rows = self.index_prefixes(
+            self.sorted_words,
+            lambda start, stop: itertools.chain.from_iterable(
+                self.word_rows[word][:INDEXED_PREFIX_ROWS]
+                for word in self.sorted_words[start:stop]))
+        self.id_prefix_rows = self.index_prefixes(
+            [geo_id for geo_id, _ in self.sorted_ids],
+            lambda start, stop: (row for _, row in
+                                 self.sorted_ids[start:stop]))
+
+        self.trigrams = collections.defaultdict(list)
+        self.trigram_counts = []
+        for row, name in enumerate(self.normalized_names):
+            name_trigrams = get_trigrams(name)
+            self.trigram_counts.append(len(name_trigrams))
+            for trigram in name_trigrams:
+                self.trigrams[trigram].append(row)
+
+    def index_prefixes(self, sorted_strings, get_rows):
+        # Returns a dict of the prefixes of the strings in a sorted list, up to
+        # MAX_INDEXED_PREFIX_LENGTH characters long, and lists of the first
+        # INDEXED_PREFIX_ROWS rows, in the order of length_ranks, of the
+        # strings that start with each prefix. 'get_rows' returns the rows of
+        # the strings from a start index up to, but not including, a stop
+        # index.
+        prefix_rows = {}
+        for length in range(1, MAX_INDEXED_PREFIX_LENGTH + 1):
+            start = 0
+            while start < len(sorted_strings):
+                prefix = sorted_strings[start][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                stop = bisect.bisect_left(sorted_strings,
+                                          prefix + LAST_CHARACTER, start)
+                prefix_rows[prefix] = self.get_best_rows(
+                    get_rows(start, stop), INDEXED_PREFIX_ROWS)
+                start = stop
+
+        return prefix_rows
+
+    def get_size(self):
+        # Returns the approximate number of bytes of memory that the index
+        # uses.
+        size = sum(sys.getsizeof(name) for name in self.normalized_names)
+        for sorted_list in (self.sorted_names, self.sorted_ids):
+            size += sys.getsizeof(sorted_list)
+            size += sum(sys.getsizeof(pair) for pair in sorted_list)
+        size += sys.getsizeof(self.length_ranks)
+        size += sys.getsizeof(self.sorted_words)
+        for rows_dict in (self.word_rows, self.name_prefix_rows,
+                          self.word_prefix_rows, self.id_prefix_rows,
+                          self.trigrams):
+            size += sys.getsizeof(rows_dict)
+            size += sum(sys.getsizeof(rows) for rows in rows_dict.values())
+        size += sys.getsizeof(self.trigram_counts)
+
+        return size
+
+    def search(self, search_term, limit=10):
+        """Finds the geographies whose names or IDs best match a search term.
+
+        Matches are ranked from best to worst as an exact name or ID, a name or
+        ID that starts with the search term, a name with a word that starts with
+        the search term, a name that contains the search term, and a name that
+        is similar to the search term. Matches of the same kind are ranked from
+        shortest to longest name.
+
+        Args:
+            search_term: A string that contains all or part of a geography's
+                name or ID, in any case and with or without accents.
+            limit: An integer that represents the maximum number of matches
+                that are returned.
+
+        Returns:
+            A list of the rows of the best matching geographies, best match
+            first.
+        """
+        query = normalize(search_term)
+        geo_id = search_term.strip()
+        if not query or limit <= 0:
+            return []
+
+        # Each kind of match is only looked for while fewer than 'limit'
+        # matches have been found, since matches of a later kind are ranked
+        # after those already found. Each finder returns at most the 'limit'
+        # best matches of its kind, which are enough to fill the matches that
+        # are missing after skipping those already found.
+        finders = (
+            (EXACT_MATCH, lambda: self.find_exact(query) +
+                self.find_exact_ids(geo_id)),
+            (PREFIX_MATCH, lambda: self.find_prefix(query, limit) +
+                self.find_id_prefix(geo_id, limit)),
+            (WORD_PREFIX_MATCH, lambda: self.find_word_prefix(query, limit)),
+            (SUBSTRING_MATCH, lambda: self.find_substring(query, limit)))
+        ranks = {}
+        for rank, find_rows in finders:
+            if len(ranks) >= limit:
+                break
+            self.add_matches(ranks, find_rows(), rank)
+
+        if len(ranks) < limit:
+            for row, similarity in self.find_fuzzy(query):
+                if row not in ranks:
+                    ranks[row] = (FUZZY_MATCH, -similarity)
+
+        def sort_key(row):
+            return ranks[row], self.length_ranks[row]
+
+        return heapq.nsmallest(limit, ranks, key=sort_key)
+
+    def add_matches(self, ranks, rows, rank):
+        # Adds rows to a dict of rows and ranks, keeping each row's best rank.
+        for row in rows:
+            if row not in ranks or (rank,) < ranks[row]:
+                ranks[row] = (rank,)
+
+    def get_best_rows(self, rows, limit):
+        # Returns the first 'limit' distinct rows of an iterable of rows in the
+        # order of length_ranks.
+        return heapq.nsmallest(limit, set(rows),
+                               key=self.length_ranks.__getitem__)
+
+    def find_sorted_prefix(self, sorted_list, prefix, limit):
+        # Returns the best 'limit' rows of the items in a sorted list of
+        # (string, row) tuples whose strings start with a prefix.
+        start = bisect.bisect_left(sorted_list, (prefix,))
+        stop = bisect.bisect_left(sorted_list, (prefix + LAST_CHARACTER,))
+        return self.get_best_rows(
+            (row for _, row in sorted_list[start:stop]), limit)
+
+    def find_exact_ids(self, geo_id):
+        # Returns the rows of the geographies whose IDs equal a search term.
+        if not geo_id:
+            return []
+        start = bisect.bisect_left(self.sorted_ids, (geo_id,))
+        stop = bisect.bisect_left(self.sorted_ids, (geo_id, len(
+            self.normalized_names)))
+        return [row for _, row in self.sorted_ids[start:stop]]
+
+    def find_id_prefix(self, geo_id, limit):
+        # Returns the best 'limit' rows of the geographies whose IDs start with
+        # a search term.
+        if not geo_id:
+            return []
+        if len(geo_id) <= MAX_INDEXED_PREFIX_LENGTH and (
+                limit <= INDEXED_PREFIX_ROWS):
+            return self.id_prefix_rows.get(geo_id, [])[:limit]
+        return self.find_sorted_prefix(self.sorted_ids, geo_id, limit)
+
+    def find_exact(self, query):
+        # Returns the rows of the geographies whose normalized names equal a
+        # normalized search term.
+        start = bisect.bisect_left(self.sorted_names, (query,))
+        stop = bisect.bisect_left(self.sorted_names, (query, len(
+            self.normalized_names)))
+        return [row for _, row in self.sorted_names[start:stop]]
+
+    def find_prefix(self, query, limit):
+        # Returns the best 'limit' rows of the geographies whose normalized
+        # names start with a normalized search term.
+        if len(query) <= MAX_INDEXED_PREFIX_LENGTH and (
+                limit <= INDEXED_PREFIX_ROWS):
+            return self.name_prefix_rows.get(query, [])[:limit]
+        return self.find_sorted_prefix(self.sorted_names, query, limit)
+
+    def find_word_prefix(self, query, limit):
+        # Returns the best 'limit' rows of the geographies whose normalized
+        # names contain a word that starts with a normalized search term,
+        # merging the rows of each such word, which are already in order.
+        if len(query) <= MAX_INDEXED_PREFIX_LENGTH and (
+                limit <= INDEXED_PREFIX_ROWS):
+            return self.word_prefix_rows.get(query, [])[:limit]
+        start = bisect.bisect_left(self.sorted_words, query)
+        stop = bisect.bisect_left(self.sorted_words, query + LAST_CHARACTER)
+        rows = []
+        for row in heapq.merge(*[self.word_rows[word] for word in
+                                 self.sorted_words[start:stop]],
+                               key=self.length_ranks.__getitem__):
+            if len(rows) >= limit:
+                break
+            if not rows or rows[-1] != row:
+                rows.append(row)
+
+        return rows
+
+    def find_substring(self, query, limit):
+        # Returns the best 'limit' rows of the geographies whose normalized
+        # names contain a normalized search term. Only the names that contain
+        # the search term's rarest trigrams, or for search terms shorter than
+        # a trigram, the names with a trigram that contains the search term,
+        # are checked.
+        if len(query) < 3:
+            candidates = set()
+            for trigram, rows in self.trigrams.items():
+                if query in trigram:
+                    candidates.update(rows)
+        else:
+            padded = ' %s ' % (query)
+            postings = sorted(
+                (self.trigrams.get(padded[i:i + 3], [])
+                 for i in range(1, len(padded) - 3)), key=len)
+            candidates = set(postings[0])
+            for rows in postings[1:]:
+                # Once there are far fewer candidates than rows with the next
+                # trigram, checking the candidates' names is faster than
+                # intersecting them with the rows.
+                if len(candidates) * 8 < len(rows):
+                    break
+                candidates.intersection_update(rows)
+
+        return self.get_best_rows(
+            (row for row in candidates
+             if query in self.normalized_names[row]), limit)
+
+    def find_fuzzy(self, query):
+        # Returns (row, similarity) tuples for the geographies whose normalized
+        # names contain enough of the trigrams of a normalized search term,
+        # where the similarity is the share of the search term's trigrams that
+        # the name contains. Names with more trigrams that are not in the search
+        # term are slightly less similar.
+        query_trigrams = get_trigrams(query)
+        shared = collections.Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+
+        matches = []
+        for row, num_shared in shared.items():
+            similarity = num_shared / float(len(query_trigrams))
+            if similarity >= MIN_FUZZY_SIMILARITY:
+                extra_trigrams = self.trigram_counts[row] - num_shared
+                matches.append((row, similarity - extra_trigrams * 1e-6))
+
+        return matches
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+"""
+Module for fitting growth models to the annual population estimates of a
+whole division and projecting them into future years.
+
+Three models are available:
+
+    cagr: The endpoint compound annual growth rate between the first and the
+        most recent estimates, projected from the most recent estimate.
+    log-linear: An exponential trend fitted to every year's estimate by least
+        squares on the logarithms of the estimates.
+    linear: A straight-line trend fitted to every year's estimate by least
+        squares.
+
+Every geography in a division has estimates for the same years, so the least
+squares weights of each year are calculated once and each geography's fit is a
+weighted sum of its estimates. A model is fitted for a whole division at once,
+the first time that it is used, and the fit is kept with the division's
+GeographyTable, so projections for any number of future years, and sorts and
+exports of those projections, reuse the fitted parameters.
+"""
+
+import array
+import collections
+import math
+import operator
+
+# Largest projected population estimate that can be stored.
+MAX_POPULATION = 2**63 - 1
+
+# Names of the growth models.
+ENDPOINT_CAGR = 'cagr'
+LOG_LINEAR = 'log-linear'
+LINEAR = 'linear'
+
+# Names of the growth models and the descriptions shown in menus.
+MODEL_TITLES = collections.OrderedDict([
+    (ENDPOINT_CAGR, 'Compound Annual Growth Rate (First to Most Recent Year)'),
+    (LOG_LINEAR, 'Log-Linear Trend of Every Year (Least Squares)'),
+    (LINEAR, 'Linear Trend of Every Year (Least Squares)')])
+
+
+class ProjectionError(ValueError):
+    """Exception raised when a projection is too large to be stored."""
+
+
+class GrowthFit:
+    """Class for storing a growth model fitted to every geography of a division.
+
+    Projections start from each geography's base, its actual or fitted
+    estimate for the most recent year, and grow by its rate every year, either
+    compounded or as a fixed number of people.
+
+    Attributes:
+        model: A string that contains the name of the growth model.
+        bases: An array of numbers that contains each geography's base.
+        rates: An array of floats that contains each geography's annual growth
+            rate, or its annual change in population for linear models.
+        compounded: A boolean that determines whether the rates are compounded.
+    """
+
+    def __init__(self, model, bases, rates, compounded):
+        self.model = model
+        self.bases = bases
+        self.rates = rates
+        self.compounded = compounded
+
+    def project(self, base, rate, num_years):
+        # Returns the projected population estimate of a base and a rate a
+        # number of years after the most recent year.
+        return project(base, rate, num_years, self.compounded)
+
+    def get_projected_populations(self, num_years):
+        # Returns an array of every geography's projected population estimate
+        # a number of years after the most recent year.
+        project = self.project
+        return array.array('q', [project(base, rate, num_years)
+                                 for base, rate in zip(self.bases,
+                                                       self.rates)])
+
+    def get_projected_population_matrix(self, offsets):
+        # Returns an array of every geography's projected population estimate
+        # for each of a list of numbers of years after the most recent year, in
+        # row-major order, with one row per geography and one column per
+        # number of years.
+        project = self.project
+        matrix = array.array('q')
+        for base, rate in zip(self.bases, self.rates):
+            matrix.extend([project(base, rate, num_years)
+                           for num_years in offsets])
+
+        return matrix
+
+    def get_row_projected_populations(self, row, offsets):
+        # Returns an array of the projected population estimates of the
+        # geography in a row for each of a list of numbers of years after the
+        # most recent year.
+        base = self.bases[row]
+        rate = self.rates[row]
+        return array.array('q', [self.project(base, rate, num_years)
+                                 for num_years in offsets])
+
+
+def project(base, rate, num_years, compounded=True):
+    # Returns the projected population estimate of a base that grows by a rate
+    # for a number of years, either compounded or as a fixed number of people.
+    # Linear projections stop at zero. Raises a ProjectionError if the
+    # projection is larger than MAX_POPULATION.
+    try:
+        if compounded:
+            projected_pop = base * (rate + 1)**num_years
+        else:
+            projected_pop = max(base + rate * num_years, 0)
+    except OverflowError:
+        projected_pop = float('inf')
+    return to_population(projected_pop, num_years)
+
+
+def to_population(projected_pop, num_years):
+    # Returns a projected population estimate a number of years after the most
+    # recent year rounded to an integer. Raises a ProjectionError if it is
+    # larger than MAX_POPULATION.
+    if not projected_pop <= MAX_POPULATION:
+        raise ProjectionError(
+            'The projected population estimate %s years after the most recent '
+            'year is too large to be stored.' % (num_years))
+    return int(round(projected_pop, 0))
+
+
+def get_least_squares_weights(num_years):
+    # Returns a list of the weights of each year's value in the least squares
+    # slope of a straight line fitted to values for a number of consecutive
+    # years, and the mean of the years counted from 0.
+    mean_year = (num_years - 1) / 2.0
+    sum_of_squares = sum((year - mean_year)**2 for year in range(num_years))
+    if not sum_of_squares:
+        return [0.0] * num_years, mean_year
+    return ([(year - mean_year) / sum_of_squares
+             for year in range(num_years)], mean_year)
+
+
+def fit_endpoint_cagr(geographies):
+    # Returns the GrowthFit of the compound annual growth rates of a
+    # GeographyTable, projected from the most recent estimates.
+    return GrowthFit(ENDPOINT_CAGR, geographies.most_recent_pop_ests,
+                     geographies.cagrs, True)
+
+
+def fit_log_linear(geographies):
+    # Returns the GrowthFit of exponential trends fitted by least squares to
+    # the logarithms of the estimates of a GeographyTable. Geographies with an
+    # estimate that is not positive do not grow.
+    num_years = geographies.num_years
+    weights, mean_year = get_least_squares_weights(num_years)
+    offset = num_years - 1 - mean_year
+    bases = array.array('d')
+    rates = array.array('d')
+    for row in range(len(geographies)):
+        pop_ests = geographies.get_annual_pop_ests(row)
+        if min(pop_ests) <= 0:
+            bases.append(geographies.most_recent_pop_ests[row])
+            rates.append(0.0)
+            continue
+        logs = list(map(math.log, pop_ests))
+        slope = sum(map(operator.mul, weights, logs))
+        bases.append(math.exp(math.fsum(logs) / num_years + slope * offset))
+        rates.append(math.expm1(slope))
+
+    return GrowthFit(LOG_LINEAR, bases, rates, True)
+
+
+def fit_linear(geographies):
+    # Returns the GrowthFit of straight-line trends fitted by least squares to
+    # the estimates of a GeographyTable.
+    num_years = geographies.num_years
+    weights, mean_year = get_least_squares_weights(num_years)
+    offset = num_years - 1 - mean_year
+    bases = array.array('d')
+    rates = array.array('d')
+    for row in range(len(geographies)):
+        pop_ests = geographies.get_annual_pop_ests(row)
+        slope = sum(map(operator.mul, weights, pop_ests))
+        bases.append(sum(pop_ests) / float(num_years) + slope * offset)
+        rates.append(slope)
+
+    return GrowthFit(LINEAR, bases, rates, False)
+
+
+MODELS = {ENDPOINT_CAGR: fit_endpoint_cagr,
+          LOG_LINEAR: fit_log_linear,
+          LINEAR: fit_linear}
+
+
+def get_fit(geographies, model):
+    """Returns a growth model fitted to every geography of a GeographyTable.
+
+    The model is fitted the first time that it is requested for the table, and
+    the fit is stored in the table's growth_fits and returned again after that.
+
+    Args:
+        geographies: A GeographyTable.
+        model: A string that contains the name of a growth model, such as
+            'log-linear'.
+
+    Returns:
+        A GrowthFit.
+
+    Raises:
+        KeyError: The growth model does not exist.
+    """
+    fit = geographies.growth_fits.get(model)
+    if fit is None:
+        fit = MODELS[model](geographies)
+        geographies.growth_fits[model] = fit
+
+    return fit
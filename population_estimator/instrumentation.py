@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+"""
+Module for timing the hot paths of the population_estimator.
+
+Timing is turned on by setting the POP_EST_TIMING environment variable to the
+path of a file. Every timed function and span then records how long each of its
+calls takes, and when the process exits, the session's aggregates (count,
+total, mean, p95, and max seconds of each span) are appended to the file as one
+line of JSON. Setting the POP_EST_PROFILE environment variable to the path of a
+file also captures a cProfile profile of the whole session to that file.
+
+When timing is turned off, the 'timed' decorator returns functions unchanged
+and 'span' returns a shared context manager that does nothing, so the
+instrumentation costs next to nothing. The modules that only timing and
+profiling use are imported when they are turned on, so they do not slow down
+the startup of every process. The spans recorded by worker processes, such as
+the shards of a simulation, are merged into the spans of the process that
+started them.
+
+To time a session of the text-based user interface:
+
+    $ POP_EST_TIMING=timings.jsonl python tui_app.py
+"""
+
+import atexit
+import collections
+import functools
+import os
+import sys
+import time
+
+# Names of the environment variables that turn on timing and profiling.
+TIMING_ENV_VAR = 'POP_EST_TIMING'
+PROFILE_ENV_VAR = 'POP_EST_PROFILE'
+
+TIMING_FILE = os.environ.get(TIMING_ENV_VAR)
+PROFILE_FILE = os.environ.get(PROFILE_ENV_VAR)
+ENABLED = bool(TIMING_FILE)
+
+# Lists of the durations in seconds of the calls of each span, by span name.
+durations = collections.defaultdict(list)
+
+session_start = time.time()
+profiler = None
+
+
+class Span:
+    """Context manager that records how long the code that it wraps takes.
+
+    Attributes:
+        name: A string that contains the name of the span.
+        start: A float that represents when the span was entered.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        durations[self.name].append(time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan:
+    """Context manager that does nothing, used when timing is turned off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def span(name):
+    # Returns a context manager that records how long the code that it wraps
+    # takes under a span name when timing is turned on.
+    if ENABLED:
+        return Span(name)
+    return NULL_SPAN
+
+
+def timed(function):
+    # Decorates a function so that each of its calls is recorded under a span
+    # named after its module and name when timing is turned on. The calls of
+    # generator functions are recorded once the generator is exhausted or
+    # closed, and only count the time spent producing its values, not the
+    # time that the caller spends between them. Returns the function
+    # unchanged when timing is turned off.
+    if not ENABLED:
+        return function
+    import inspect
+
+    module = function.__module__
+    if module == '__main__':
+        # Name the spans of a module that is run as a script after its file.
+        module = os.path.splitext(
+            os.path.basename(sys.modules[module].__file__))[0]
+    name = '%s.%s' % (module, function.__name__)
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def timed_generator(*args, **kwargs):
+            seconds = 0.0
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        value = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        seconds += time.perf_counter() - start
+                    yield value
+            finally:
+                generator.close()
+                durations[name].append(seconds)
+
+        return timed_generator
+
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            durations[name].append(time.perf_counter() - start)
+
+    return timed_function
+
+
+def get_worker_function(function):
+    # Returns a function for a pool of worker processes to call in place of a
+    # function. When timing is turned on, it returns the function's result
+    # along with the durations of the spans that the call recorded in the
+    # worker process, which are otherwise lost when the worker exits, for
+    # 'get_worker_result' to merge into the durations of this process.
+    if not ENABLED:
+        return function
+    return functools.partial(call_in_worker, function)
+
+
+def call_in_worker(function, *args):
+    # Calls a function in a worker process and returns its result and the
+    # durations of the spans that the call recorded. The durations copied
+    # from the parent process when the worker was forked are left out.
+    durations.clear()
+    return function(*args), dict(durations)
+
+
+def get_worker_result(result):
+    # Returns the result of a function returned by 'get_worker_function',
+    # merging the durations of its spans into the durations of this process.
+    if not ENABLED:
+        return result
+    result, worker_durations = result
+    for name, values in worker_durations.items():
+        durations[name].extend(values)
+    return result
+
+
+def get_percentile_positions(num_values, percentile):
+    # Returns the indices of the two values closest to a percentile of a sorted
+    # list of values and the fraction of the way from the first to the second
+    # that the percentile is at.
+    position = (num_values - 1) * percentile / 100.0
+    lower = int(position)
+    upper = min(lower + 1, num_values - 1)
+    return lower, upper, position - lower
+
+
+def get_percentile(sorted_values, percentile):
+    # Returns a percentile of a sorted list of values, linearly interpolated
+    # between the closest values.
+    lower, upper, fraction = get_percentile_positions(len(sorted_values),
+                                                      percentile)
+    return (sorted_values[lower] +
+            (sorted_values[upper] - sorted_values[lower]) * fraction)
+
+
+def get_aggregates():
+    """Aggregates the recorded durations of each span.
+
+    Returns:
+        An OrderedDict of span names, sorted by name, and dicts that contain
+        the number of calls of each span and the total, mean, 95th percentile,
+        and maximum number of seconds that the calls took. For example:
+
+        {'csv_dicts.dicts_to_csv': {'count': 2, 'total': 0.08, 'mean': 0.04,
+                                    'p95': 0.05, 'max': 0.05}}
+    """
+    aggregates = collections.OrderedDict()
+    for name in sorted(durations):
+        values = sorted(durations[name])
+        total = sum(values)
+        aggregates[name] = collections.OrderedDict([
+            ('count', len(values)),
+            ('total', total),
+            ('mean', total / len(values)),
+            ('p95', get_percentile(values, 95)),
+            ('max', values[-1])])
+
+    return aggregates
+
+
+def write_session(timing_file):
+    # Appends the aggregates of the session to a file as one line of JSON.
+    import datetime
+    import json
+
+    session = collections.OrderedDict([
+        ('start', datetime.datetime.fromtimestamp(session_start).isoformat()),
+        ('end', datetime.datetime.now().isoformat()),
+        ('pid', os.getpid()),
+        ('spans', get_aggregates())])
+    with open(timing_file, 'a') as output_file:
+        output_file.write(json.dumps(session) + '\n')
+
+
+def end_session():
+    # Writes the session's timing aggregates and profile, if they were turned
+    # on.
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(PROFILE_FILE)
+    if ENABLED and durations:
+        write_session(TIMING_FILE)
+
+
+if ENABLED or PROFILE_FILE:
+    atexit.register(end_session)
+if PROFILE_FILE:
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+"""
+Module for serving rankings, searches, and projections of the Annual Estimates
+of the Resident Population as JSON over HTTP.
+
+Every division is loaded and ranked once at startup, and requests are answered
+concurrently on an asyncio event loop from the datasets in memory. The
+handlers, which can sort, rank, search, or fit a growth model to a whole
+division, run on the threads of the event loop's default executor, so a slow
+request does not hold up reading and writing the others.
+
+To run:
+
+    $ python query_server.py --port 8080
+
+Endpoints:
+
+    /top?division=county&sort=cagr&k=5&offset=0
+    /top?division=county&sort=projected-pop&year=2030&model=log-linear&k=5
+    /bottom?division=state&sort=most-recent-pop&k=5
+    /search?division=county&q=los+angeles&limit=8
+    /projection?division=county&id=06037&first_year=2019&last_year=2050
+    /projection?division=state&name=Texas&last_year=2030&model=linear
+"""
+
+from constants import *
+import argparse
+import asyncio
+import batch_export
+import growth_models
+import json
+import sys
+import traceback
+import tui_app
+from urllib.parse import parse_qs, urlsplit
+
+# Largest number of geographies returned by a single request.
+MAX_RESULTS = 1000
+
+STATUS_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                  405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class QueryError(Exception):
+    """Exception raised when a request cannot be answered.
+
+    Attributes:
+        status: An integer that represents the HTTP status code of the error.
+        message: A string that describes the error.
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+        self.message = message
+
+
+def load_datasets():
+    # Loads the GeographyTable of every division, sorts each table by every
+    # type of estimate that does not depend on a year, builds each table's
+    # search index, and returns a dict of division names and tables.
+    datasets = {}
+    for division, (_, csv_file) in batch_export.DIVISIONS.items():
+        geographies = tui_app.DATASETS.get(csv_file)
+        tui_app.sort_geographies_by_most_recent_pop(geographies)
+        tui_app.sort_geographies_by_cagr(geographies)
+        tui_app.get_search_index(geographies)
+        datasets[division] = geographies
+
+    return datasets
+
+
+def get_param(params, name, default=None, convert=str):
+    # Returns the value of a query string parameter converted to a type.
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(400, 'Missing parameter: %s' % (name))
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise QueryError(400, 'Invalid parameter: %s' % (name))
+
+
+def get_year_param(params, name, default=None):
+    # Returns a future year from the query string parameters.
+    year = get_param(params, name, default, int)
+    if not (LAST_YEAR < year <= MAX_PROJECTED_YEAR):
+        raise QueryError(400, '%s must be between %s and %s' % (
+            name, LAST_YEAR + 1, MAX_PROJECTED_YEAR))
+    return year
+
+
+def get_count_param(params, name, default):
+    # Returns a number of results from the query string parameters.
+    count = get_param(params, name, default, int)
+    if not (0 <= count <= MAX_RESULTS):
+        raise QueryError(400, '%s must be between 0 and %s' % (name,
+                                                               MAX_RESULTS))
+    return count
+
+
+def get_model_param(params):
+    # Returns the name of a growth model from the query string parameters.
+    model = get_param(params, 'model', DEFAULT_GROWTH_MODEL)
+    if model not in growth_models.MODELS:
+        raise QueryError(400, 'Unknown model: %s' % (model))
+    return model
+
+
+def get_division(datasets, params):
+    # Returns the GeographyTable of the division named by the query string
+    # parameters, along with the division's Geographic Divisions Menu option.
+    division = get_param(params, 'division')
+    if division not in datasets:
+        raise QueryError(404, 'Unknown division: %s' % (division))
+    return datasets[division], batch_export.DIVISIONS[division][0]
+
+
+def get_user_selections(datasets, params):
+    # Returns a dict of user selections for a ranking request.
+    geographies, geo_division = get_division(datasets, params)
+    sort = get_param(params, 'sort', 'most-recent-pop')
+    if sort not in batch_export.SORTS:
+        raise QueryError(400, 'Unknown sort: %s' % (sort))
+    sorted_by = batch_export.SORTS[sort]
+    year = LAST_YEAR
+    if sorted_by == PROJECTED_POP:
+        year = get_year_param(params, 'year')
+
+    return {GEOGRAPHIES: geographies, GEO_DIVISION: geo_division,
+            SORTED_BY: sorted_by, YEAR: year,
+            GROWTH_MODEL: get_model_param(params)}
+
+
+def query_top(datasets, params):
+    # Returns the geographies ranked from 'offset' to 'offset' + 'k'.
+    user_selections = get_user_selections(datasets, params)
+    offset = get_param(params, 'offset', 0, int)
+    num_geographies = len(user_selections.get(GEOGRAPHIES))
+    if not (0 <= offset <= num_geographies):
+        raise QueryError(400, 'offset must be between 0 and %s' % (
+            num_geographies))
+    k = get_count_param(params, 'k', 5)
+
+    return {'results': tui_app.get_ranked_geography_dicts(
+        user_selections, offset, offset + k)}
+
+
+def query_bottom(datasets, params):
+    # Returns the 'k' geographies ranked last, starting with the last.
+    user_selections = get_user_selections(datasets, params)
+    k = get_count_param(params, 'k', 5)
+
+    return {'results': tui_app.get_bottom_geography_dicts(user_selections, k)}
+
+
+def query_search(datasets, params):
+    # Returns the geographies whose names or FIPS codes best match a search
+    # term.
+    geographies, _ = get_division(datasets, params)
+    limit = get_count_param(params, 'limit', SEARCH_RESULTS_LIMIT)
+    rows = tui_app.get_search_index(geographies).search(
+        get_param(params, 'q'), limit)
+
+    return {'results': [{'name': geographies.names[row],
+                         'id': geographies.ids[row]} for row in rows]}
+
+
+def query_projection(datasets, params):
+    # Returns the projected population estimates of one geography, identified
+    # by its FIPS code or exact name, for a range of future years.
+    geographies, _ = get_division(datasets, params)
+    first_year = get_year_param(params, 'first_year', LAST_YEAR + 1)
+    last_year = get_year_param(params, 'last_year', first_year)
+    if last_year < first_year or last_year - first_year >= MAX_RESULTS:
+        raise QueryError(400, 'Invalid range of years')
+
+    if params.get('id'):
+        column_name, value = 'ids', get_param(params, 'id')
+    else:
+        column_name, value = 'names', get_param(params, 'name')
+    row = geographies.find_row(column_name, value)
+    if row is None:
+        raise QueryError(404, 'Unknown geography: %s' % (value))
+
+    projected_years = list(range(first_year, last_year + 1))
+    fit = growth_models.get_fit(geographies, get_model_param(params))
+    projected_pops = fit.get_row_projected_populations(
+        row, [year - LAST_YEAR for year in projected_years])
+
+    return {'name': geographies.names[row],
+            'id': geographies.ids[row],
+            'cagr': geographies.cagrs[row],
+            'model': fit.model,
+            'projections': [{'year': year, 'population': projected_pop}
+                            for year, projected_pop in zip(projected_years,
+                                                           projected_pops)]}
+
+
+ROUTES = {'/top': query_top,
+          '/bottom': query_bottom,
+          '/search': query_search,
+          '/projection': query_projection}
+
+def handle_request(datasets, method, target):
+    # Returns the HTTP status code and JSON-serializable body of the response
+    # to a request. Unexpected errors are printed to standard error and
+    # answered with a 500 response, so the client always gets a response.
+    if method != 'GET':
+        return 405, {'error': 'Only GET requests are supported'}
+    url = urlsplit(target)
+    route = ROUTES.get(url.path)
+    if route is None:
+        return 404, {'error': 'Unknown path: %s' % (url.path)}
+    try:
+        return 200, route(datasets, parse_qs(url.query))
+    except QueryError as error:
+        return error.status, {'error': error.message}
+    except Exception:
+        traceback.print_exc()
+        return 500, {'error': 'Internal server error'}
+
+
+def format_response(status, body, keep_alive):
+    # Returns the bytes of an HTTP response with a JSON body.
+    payload = json.dumps(body).encode('utf-8')
+    headers = ['HTTP/1.1 %s %s' % (status, STATUS_REASONS[status]),
+               'Content-Type: application/json',
+               'Content-Length: %s' % (len(payload)),
+               'Connection: %s' % ('keep-alive' if keep_alive else 'close')]
+
+    return ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload
+
+
+async def handle_connection(datasets, reader, writer):
+    # Answers the requests sent over a connection until the client closes it
+    # or asks for it to be closed.
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while True:
+                header_line = await reader.readline()
+                if not header_line.strip():
+                    break
+                name, _, value = header_line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+
+            try:
+                method, target, version = (
+                    request_line.decode('latin-1').split())
+            except ValueError:
+                writer.write(format_response(400, {'error': 'Bad request'},
+                                             False))
+                break
+            keep_alive = headers.get('connection') != 'close' and (
+                version == 'HTTP/1.1' or
+                headers.get('connection') == 'keep-alive')
+
+            status, body = await asyncio.get_running_loop().run_in_executor(
+                None, handle_request, datasets, method, target)
+            writer.write(format_response(status, body, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(datasets, host, port):
+    # Starts serving requests and returns the asyncio server.
+    def client_connected(reader, writer):
+        return handle_connection(datasets, reader, writer)
+
+    return await asyncio.start_server(client_connected, host, port)
+
+
+async def serve(host, port):
+    # Loads every division and serves requests until interrupted.
+    datasets = load_datasets()
+    server = await start_server(datasets, host, port)
+    for sock in server.sockets:
+        print('Serving on http://%s:%s' % sock.getsockname()[:2])
+    async with server:
+        await server.serve_forever()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Serve population estimates as JSON over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='port to listen on')
+    args = parser.parse_args(args)
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""
+Module for rolling the annual population estimates of geographies up into
+groups, such as the counties of each state or custom groupings of counties like
+sales territories.
+
+A rollup is a GeographyTable with one row per group whose annual population
+estimates are the sums of the estimates of the group's geographies, so its
+compound annual growth rates and projections are calculated in the same way as
+those of any division, and it can be viewed and exported in the same way.
+
+Custom groupings are read from a CSV file with a header row whose first column
+contains FIPS codes and whose second column contains the name of the group of
+each FIPS code, for example:
+
+    FIPS,Territory
+    06037,West
+    36061,Northeast
+"""
+
+import array
+import collections
+import csv
+import geography
+import growth_models
+import itertools
+import operator
+
+
+def get_state_fips(fips):
+    # Returns the state FIPS code of a county FIPS code.
+    return fips[:2]
+
+
+def get_group_keys(geographies, get_group_key):
+    # Returns a list that contains the group key of each row of a
+    # GeographyTable, calculated from the row's ID. Rows whose key is None are
+    # left out of every group.
+    return [get_group_key(geo_id) for geo_id in geographies.ids]
+
+
+def read_grouping_csv(csv_file, encoding='latin-1'):
+    # Returns a dict of FIPS codes and the names of their groups read from a
+    # CSV file of a custom grouping.
+    with open(csv_file, 'r', encoding=encoding, newline='') as input_file:
+        reader = csv.reader(input_file)
+        next(reader)  # Skip the header row.
+        return dict((row[0].strip(), row[1].strip()) for row in reader
+                    if len(row) >= 2 and row[0].strip())
+
+
+def rollup(geographies, group_keys, group_names=None):
+    """Aggregates the rows of a GeographyTable into groups.
+
+    The rows are sorted by group once, after which each year's estimates are
+    gathered into group order and summed a whole group at a time, so the work
+    done for each estimate happens in C rather than in the interpreter.
+
+    Args:
+        geographies: A GeographyTable.
+        group_keys: A list that contains the group key of each row of the
+            table, or None for rows that do not belong to a group.
+        group_names: An optional dict of group keys and the names of the
+            groups. Groups without a name are named after their keys.
+
+    Returns:
+        A GeographyTable with one row per group, sorted by group key, whose IDs
+        are the group keys and whose annual population estimates are the sums
+        of the estimates of the group's rows.
+    """
+    if group_names is None:
+        group_names = {}
+    rows = sorted((row for row, key in enumerate(group_keys)
+                   if key is not None), key=group_keys.__getitem__)
+
+    keys = []
+    bounds = []
+    start = 0
+    for key, group_rows in itertools.groupby(rows, group_keys.__getitem__):
+        stop = start + len(list(group_rows))
+        keys.append(key)
+        bounds.append((start, stop))
+        start = stop
+
+    num_years = geographies.num_years
+    pop_ests = array.array('q', [0]) * (len(keys) * num_years)
+    if len(rows) > 1:
+        gather = operator.itemgetter(*rows)
+    else:
+        # itemgetter returns a single value rather than a tuple for one row.
+        def gather(column):
+            return [column[row] for row in rows]
+    for year_index in range(num_years):
+        column = gather(geographies.get_pop_ests_for_year(year_index))
+        for group, (start, stop) in enumerate(bounds):
+            pop_ests[group * num_years + year_index] = sum(column[start:stop])
+
+    names = [group_names.get(key, key) for key in keys]
+
+    return geography.GeographyTable(names, pop_ests, num_years, ids=keys)
+
+
+def rollup_by_state(counties, states):
+    # Returns a rollup of a GeographyTable of counties into their states, named
+    # after the states in a GeographyTable of states.
+    return rollup(counties, get_group_keys(counties, get_state_fips),
+                  dict(zip(states.ids, states.names)))
+
+
+def rollup_by_grouping(geographies, grouping):
+    # Returns a rollup of a GeographyTable into the groups of a dict of FIPS
+    # codes and group names. Rows whose FIPS codes are not in the grouping are
+    # left out.
+    return rollup(geographies, get_group_keys(geographies, grouping.get))
+
+
+def cross_check(rolled_up, reported, first_year):
+    """Compares the estimates of a rollup with independently reported totals.
+
+    Args:
+        rolled_up: A GeographyTable returned by 'rollup'.
+        reported: A GeographyTable whose IDs are the same group keys, such as
+            the table of states, with the same years of estimates.
+        first_year: An integer that represents the year of the first estimate
+            of both tables.
+
+    Returns:
+        A list of dicts, one for each estimate that does not match, that
+        contain the ID and name of the group, the year, and the rolled up and
+        reported estimates. Groups that are missing from either table are
+        reported with an estimate of None.
+    """
+    reported_rows = dict((geo_id, row) for row, geo_id in
+                         enumerate(reported.ids))
+    rolled_up_ids = set(rolled_up.ids)
+    mismatches = []
+
+    for row, geo_id in enumerate(rolled_up.ids):
+        rolled_up_pop_ests = rolled_up.get_annual_pop_ests(row)
+        if geo_id in reported_rows:
+            reported_pop_ests = reported.get_annual_pop_ests(
+                reported_rows[geo_id])
+        else:
+            reported_pop_ests = [None] * rolled_up.num_years
+        for year_index, (rolled_up_pop, reported_pop) in enumerate(
+                zip(rolled_up_pop_ests, reported_pop_ests)):
+            if rolled_up_pop != reported_pop:
+                mismatches.append(get_mismatch(
+                    geo_id, rolled_up.names[row], first_year + year_index,
+                    rolled_up_pop, reported_pop))
+
+    for row, geo_id in enumerate(reported.ids):
+        if geo_id not in rolled_up_ids:
+            for year_index, reported_pop in enumerate(
+                    reported.get_annual_pop_ests(row)):
+                mismatches.append(get_mismatch(
+                    geo_id, reported.names[row], first_year + year_index,
+                    None, reported_pop))
+
+    return mismatches
+
+
+def get_mismatch(geo_id, name, year, rolled_up_pop, reported_pop):
+    # Returns a dict that describes an estimate of a rollup that does not match
+    # its reported total.
+    mismatch = collections.OrderedDict()
+    mismatch['Id'] = geo_id
+    mismatch['Geography Name'] = name
+    mismatch['Year'] = year
+    mismatch['Rolled Up Estimate'] = rolled_up_pop
+    mismatch['Reported Estimate'] = reported_pop
+
+    return mismatch
+
+
+def get_rollup_dict_keys(first_year, num_years, projected_years=()):
+    # Returns the keys of the dictionaries that are returned by
+    # 'iter_rollup_dicts'.
+    return (['Id', 'Geography Name'] +
+            ['%s Population Estimate' % (year)
+             for year in range(first_year, first_year + num_years)] +
+            ['Compound Annual Growth Rate Estimate (%s-%s)' % (
+                first_year, first_year + num_years - 1)] +
+            ['%s Projected Population Estimate' % (year)
+             for year in projected_years])
+
+
+def iter_rollup_dicts(rolled_up, first_year, projected_years=(),
+                      model=growth_models.ENDPOINT_CAGR):
+    # Yields a dictionary for each group of a rollup, in the table's current
+    # order, that contains the ID and name of the group, its annual population
+    # estimates, its compound annual growth rate, and its projected population
+    # estimate from a growth model for each of a list of future years.
+    num_years = rolled_up.num_years
+    keys = get_rollup_dict_keys(first_year, num_years, projected_years)
+    last_year = first_year + num_years - 1
+    fit = growth_models.get_fit(rolled_up, model)
+    offsets = [year - last_year for year in projected_years]
+
+    for row in rolled_up.order:
+        values = [rolled_up.ids[row], rolled_up.names[row]]
+        values.extend(rolled_up.get_annual_pop_ests(row))
+        values.append('%s%%' % (round(rolled_up.cagrs[row] * 100, 2)))
+        values.extend(fit.get_row_projected_populations(row, offsets))
+
+        yield collections.OrderedDict(zip(keys, values))
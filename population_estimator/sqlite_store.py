@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+
+"""
+Module for storing the parsed CSV files in a local SQLite database so that the
+text-based user interface, the batch exports, and the query server can share
+one pre-indexed store.
+
+Every CSV file is bulk-loaded with 'executemany' inside a single transaction,
+and each geography's name, FIPS code, most recent population estimate, and
+compound annual growth rate are indexed. The GeographyTables read from the
+store rank, filter, and search their rows with SQL queries that order and limit
+the rows inside SQLite, instead of sorting or scanning them in Python, and only
+read the annual population estimates of every row when they are first needed.
+A CSV file is loaded again when the store is opened after its size or
+modification time changes.
+
+The store is used in place of the cache files when the POP_EST_BACKEND
+environment variable is set to 'sqlite':
+
+    $ POP_EST_BACKEND=sqlite python tui_app.py
+"""
+
+from constants import *
+import array
+import geography
+import geography_search
+import growth_models
+import os
+import sqlite3
+import sys
+import threading
+
+# Version of the database schema. Databases with another version are rebuilt.
+SCHEMA_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE sources (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    num_years INTEGER NOT NULL
+);
+CREATE TABLE geographies (
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    fips TEXT NOT NULL,
+    latest_pop INTEGER NOT NULL,
+    cagr REAL NOT NULL,
+    pop_ests BLOB NOT NULL,
+    PRIMARY KEY (source, row)
+);
+CREATE INDEX geographies_name ON geographies (source, normalized_name);
+CREATE INDEX geographies_fips ON geographies (source, fips);
+CREATE INDEX geographies_latest_pop ON geographies (source, latest_pop DESC,
+                                                    row);
+CREATE INDEX geographies_cagr ON geographies (source, cagr DESC, row);
+'''
+
+# SQL expressions of the columns that each sort name orders the rows by.
+SORT_COLUMNS = {MOST_RECENT_POP: 'latest_pop', CAGR: 'cagr'}
+
+# SQL conditions of the exact and prefix matches of a search, which are ranges
+# of the name and FIPS code indexes.
+EXACT_CONDITION = '(normalized_name = :query OR fips = :id)'
+PREFIX_CONDITION = (
+    '((normalized_name >= :query AND normalized_name < :query_stop) '
+    'OR (fips >= :id AND fips < :id_stop))')
+
+# SQL conditions of the rows that each tier of a search finds, from the best
+# matches to the worst, and the SQL expressions that the rows of a tier are
+# ordered by before the length of their names. The last tier scans every name
+# for word prefix and substring matches.
+SEARCH_TIERS = [
+    (EXACT_CONDITION, ''),
+    ('%s AND NOT %s' % (PREFIX_CONDITION, EXACT_CONDITION), ''),
+    ('instr(normalized_name, :query) > 0 AND NOT %s' % (PREFIX_CONDITION),
+     'instr(\' \' || normalized_name, \' \' || :query) = 0,')]
+
+
+def get_projected_pop(latest_pop, cagr, num_years):
+    # Returns a projected population estimate calculated in the same way as
+    # the endpoint compound annual growth rate model, for use in SQL queries.
+    return growth_models.project(latest_pop, cagr, num_years)
+
+
+def get_source_key(csv_file):
+    # Returns the absolute path, size, and modification time of a CSV file.
+    stat = os.stat(csv_file)
+    return os.path.abspath(csv_file), stat.st_size, stat.st_mtime
+
+
+def to_blob(pop_ests):
+    # Returns the little-endian bytes of an array of population estimates.
+    pop_ests = array.array('q', pop_ests)
+    if sys.byteorder != 'little':
+        pop_ests.byteswap()
+    return pop_ests.tobytes()
+
+
+class SQLiteStore:
+    """Class for loading and querying the geographies of the CSV files.
+
+    Attributes:
+        db_file: A string that contains the path to the SQLite database file.
+        local: Thread-local storage of each thread's sqlite3 Connection to the
+            database and the process that opened it, since a connection can
+            only be used by the thread, and process, that opened it.
+        load_lock: A lock that keeps two threads from loading the same CSV
+            files at once.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+        self.load_lock = threading.Lock()
+
+    def connect(self):
+        # Returns the thread's connection to the database, creating the
+        # database's schema if it does not have the current one.
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None and self.local.pid == os.getpid():
+            return connection
+
+        folder = os.path.dirname(self.db_file)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        connection = sqlite3.connect(self.db_file)
+        connection.create_function('projected_pop', 3, get_projected_pop)
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with connection:
+                for table in ('geographies', 'sources'):
+                    connection.execute('DROP TABLE IF EXISTS %s' % (table))
+                connection.executescript(SCHEMA)
+                connection.execute('PRAGMA user_version = %s' % (
+                    SCHEMA_VERSION))
+
+        self.local.connection = connection
+        self.local.pid = os.getpid()
+        return connection
+
+    def get_stale_csv_files(self, csv_files):
+        # Returns the CSV files in a list that have not been loaded or have
+        # changed since they were loaded.
+        connection = self.connect()
+        loaded = dict((source, (size, mtime)) for source, size, mtime in
+                      connection.execute(
+                          'SELECT source, size, mtime FROM sources'))
+        stale_csv_files = []
+        for csv_file in csv_files:
+            source, size, mtime = get_source_key(csv_file)
+            if loaded.get(source) != (size, mtime):
+                stale_csv_files.append(csv_file)
+
+        return stale_csv_files
+
+    def load(self, csv_files, load_geographies):
+        """Bulk-loads CSV files into the store in a single transaction.
+
+        Only the CSV files that have not been loaded or have changed since they
+        were loaded are read and replaced.
+
+        Args:
+            csv_files: A list of strings that contain the paths to CSV files.
+            load_geographies: A function that takes the path to a CSV file and
+                returns a GeographyTable of its geographies.
+
+        Returns:
+            A list of the CSV files that were loaded.
+        """
+        with self.load_lock:
+            stale_csv_files = self.get_stale_csv_files(csv_files)
+            if stale_csv_files:
+                self.insert(stale_csv_files, load_geographies)
+
+        return stale_csv_files
+
+    def insert(self, csv_files, load_geographies):
+        # Replaces the rows of CSV files in a single transaction.
+        tables = [(csv_file, load_geographies(csv_file))
+                  for csv_file in csv_files]
+
+        connection = self.connect()
+        with connection:
+            for csv_file, geographies in tables:
+                source, size, mtime = get_source_key(csv_file)
+                connection.execute('DELETE FROM geographies WHERE source = ?',
+                                   (source,))
+                connection.execute(
+                    'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                    (source, size, mtime, geographies.num_years))
+                connection.executemany(
+                    'INSERT INTO geographies VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    self.iter_rows(source, geographies))
+            # Without statistics of the indexes, SQLite scans every row of a
+            # CSV file for the exact matches of a search rather than looking
+            # up the name and FIPS code indexes.
+            connection.execute('ANALYZE')
+
+    def iter_rows(self, source, geographies):
+        # Yields a tuple of the values of the geographies table for each row
+        # of a GeographyTable.
+        for row in range(len(geographies)):
+            name = geographies.names[row]
+            yield (source, row, name, geography_search.normalize(name),
+                   geographies.ids[row], geographies.most_recent_pop_ests[row],
+                   geographies.cagrs[row],
+                   to_blob(geographies.get_annual_pop_ests(row)))
+
+    def get_geographies(self, csv_file):
+        """Reads the geographies of a loaded CSV file from the store.
+
+        Args:
+            csv_file: A string that contains the path to a loaded CSV file.
+
+        Returns:
+            A SQLiteGeographyTable whose rows are in the order of the CSV file
+            and that ranks and searches its rows with SQL queries. Only the
+            names, FIPS codes, most recent population estimates, and compound
+            annual growth rates of the rows are read.
+        """
+        connection = self.connect()
+        source = get_source_key(csv_file)[0]
+        num_years = connection.execute(
+            'SELECT num_years FROM sources WHERE source = ?',
+            (source,)).fetchone()[0]
+
+        names = []
+        ids = []
+        most_recent_pop_ests = array.array('q')
+        cagrs = array.array('d')
+        for name, fips, latest_pop, cagr in connection.execute(
+                'SELECT name, fips, latest_pop, cagr FROM geographies '
+                'WHERE source = ? ORDER BY row', (source,)):
+            names.append(name)
+            ids.append(fips)
+            most_recent_pop_ests.append(latest_pop)
+            cagrs.append(cagr)
+
+        return SQLiteGeographyTable(self, source, names, most_recent_pop_ests,
+                                    num_years, cagrs, ids)
+
+    def get_pop_ests(self, source):
+        # Returns an array of the annual population estimates of every row of
+        # a loaded CSV file in row-major order.
+        pop_ests = bytearray()
+        for blob, in self.connect().execute(
+                'SELECT pop_ests FROM geographies WHERE source = ? '
+                'ORDER BY row', (source,)):
+            pop_ests.extend(blob)
+
+        pop_ests = array.array('q', bytes(pop_ests))
+        if sys.byteorder != 'little':
+            pop_ests.byteswap()
+
+        return pop_ests
+
+    def get_sorted_rows(self, source, sort_name, start=0, stop=None,
+                        descending=True):
+        """Returns the rows of a CSV file ranked by a sort name.
+
+        Args:
+            source: A string that contains the absolute path to a loaded CSV
+                file.
+            sort_name: A sort name of SORT_COLUMNS, or a tuple of
+                PROJECTED_POP, a future year, and the name of a growth model.
+                Only projections of the endpoint compound annual growth rate
+                model are ranked in SQL.
+            start: An integer that represents the first rank returned.
+            stop: An integer that represents the rank after the last rank
+                returned, or None for every rank after 'start'.
+            descending: A boolean that determines whether the rows are ranked
+                from highest to lowest, with rows with equal values in the
+                order of the CSV file, or in the reverse of that order.
+
+        Returns:
+            A list of the rows, or None if the sort name cannot be ranked in
+            SQL.
+        """
+        params = {'source': source, 'start': start,
+                  'limit': -1 if stop is None else max(0, stop - start)}
+        if sort_name in SORT_COLUMNS:
+            column = SORT_COLUMNS[sort_name]
+        elif (isinstance(sort_name, tuple) and sort_name[0] == PROJECTED_POP
+              and sort_name[2] == growth_models.ENDPOINT_CAGR):
+            column = 'projected_pop(latest_pop, cagr, :num_years)'
+            params['num_years'] = sort_name[1] - LAST_YEAR
+        else:
+            return None
+        if descending:
+            order = '%s DESC, row ASC' % (column)
+        else:
+            order = '%s ASC, row DESC' % (column)
+
+        return [row for row, in self.connect().execute(
+            'SELECT row FROM geographies WHERE source = :source '
+            'ORDER BY %s LIMIT :limit OFFSET :start' % (order), params)]
+
+    def get_rows_in_range(self, source, sort_name, low=None, high=None,
+                          limit=None):
+        # Returns the rows of a CSV file whose values of an indexed sort name
+        # are between 'low' and 'high', inclusive, ranked from highest to
+        # lowest. Either bound may be None.
+        column = SORT_COLUMNS[sort_name]
+        conditions = ['source = ?']
+        params = [source]
+        if low is not None:
+            conditions.append('%s >= ?' % (column))
+            params.append(low)
+        if high is not None:
+            conditions.append('%s <= ?' % (column))
+            params.append(high)
+        params.append(-1 if limit is None else limit)
+
+        return [row for row, in self.connect().execute(
+            'SELECT row FROM geographies WHERE %s ORDER BY %s DESC, row '
+            'LIMIT ?' % (' AND '.join(conditions), column), params)]
+
+    def search(self, source, search_term, limit):
+        # Returns the rows of a CSV file whose names or FIPS codes match a
+        # search term exactly, as a prefix, as a word prefix, or as a
+        # substring, ranked in the same way as GeographySearchIndex.search.
+        # Exact and prefix matches are found with ranges of the name and FIPS
+        # code indexes, and the names are only scanned for word prefix and
+        # substring matches when there are fewer than 'limit' of them.
+        query = geography_search.normalize(search_term)
+        geo_id = search_term.strip()
+        if not query or limit <= 0:
+            return []
+
+        params = {'source': source, 'query': query,
+                  'query_stop': query + geography_search.LAST_CHARACTER,
+                  'id': geo_id,
+                  'id_stop': geo_id + geography_search.LAST_CHARACTER}
+        rows = []
+        for condition, order in SEARCH_TIERS:
+            params['limit'] = limit - len(rows)
+            rows.extend(row for row, in self.connect().execute(
+                'SELECT row FROM geographies '
+                'WHERE source = :source AND %s '
+                'ORDER BY %s length(normalized_name), row '
+                'LIMIT :limit' % (condition, order), params))
+            if len(rows) >= limit:
+                break
+
+        return rows
+
+
+class SQLiteGeographyTable(geography.GeographyTable):
+    """GeographyTable that ranks and searches its rows with SQL queries.
+
+    The annual population estimates of the rows, pop_ests and first_pop_ests,
+    are None until they are read from the store the first time that they are
+    needed, such as to fit a growth model to every year.
+
+    Attributes:
+        store: The SQLiteStore that the table was read from.
+        source: A string that contains the absolute path to the CSV file that
+            the table was read from.
+    """
+
+    def __init__(self, store, source, names, most_recent_pop_ests, num_years,
+                 cagrs, ids):
+        geography.GeographyTable.__init__(self, names, array.array('q'),
+                                          num_years, cagrs, ids)
+        self.pop_ests = None
+        self.first_pop_ests = None
+        self.most_recent_pop_ests = most_recent_pop_ests
+        self.store = store
+        self.source = source
+        self.search_index = SQLiteSearchIndex(self)
+
+    def read_pop_ests(self):
+        # Reads the annual population estimates of every row from the store
+        # unless they have already been read.
+        if self.pop_ests is None:
+            self.pop_ests = self.store.get_pop_ests(self.source)
+            self.first_pop_ests = self.pop_ests[0::self.num_years]
+
+    def get_annual_pop_ests(self, row):
+        # Returns the annual population estimates of the geography in a row.
+        self.read_pop_ests()
+        return geography.GeographyTable.get_annual_pop_ests(self, row)
+
+    def get_pop_ests_for_year(self, year_index):
+        # Returns a column containing every geography's population estimate for
+        # the year at a given index.
+        self.read_pop_ests()
+        return geography.GeographyTable.get_pop_ests_for_year(self,
+                                                              year_index)
+
+    def sort_by(self, sort_keys, sort_name=None):
+        # Sorts the rows of the table by ordering them in SQL when the sort
+        # name can be ranked in SQL, and otherwise in Python.
+        if sort_name not in self.sort_orders:
+            order = self.store.get_sorted_rows(self.source, sort_name)
+            if order is not None:
+                self.set_sort_order(sort_name, order)
+        geography.GeographyTable.sort_by(self, sort_keys, sort_name)
+
+    def get_ranked_rows(self, sort_keys, start, stop, sort_name=None):
+        # Returns the rows ranked from 'start' up to, but not including, 'stop'
+        # with a limited SQL query, unless the full order is already stored.
+        if sort_name not in self.sort_orders:
+            rows = self.store.get_sorted_rows(self.source, sort_name,
+                                              start, stop)
+            if rows is not None:
+                return rows
+        return geography.GeographyTable.get_ranked_rows(
+            self, sort_keys, start, stop, sort_name)
+
+    def get_bottom_rows(self, sort_keys, num_rows, sort_name=None):
+        # Returns the 'num_rows' rows ranked last, starting with the last
+        # ranked row, with a limited SQL query, unless the full order is
+        # already stored.
+        if sort_name not in self.sort_orders:
+            rows = self.store.get_sorted_rows(self.source, sort_name, 0,
+                                              max(0, num_rows), False)
+            if rows is not None:
+                return rows
+        return geography.GeographyTable.get_bottom_rows(
+            self, sort_keys, num_rows, sort_name)
+
+    def get_rows_in_range(self, sort_keys, low=None, high=None,
+                          sort_name=None):
+        # Returns the rows whose sort keys are between 'low' and 'high' with an
+        # SQL query on the indexed column of the sort name, unless the range
+        # index is already stored or the sort name is not indexed.
+        if sort_name not in self.range_keys and sort_name in SORT_COLUMNS:
+            return self.store.get_rows_in_range(self.source, sort_name, low,
+                                                high)
+        return geography.GeographyTable.get_rows_in_range(
+            self, sort_keys, low, high, sort_name)
+
+
+class SQLiteSearchIndex:
+    """Search index that finds a table's geographies with SQL queries.
+
+    Exact, prefix, word prefix, and substring matches are found in SQL. When
+    there are fewer of them than requested, a GeographySearchIndex is built on
+    first use to find similar names.
+
+    Attributes:
+        geographies: The SQLiteGeographyTable that is searched.
+        fuzzy_index: A GeographySearchIndex of the table's names and IDs, or
+            None until one is needed.
+    """
+
+    def __init__(self, geographies):
+        self.geographies = geographies
+        self.fuzzy_index = None
+
+    def get_size(self):
+        # Returns the approximate number of bytes of memory that the index
+        # uses.
+        if self.fuzzy_index is None:
+            return 0
+        return self.fuzzy_index.get_size()
+
+    def search(self, search_term, limit=10):
+        # Returns the rows of the geographies whose names or IDs best match a
+        # search term, best match first.
+        rows = self.geographies.store.search(self.geographies.source,
+                                             search_term, limit)
+        if len(rows) >= limit or not geography_search.normalize(search_term):
+            return rows
+
+        if self.fuzzy_index is None:
+            self.fuzzy_index = geography_search.GeographySearchIndex(
+                self.geographies.names, self.geographies.ids)
+        for row in self.fuzzy_index.search(search_term, limit):
+            if len(rows) >= limit:
+                break
+            if row not in rows:
+                rows.append(row)
+
+        return rows
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""
+Module for generating synthetic CSV files that have the same layout as the
+Census Bureau's PEP CSV files, for benchmarking with more rows than the real
+files have.
+
+To write a synthetic county file with one million rows:
+
+    $ python synthetic_data.py county_1000000.csv --rows 1000000
+"""
+
+from constants import *
+import argparse
+import csv
+import random
+import sys
+
+# Syllables that synthetic geography names are built from.
+SYLLABLES = ['al', 'ber', 'ca', 'dor', 'el', 'fa', 'gra', 'ham', 'ir', 'jo',
+             'kel', 'lan', 'mo', 'nor', 'o', 'pe', 'quin', 'ra', 'san', 'ta',
+             'u', 'ver', 'wa', 'xe', 'yu', 'zan']
+
+STATE_NAMES = ['Alabama', 'Alaska', 'Arizona', 'Arkansas', 'California',
+               'Colorado', 'Connecticut', 'Delaware', 'Florida', 'Georgia',
+               'Hawaii', 'Idaho', 'Illinois', 'Indiana', 'Iowa', 'Kansas',
+               'Kentucky', 'Louisiana', 'Maine', 'Maryland', 'Massachusetts',
+               'Michigan', 'Minnesota', 'Mississippi', 'Missouri', 'Montana',
+               'Nebraska', 'Nevada', 'New Hampshire', 'New Jersey',
+               'New Mexico', 'New York', 'North Carolina', 'North Dakota',
+               'Ohio', 'Oklahoma', 'Oregon', 'Pennsylvania', 'Rhode Island',
+               'South Carolina', 'South Dakota', 'Tennessee', 'Texas', 'Utah',
+               'Vermont', 'Virginia', 'Washington', 'West Virginia',
+               'Wisconsin', 'Wyoming']
+
+
+def get_header_rows():
+    # Returns the two header rows of a PEP CSV file: the column codes and the
+    # column names.
+    codes = ['GEO.id', 'GEO.id2', 'GEO.display-label',
+             'rescen4%s' % (FIRST_YEAR), 'resbase4%s' % (FIRST_YEAR)]
+    codes.extend('respop7%s' % (year)
+                 for year in range(FIRST_YEAR, LAST_YEAR + 1))
+    labels = ['Id', GEO_ID_KEY, GEO_KEY, 'April 1, %s - Census' % (FIRST_YEAR),
+              'April 1, %s - Estimates Base' % (FIRST_YEAR)]
+    labels.extend(ANN_POP_EST_KEYS)
+
+    return codes, labels
+
+
+def iter_synthetic_rows(num_rows, seed=0):
+    # Yields 'num_rows' rows of county-like geographies with randomly generated
+    # names, FIPS codes, and annual population estimates that grow at a steady
+    # random rate.
+    rng = random.Random(seed)
+    for row_num in range(num_rows):
+        state_num = row_num % len(STATE_NAMES)
+        fips = '%02d%05d' % (state_num + 1, row_num // len(STATE_NAMES))
+        name = ''.join(rng.choice(SYLLABLES)
+                       for _ in range(rng.randint(2, 4))).capitalize()
+        pop = int(rng.lognormvariate(10, 1.5)) + 50
+        growth = rng.uniform(-0.03, 0.05)
+
+        row = ['0500000US%s' % (fips), fips,
+               '%s County, %s' % (name, STATE_NAMES[state_num]), pop, pop]
+        for _ in ANN_POP_EST_KEYS:
+            row.append(pop)
+            pop = max(1, int(pop * (1 + growth)))
+
+        yield row
+
+
+def write_synthetic_pep_csv(csv_file, num_rows, seed=0):
+    """Writes a synthetic CSV file with the same layout as a PEP CSV file.
+
+    Args:
+        csv_file: A string that contains the path of the CSV file that is
+            created.
+        num_rows: An integer that represents the number of geographies in the
+            CSV file.
+        seed: An integer that seeds the random number generator, so the same
+            seed always writes the same file.
+    """
+    with open(csv_file, 'w', encoding='latin-1', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerows(get_header_rows())
+        writer.writerows(iter_synthetic_rows(num_rows, seed))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic PEP-shaped CSV file.')
+    parser.add_argument('csv_file', help='path of the CSV file to write')
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='number of geographies')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random number generator')
+    args = parser.parse_args(args)
+
+    write_synthetic_pep_csv(args.csv_file, args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
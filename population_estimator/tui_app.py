@@ -1,76 +1,374 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 
 """
 Module for viewing, searching, and exporting the Annual Estimates of the
 Resident Population provided by the U.S. Census Bureau, Population Division.
+
+Only the modules that the menus need are imported at startup. The modules that
+read, store, search, simulate, and export the estimates are imported by the
+functions that use them, the first time that they are called, so the menus and
+scripted exports start without paying for the ones that they never use.
 """
 
 from constants import *
-import csv_dicts
 import geography
-import operator
+import dataset_registry
+import instrumentation
+import growth_models
 import curses
 import curses_io
 import collections
+import os
 import sys
+import threading
 
 
+@instrumentation.timed
 def get_geographies(csv_dicts):
-    # Returns a list of Geography objects.
-    geographies = []
+    # Returns a GeographyTable that contains the name, FIPS code, and annual
+    # population estimates of each geography.
+    names = []
+    ids = []
+    population_estimates = []
     for csv_dict in csv_dicts:
-        population_estimates = [int(csv_dict[key]) for key in ANN_POP_EST_KEYS]
-        geo = geography.Geography(csv_dict[GEO_KEY], population_estimates)
-        geographies.append(geo)
+        names.append(csv_dict[GEO_KEY])
+        ids.append(csv_dict.get(GEO_ID_KEY, ''))
+        population_estimates.extend(
+            int(csv_dict[key]) for key in ANN_POP_EST_KEYS)
+
+    return geography.GeographyTable(names, population_estimates,
+                                    len(ANN_POP_EST_KEYS), ids=ids)
+
+
+@instrumentation.timed
+def read_geographies(csv_file):
+    # Returns a GeographyTable that contains the name, FIPS code, and annual
+    # population estimates of each geography in a CSV file, parsing only those
+    # columns of the CSV file.
+    import csv_dicts
+
+    (names, ids), population_estimates = csv_dicts.read_csv_columns(
+        csv_file, HEADER_ROW_NUM, [GEO_KEY, GEO_ID_KEY], ANN_POP_EST_KEYS)
+
+    return geography.GeographyTable(names, population_estimates,
+                                    len(ANN_POP_EST_KEYS), ids=ids)
+
+
+def get_merged_geographies(csv_file):
+    # Returns a GeographyTable of the years from FIRST_YEAR to LAST_YEAR built
+    # from the store of every vintage of a CSV file's division, or None if the
+    # CSV file is not named like a vintage or the store is missing a year.
+    import data_store
+
+    match = VINTAGE_CSV_PATTERN.match(os.path.basename(csv_file))
+    if match is None:
+        return None
+    store = data_store.load_division_store(
+        match.group(1), os.path.dirname(csv_file), CACHE_FOLDER)
+    years = list(range(FIRST_YEAR, LAST_YEAR + 1))
+    if not set(years).issubset(store.columns):
+        return None
+
+    return store.to_geography_table(years)
+
+
+@instrumentation.timed
+def index_geographies(geographies):
+    # Builds a GeographyTable's rank indexes for every type of estimate that
+    # does not depend on a year, so that switching between them and looking up
+    # the rank of a geography do not sort the table again. The table keeps the
+    # order that it had before.
+    order = geographies.order
+    sort_geographies_by_most_recent_pop(geographies)
+    sort_geographies_by_cagr(geographies)
+    geographies.order = order
+
+
+def get_sqlite_store():
+    # Returns the SQLite store of the 'sqlite' backend. When the store is
+    # opened, every CSV file that has not been loaded or has changed since it
+    # was loaded is bulk-loaded into it.
+    import sqlite_store
+
+    global SQLITE_STORE
+    with SQLITE_STORE_LOCK:
+        if SQLITE_STORE is None:
+            store = sqlite_store.SQLiteStore(SQLITE_DB_FILE)
+            store.load(POP_CSVS, load_cached_geographies)
+            SQLITE_STORE = store
+
+    return SQLITE_STORE
+
+
+@instrumentation.timed
+def load_geographies(csv_file):
+    # Returns a GeographyTable for a CSV file from the storage backend. The
+    # 'mmap' backend falls back to the cache files of this process when the
+    # shared cache file has not been published or is stale.
+    import geography_cache
+
+    if BACKEND == 'sqlite':
+        store = get_sqlite_store()
+        if csv_file not in POP_CSVS:
+            store.load([csv_file], load_cached_geographies)
+        return store.get_geographies(csv_file)
+    elif BACKEND == 'mmap':
+        geographies = geography_cache.map_geographies(csv_file, SHARED_FOLDER)
+        if geographies is not None:
+            return geographies
+
+    return load_cached_geographies(csv_file)
+
+
+def publish_geographies(csv_files, shared_folder):
+    # Writes the cache files of CSV files, with their rank indexes, to a shared
+    # folder for the 'mmap' backend and returns the paths of the cache files.
+    import geography_cache
+
+    cache_files = []
+    for csv_file in csv_files:
+        geographies = load_cached_geographies(csv_file)
+        index_geographies(geographies)
+        geography_cache.write_geographies(csv_file, shared_folder,
+                                          geographies)
+        cache_files.append(geography_cache.get_cache_file(csv_file,
+                                                          shared_folder))
+
+    return cache_files
+
+
+def load_cached_geographies(csv_file):
+    # Returns a GeographyTable for a CSV file, reading it from the CSV file's
+    # cache file when the cache is up to date and otherwise building it from the
+    # merged vintages of the CSV file's division, or reading the needed columns
+    # of the CSV file if it is not named like a vintage, and updating its cache
+    # file. The rank indexes of the table are cached along with it.
+    import geography_cache
+
+    geographies = geography_cache.read_geographies(csv_file, CACHE_FOLDER)
+    if geographies is None:
+        geographies = get_merged_geographies(csv_file)
+        if geographies is None:
+            geographies = read_geographies(csv_file)
+        index_geographies(geographies)
+        geography_cache.write_geographies(csv_file, CACHE_FOLDER, geographies)
 
     return geographies
 
 
+# SQLite store of the 'sqlite' backend, opened when it is first used.
+SQLITE_STORE = None
+SQLITE_STORE_LOCK = threading.Lock()
+
+# Keeps the GeographyTables of recently selected divisions, along with their
+# sort orders, in memory between passes through the menus.
+DATASETS = dataset_registry.DatasetRegistry(
+    load_geographies, max_entries=REGISTRY_MAX_ENTRIES,
+    max_bytes=REGISTRY_MAX_BYTES,
+    get_size=geography.GeographyTable.get_size)
+
+
+@instrumentation.timed
 def sort_geographies_by_most_recent_pop(geographies):
-    # Returns a list of Geography objects that are sorted by their most recent
-    # population estimate attributes in descending order.
-    geographies.sort(key=operator.attrgetter('most_recent_pop_est'),
-                     reverse=True)
+    # Sorts a GeographyTable by its most recent population estimates in
+    # descending order.
+    geographies.sort_by(geographies.most_recent_pop_ests, MOST_RECENT_POP)
 
 
+@instrumentation.timed
 def sort_geographies_by_cagr(geographies):
-    # Returns a list of Geography objects that are sorted by their compound
-    # annual growth rate attributes in descending order.
-    geographies.sort(key=operator.attrgetter('cagr'), reverse=True)
+    # Sorts a GeographyTable by its compound annual growth rates in descending
+    # order.
+    geographies.sort_by(geographies.cagrs, CAGR)
+
+
+@instrumentation.timed
+def sort_geographies_by_projected_pop(geographies, year,
+                                      model=DEFAULT_GROWTH_MODEL):
+    # Sorts a GeographyTable by its projected population estimates for a given
+    # future year, from a growth model, in descending order.
+    geographies.sort_by(*get_sort_keys_and_name(geographies, PROJECTED_POP,
+                                                 year, model))
+
+
+def get_growth_model(user_selections):
+    # Returns the name of the growth model that the user selected, or the
+    # default growth model.
+    return user_selections.get(GROWTH_MODEL) or DEFAULT_GROWTH_MODEL
+
+
+def get_projected_populations(geographies, year, model=DEFAULT_GROWTH_MODEL):
+    # Returns an array of every geography's projected population estimate for
+    # a future year from a growth model, which is fitted to the GeographyTable
+    # the first time that it is used.
+    return growth_models.get_fit(geographies, model).get_projected_populations(
+        year - LAST_YEAR)
+
+
+def get_sort_keys_and_name(geographies, sorted_by, year,
+                           model=DEFAULT_GROWTH_MODEL):
+    # Returns the column of a GeographyTable that the table is ranked by for a
+    # type of estimate, along with the name that the resulting order is stored
+    # under. The column is None when the order is already stored.
+    if sorted_by == MOST_RECENT_POP:
+        return geographies.most_recent_pop_ests, MOST_RECENT_POP
+    elif sorted_by == CAGR:
+        return geographies.cagrs, CAGR
+    elif sorted_by == PROJECTED_POP:
+        sort_name = (PROJECTED_POP, year, model)
+        if sort_name in geographies.sort_orders:
+            return None, sort_name
+        return get_projected_populations(geographies, year, model), sort_name
+
+
+def get_user_sort_keys_and_name(user_selections):
+    # Returns the sort keys and name of 'get_sort_keys_and_name' for the
+    # values of the 'user_selections' dict.
+    return get_sort_keys_and_name(
+        user_selections.get(GEOGRAPHIES), user_selections.get(SORTED_BY),
+        user_selections.get(YEAR), get_growth_model(user_selections))
+
+
+def sort_geographies(user_selections):
+    # Sorts a GeographyTable by the type of estimate that the user selected.
+    geographies = user_selections.get(GEOGRAPHIES)
+    if user_selections.get(SORTED_BY) == MOST_RECENT_POP:
+        sort_geographies_by_most_recent_pop(geographies)
+    elif user_selections.get(SORTED_BY) == CAGR:
+        sort_geographies_by_cagr(geographies)
+    elif user_selections.get(SORTED_BY) == PROJECTED_POP:
+        sort_geographies_by_projected_pop(geographies,
+                                          user_selections.get(YEAR),
+                                          get_growth_model(user_selections))
+
+
+@instrumentation.timed
+def get_ranked_geography_dicts(user_selections, start, stop):
+    # Returns a list of dictionaries for the geographies ranked from 'start' up
+    # to, but not including, 'stop' by the type of estimate that the user
+    # selected. Only the requested rows are selected and formatted, so the
+    # GeographyTable does not have to be fully sorted.
+    geographies = user_selections.get(GEOGRAPHIES)
+    sort_keys, sort_name = get_user_sort_keys_and_name(user_selections)
+    rows = geographies.get_ranked_rows(sort_keys, start, stop, sort_name)
+
+    return list(iter_geography_dicts(user_selections, rows))
+
+
+@instrumentation.timed
+def get_bottom_geography_dicts(user_selections, num_geographies):
+    # Returns a list of dictionaries for the 'num_geographies' geographies
+    # ranked last by the type of estimate that the user selected, starting
+    # with the last ranked geography.
+    geographies = user_selections.get(GEOGRAPHIES)
+    sort_keys, sort_name = get_user_sort_keys_and_name(user_selections)
+    rows = geographies.get_bottom_rows(sort_keys, num_geographies, sort_name)
+
+    return list(iter_geography_dicts(user_selections, rows))
+
+
+def get_geography_dict_keys(user_selections):
+    # Returns the keys of the dictionaries that are returned by
+    # 'iter_geography_dicts' for the values of the 'user_selections' dict.
+    keys = ['Geography Name']
+    sorted_by = user_selections.get(SORTED_BY)
+    if sorted_by in (MOST_RECENT_POP, PROJECTED_POP):
+        keys.append('%s Population Estimate' % (user_selections.get(YEAR)))
+    elif sorted_by == CAGR:
+        keys.append('Compound Annual Growth Rate Estimate (%s-%s)' % (
+                    FIRST_YEAR, LAST_YEAR))
+
+    return keys
+
+
+def iter_geography_dicts(user_selections, rows=None):
+    # Yields a dictionary for each geography in a GeographyTable, in the
+    # table's current order or the order of the given row indices, that
+    # contains the name of the geography along with a second value of the
+    # geography. The second value is determined by the values of the
+    # 'user_selections' dict. Each dictionary is built only when it is
+    # requested.
+    geographies = user_selections.get(GEOGRAPHIES)
+    if rows is None:
+        rows = geographies.order
+    sorted_by = user_selections.get(SORTED_BY)
+    keys = get_geography_dict_keys(user_selections)
+
+    if sorted_by == MOST_RECENT_POP:
+        values = geographies.most_recent_pop_ests
+    elif sorted_by == CAGR:
+        values = geographies.cagrs
+    elif sorted_by == PROJECTED_POP:
+        values = get_projected_populations(geographies,
+                                           user_selections.get(YEAR),
+                                           get_growth_model(user_selections))
+
+    for row in rows:
+        geo_dict = collections.OrderedDict()
+        geo_dict[keys[0]] = geographies.names[row]
 
+        if sorted_by == CAGR:
+            geo_dict[keys[1]] = '%s%%' % (round(values[row] * 100, 2))
+        elif sorted_by in (MOST_RECENT_POP, PROJECTED_POP):
+            geo_dict[keys[1]] = values[row]
+
+        yield geo_dict
 
-def sort_geographies_by_projected_pop(geographies, year):
-    # Returns a list of Geography objects that are sorted by their projected
-    # population estimate method return value for a given future year in
-    # descending order.
-    geographies.sort(key=operator.methodcaller(
-        'get_projected_population', LAST_YEAR, year), reverse=True)
 
+@instrumentation.timed
+def filter_geographies(user_selections, low=None, high=None, id_prefix=None):
+    # Returns a list of the rows of the geographies whose values of the type of
+    # estimate that the user selected are between 'low' and 'high', inclusive,
+    # and whose FIPS codes start with 'id_prefix', ranked by that type of
+    # estimate. Any of the bounds and the prefix may be None.
+    geographies = user_selections.get(GEOGRAPHIES)
+    sort_keys, sort_name = get_user_sort_keys_and_name(user_selections)
+    if sort_keys is None and sort_name not in geographies.range_keys:
+        sort_keys = get_projected_populations(
+            geographies, user_selections.get(YEAR),
+            get_growth_model(user_selections))
 
+    return geographies.filter_rows(sort_keys, low, high, id_prefix, sort_name)
+
+
+def find_state(search_term):
+    # Returns the FIPS code and the name of the state whose name or FIPS code
+    # best matches a search term, or None if no state matches.
+    states = DATASETS.get(STATE_POP_CSV)
+    rows = get_search_index(states).search(search_term, 1)
+    if not rows:
+        return None
+
+    return states.ids[rows[0]], states.names[rows[0]]
+
+
+def get_geography_rank(user_selections, row):
+    # Returns the rank, counted from 1, of the geography in a row by the type
+    # of estimate that the user selected.
+    geographies = user_selections.get(GEOGRAPHIES)
+    sort_keys, sort_name = get_user_sort_keys_and_name(user_selections)
+
+    return geographies.get_rank(row, sort_keys, sort_name)
+
+
+@instrumentation.timed
 def get_geography_dicts(user_selections):
-    # Returns a list of dictionaries that contain the name attribute along with
-    # a second attribute, or method return value, of each Geography object in a
-    # list. The second attribute, or method return value, is determined by the
-    # values of the 'user_selections' dict.
+    # Returns a list of the dictionaries yielded by 'iter_geography_dicts', or
+    # a list that contains only the dictionary of the geography in the
+    # 'user_selections' dict's search row, along with its rank, or named by its
+    # search geography.
+    row = user_selections.get(SEARCH_ROW)
+    if row is not None:
+        geo_dict = next(iter_geography_dicts(user_selections, [row]))
+        geo_dict['Rank'] = '#%s of %s' % (
+            '{:,}'.format(get_geography_rank(user_selections, row)),
+            '{:,}'.format(len(user_selections.get(GEOGRAPHIES))))
+        return [geo_dict]
+
     geo_dicts = []
-    for geography in user_selections.get(GEOGRAPHIES):
-        geo_dict = collections.OrderedDict()
-        geo_dict['Geography Name'] = geography.name
-
-        if user_selections.get(SORTED_BY) == MOST_RECENT_POP:
-            key = '%s Population Estimate' % (user_selections.get(YEAR))
-            geo_dict[key] = geography.most_recent_pop_est
-        elif user_selections.get(SORTED_BY) == CAGR:
-            key = 'Compound Annual Growth Rate Estimate (%s-%s)' % (FIRST_YEAR,
-                                                                    LAST_YEAR)
-            geo_dict[key] = '%s%%' % (round(geography.cagr * 100, 2))
-        elif user_selections.get(SORTED_BY) == PROJECTED_POP:
-            key = '%s Population Estimate' % (user_selections.get(YEAR))
-            geo_dict[key] = geography.get_projected_population(
-                LAST_YEAR, user_selections.get(YEAR))
-
-        if geography.name == user_selections.get(SEARCH_GEO):
+    for geo_dict in iter_geography_dicts(user_selections):
+        if geo_dict['Geography Name'] == user_selections.get(SEARCH_GEO):
             geo_dicts = [geo_dict]
             break
 
@@ -80,11 +378,13 @@ def get_geography_dicts(user_selections):
     return geo_dicts
 
 
-def get_projected_year_from_user(screen):
-    # Returns a future year provided by the user.
+def get_projected_year_from_user(screen, min_year=LAST_YEAR):
+    # Returns a future year greater than 'min_year', and no later than
+    # MAX_PROJECTED_YEAR, provided by the user.
     first_line_num = 0
     prompt_heading = ('Please enter a year below. The year must be greater ' +
-                      'than %s.' % (LAST_YEAR))
+                      'than %s and no later than %s.' % (min_year,
+                                                         MAX_PROJECTED_YEAR))
     prompt = 'Year:'
 
     while True:
@@ -94,7 +394,7 @@ def get_projected_year_from_user(screen):
             year = int(year)
         except ValueError:
             continue
-        if not (year > LAST_YEAR):
+        if not (min_year < year <= MAX_PROJECTED_YEAR):
             continue
         else:
             break
@@ -102,26 +402,158 @@ def get_projected_year_from_user(screen):
     return year
 
 
+def get_growth_model_from_user(screen):
+    # Returns the name of the growth model that the user selects to project
+    # the population estimates with.
+    first_line_num = 0
+    menu_heading = ('Please select a growth model to project the population ' +
+                    'estimates with from the menu below.')
+    menu_items = list(growth_models.MODEL_TITLES.values())
+    prompt = 'Selection:'
+
+    selection = curses_io.get_user_menu_selection(screen, first_line_num,
+                                                  menu_heading, menu_items,
+                                                  prompt)
+    for model, title in growth_models.MODEL_TITLES.items():
+        if title == selection:
+            return model
+
+
+def get_projection_dict_keys(projected_years):
+    # Returns the keys of the dictionaries that are returned by
+    # 'iter_projection_dicts' for a list of future years.
+    return ['Geography Name'] + ['%s Population Estimate' % (year)
+                                 for year in projected_years]
+
+
+def iter_projection_dicts(geographies, projected_years,
+                          model=DEFAULT_GROWTH_MODEL):
+    # Yields a dictionary for each geography in a GeographyTable, in the
+    # table's current order, that contains the name of the geography along with
+    # its projected population estimate from a growth model for each of a list
+    # of future years. Every projection is calculated up front in a single pass
+    # over the table.
+    keys = get_projection_dict_keys(projected_years)
+    matrix = growth_models.get_fit(
+        geographies, model).get_projected_population_matrix(
+            [year - LAST_YEAR for year in projected_years])
+    num_years = len(projected_years)
+
+    for row in geographies.order:
+        start = row * num_years
+        geo_dict = collections.OrderedDict()
+        geo_dict[keys[0]] = geographies.names[row]
+        for key, projected_pop in zip(keys[1:],
+                                      matrix[start:start + num_years]):
+            geo_dict[key] = projected_pop
+
+        yield geo_dict
+
+
+def get_bound_from_user(screen, user_selections, bound):
+    # Returns the lowest or highest value, depending on whether 'bound' is
+    # 'lowest' or 'highest', of the type of estimate that the user selected
+    # that the geographies are filtered by, or None if the user leaves it
+    # blank. Growth rates are entered as percentages.
+    first_line_num = 0
+    is_cagr = user_selections.get(SORTED_BY) == CAGR
+    prompt_heading = ('Please enter the %s %s to include below, or leave it ' +
+                      'blank for no limit.') % (
+        bound, 'growth rate, as a percentage,' if is_cagr else 'population')
+    prompt = '%s:' % (bound.capitalize())
+
+    while True:
+        value = curses_io.display_string_with_prompt(screen, first_line_num,
+                                                     prompt_heading, prompt)
+        value = value.strip().replace(',', '').rstrip('%')
+        if not value:
+            return None
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+
+        return value / 100 if is_cagr else value
+
+
+def get_state_from_user(screen):
+    # Returns the FIPS code and the name of the state that the user names, or
+    # None if the user leaves it blank.
+    first_line_num = 0
+    prompt_heading = ('Please enter the name or FIPS code of a state below, ' +
+                      'or leave it blank for every state.')
+    prompt = 'State:'
+
+    while True:
+        search_term = curses_io.display_string_with_prompt(screen,
+                                                           first_line_num,
+                                                           prompt_heading,
+                                                           prompt)
+        if not search_term.strip():
+            return None
+        state = find_state(search_term)
+        if state is not None:
+            return state
+
+
+def get_export_file_name_from_user(screen):
+    # Returns the name of an export file provided by the user.
+    first_line_num = 0
+    prompt_heading = 'Please enter a name for the export file below.'
+    prompt = 'File Name:'
+
+    file_name = ''
+    while file_name == '':
+        file_name = curses_io.display_string_with_prompt(screen,
+                                                         first_line_num,
+                                                         prompt_heading,
+                                                         prompt)
+
+    return file_name
+
+
+@instrumentation.timed
+def get_search_index(geographies):
+    # Returns the search index of a GeographyTable's names and FIPS codes,
+    # building it the first time that the table is searched.
+    import geography_search
+
+    if geographies.search_index is None:
+        geographies.search_index = geography_search.GeographySearchIndex(
+            geographies.names, geographies.ids)
+
+    return geographies.search_index
+
+
 def search_for_geography(screen, user_selections):
-    # Returns the name of the first geography in a list of geography names that
-    # contains all or part of the user-provided search term.
+    # Returns the row of the geography that the user selects from the
+    # geographies whose names or FIPS codes best match a user-provided search
+    # term. The search ignores case and accents and tolerates typos.
     first_line_num = 0
     prompt_heading = 'Please enter the name of a %s below.' % (
                      user_selections.get(GEO_DIVISION).lower())
     prompt = '%s:' % (user_selections.get(GEO_DIVISION))
-    geo_names = [
-        geography.name for geography in user_selections.get(GEOGRAPHIES)]
+    geographies = user_selections.get(GEOGRAPHIES)
+    search_index = get_search_index(geographies)
 
-    search_result = ''
-    while search_result not in geo_names:
+    while True:
         search_term = curses_io.display_string_with_prompt(screen,
                                                            first_line_num,
                                                            prompt_heading,
                                                            prompt)
-        search_result = next(
-            (name for name in geo_names if search_term in name), None)
-
-    return search_result
+        rows = search_index.search(search_term, SEARCH_RESULTS_LIMIT)
+        search_results = [geographies.names[row] for row in rows]
+        if len(search_results) == 1:
+            return rows[0]
+        elif search_results:
+            menu_heading = ('Please select a %s from the search results ' +
+                            'below.') % (
+                user_selections.get(GEO_DIVISION).lower())
+            selection = curses_io.get_user_menu_selection(
+                screen, first_line_num, menu_heading,
+                search_results + [SEARCH_AGAIN], 'Selection:')
+            if selection != SEARCH_AGAIN:
+                return rows[search_results.index(selection)]
 
 
 def display_geo_dicts_and_return_to_main_menu(screen, geo_dicts,
@@ -140,12 +572,89 @@ def display_geo_dicts_and_return_to_main_menu(screen, geo_dicts,
             screen, first_line_num, prompt_heading, geo_dicts, prompt)
 
 
-def display_export_success_and_return_to_main_menu(screen, file_name):
-    # Displays a message that indicates that a export file has been created
-    # until the user chooses to return to the Main Menu.
+def view_geographies_and_return_to_main_menu(screen, user_selections):
+    # Displays every geography, ranked by the type of estimate that the user
+    # selected, in a scrollable viewer until the user chooses to return to the
+    # Main Menu. The geographies are sorted once, and only the rows inside the
+    # viewer are formatted as it scrolls.
     first_line_num = 0
-    message = ('Success! %s.csv has been created in the following directory: %s'
-               % (file_name, EXPORT_FOLDER))
+    heading = '%s %s' % (user_selections.get(GEO_DIVISION),
+                         user_selections.get(SORTED_BY))
+    sort_geographies(user_selections)
+
+    def get_rows(start, stop):
+        return get_ranked_geography_dicts(user_selections, start, stop)
+
+    curses_io.view_rows(screen, first_line_num, heading,
+                        get_geography_dict_keys(user_selections),
+                        len(user_selections.get(GEOGRAPHIES)), get_rows)
+
+
+def filter_geographies_and_return_to_main_menu(screen, user_selections):
+    # Asks the user for a range of the type of estimate that they selected,
+    # and for a state when the geographies are counties, and then displays
+    # the geographies in the range in a scrollable viewer or exports them, until
+    # the user chooses to return to the Main Menu.
+    first_line_num = 0
+    low = get_bound_from_user(screen, user_selections, 'lowest')
+    high = get_bound_from_user(screen, user_selections, 'highest')
+    heading = '%s %s' % (user_selections.get(GEO_DIVISION),
+                         user_selections.get(SORTED_BY))
+    id_prefix = None
+    if user_selections.get(GEO_DIVISION) == COUNTY:
+        state = get_state_from_user(screen)
+        if state is not None:
+            id_prefix = state[0]
+            heading = '%s in %s' % (heading, state[1])
+    rows = filter_geographies(user_selections, low, high, id_prefix)
+
+    menu_heading = ('%s geographies match. Please select an option from the ' +
+                    'menu below.') % ('{:,}'.format(len(rows)))
+    selection = curses_io.get_user_menu_selection(
+        screen, first_line_num, menu_heading, [VIEW_FILTERED, EXPORT_FILTERED],
+        'Selection:')
+    if selection == VIEW_FILTERED:
+        def get_rows(start, stop):
+            return list(iter_geography_dicts(user_selections,
+                                             rows[start:stop]))
+
+        curses_io.view_rows(screen, first_line_num, heading,
+                            get_geography_dict_keys(user_selections),
+                            len(rows), get_rows)
+    elif selection == EXPORT_FILTERED:
+        file_name = get_export_file_name_from_user(screen)
+        export_stats = export_dicts(iter_geography_dicts(user_selections,
+                                                         rows),
+                                    file_name,
+                                    get_geography_dict_keys(user_selections))
+        display_export_success_and_return_to_main_menu(screen, export_stats)
+
+
+def export_dicts(dicts, file_name, header_column_names):
+    # Writes dictionaries to an export file in the export folder, in the export
+    # format and compression, and returns its ExportStats.
+    import export_writer
+
+    return export_writer.write_dicts(dicts,
+                                     '%s/%s' % (EXPORT_FOLDER, file_name),
+                                     header_column_names, EXPORT_FORMAT,
+                                     EXPORT_COMPRESSION)
+
+
+def display_export_success_and_return_to_main_menu(screen, export_stats):
+    # Displays a message that indicates that a export file has been created,
+    # and how quickly it was written, until the user chooses to return to the
+    # Main Menu.
+    import export_writer
+
+    first_line_num = 0
+    message = ('Success! %s has been created in the following directory: %s '
+               '(%s rows, %s bytes, %s)' % (
+                   os.path.basename(export_stats.path), EXPORT_FOLDER,
+                   '{:,}'.format(export_stats.num_rows),
+                   '{:,}'.format(export_stats.file_size),
+                   export_writer.format_rate(
+                       export_stats.get_bytes_per_second())))
     prompt = 'Enter "r" to return to the Main Menu:'
     return_keys = ['r', 'R']
 
@@ -175,11 +684,15 @@ def main_menu(screen):
 
 
 def geographical_divisions_menu(screen, user_selections):
-    # Adds a list of Geography objects to a dictionary that contains the user's
+    # Adds a GeographyTable to a dictionary that contains the user's
     # selections and returns the dictionary.
     first_line_num = 0
     menu_heading = ('Please select a geographical division from the menu ' +
                     'below.')
+    loaded, total = DATASETS.get_progress()
+    if loaded < total:
+        menu_heading += (' (Loading divisions in the background: %s of %s ' +
+                         'ready.)') % (loaded, total)
     menu_items = [NATION, REGION, DIVISION, STATE, COUNTY, METRO, MICRO]
     prompt = 'Selection:'
 
@@ -201,17 +714,16 @@ def geographical_divisions_menu(screen, user_selections):
     elif selection == MICRO:
         csv_file = MICRO_POP_CSV
 
-    user_selections[GEOGRAPHIES] = get_geographies(
-        csv_dicts.csv_rows_to_dicts(csv_file, HEADER_ROW_NUM))
+    user_selections[GEOGRAPHIES] = DATASETS.get(csv_file)
     user_selections[GEO_DIVISION] = selection
 
     return user_selections
 
 
 def population_estimates_menu(screen, user_selections):
-    # Sorts a list of Geography objects based on which attribute or method value
-    # that the user chooses to sort the objects by and returns a dictionary
-    # of user selections containing the sorted list of Geography objects.
+    # Adds the type of estimate that the user chooses to rank the geographies by
+    # to a dictionary that contains the user's selections and returns the
+    # dictionary. The geographies are ranked when their data is accessed.
     first_line_num = 0
     menu_heading = 'Please select a type of estimate from the menu below.'
     menu_items = [MOST_RECENT_POP, CAGR, PROJECTED_POP]
@@ -221,17 +733,14 @@ def population_estimates_menu(screen, user_selections):
                                                   menu_heading, menu_items,
                                                   prompt)
     if selection == MOST_RECENT_POP:
-        sort_geographies_by_most_recent_pop(user_selections.get(GEOGRAPHIES))
         user_selections[SORTED_BY] = selection
         user_selections[YEAR] = LAST_YEAR
     elif selection == CAGR:
-        sort_geographies_by_cagr(user_selections.get(GEOGRAPHIES))
         user_selections[SORTED_BY] = selection
         user_selections[YEAR] = LAST_YEAR
     elif selection == PROJECTED_POP:
         user_selections[YEAR] = get_projected_year_from_user(screen)
-        sort_geographies_by_projected_pop(user_selections.get(GEOGRAPHIES),
-                                          user_selections.get(YEAR))
+        user_selections[GROWTH_MODEL] = get_growth_model_from_user(screen)
         user_selections[SORTED_BY] = selection
 
     return user_selections
@@ -252,54 +761,88 @@ def access_data_menu(screen, user_selections):
     elif user_selections.get(GEO_DIVISION) == REGION:
         menu_items = ['View All', 'Export All to CSV']
     elif user_selections.get(GEO_DIVISION) == DIVISION:
-        menu_items = ['View Top 5 Divisions',
+        menu_items = ['View All Divisions',
                       'Export All Divisions to CSV', 'Search for a Division']
     elif user_selections.get(GEO_DIVISION) == STATE:
-        menu_items = ['View Top 5 States',
+        menu_items = ['View All States',
                       'Export All States to CSV', 'Search for a State']
     elif user_selections.get(GEO_DIVISION) == COUNTY:
-        menu_items = ['View Top 5 Counties',
+        menu_items = ['View All Counties',
                       'Export All Counties to CSV', 'Search for a County']
     elif user_selections.get(GEO_DIVISION) == METRO:
-        menu_items = ['View Top 5 Metropolitan Areas',
+        menu_items = ['View All Metropolitan Areas',
                       'Export All Metropolitan Areas to CSV',
                       'Search for a Metropolitan Area']
     elif user_selections.get(GEO_DIVISION) == MICRO:
-        menu_items = ['View Top 5 Micropolitan Areas',
+        menu_items = ['View All Micropolitan Areas',
                       'Export All Micropolitan Areas to CSV',
                       'Search for a Micropolitan Area']
 
+    menu_items.append(FILTER_GEOGRAPHIES)
+    menu_items.append(EXPORT_PROJECTIONS)
+    menu_items.append(EXPORT_PROJECTION_BANDS)
     prompt = 'Selection:'
 
     selection = curses_io.get_user_menu_selection(screen, first_line_num,
                                                   menu_heading, menu_items,
                                                   prompt)
 
-    if selection == menu_items[0]:
-        geo_dicts = get_geography_dicts(user_selections)
-        display_geo_dicts_and_return_to_main_menu(screen, geo_dicts[:5],
-                                                  user_selections)
+    if selection == FILTER_GEOGRAPHIES:
+        filter_geographies_and_return_to_main_menu(screen, user_selections)
+    elif selection == EXPORT_PROJECTIONS:
+        first_year = get_projected_year_from_user(screen)
+        last_year = get_projected_year_from_user(screen, first_year - 1)
+        projected_years = list(range(first_year, last_year + 1))
+        model = get_growth_model_from_user(screen)
+        sort_geographies(user_selections)
+        file_name = get_export_file_name_from_user(screen)
+        export_stats = export_dicts(
+            iter_projection_dicts(user_selections.get(GEOGRAPHIES),
+                                  projected_years, model),
+            file_name, get_projection_dict_keys(projected_years))
+        display_export_success_and_return_to_main_menu(screen, export_stats)
+    elif selection == EXPORT_PROJECTION_BANDS:
+        import simulation
+
+        first_year = get_projected_year_from_user(screen)
+        last_year = get_projected_year_from_user(screen, first_year - 1)
+        projected_years = list(range(first_year, last_year + 1))
+        sort_geographies(user_selections)
+        file_name = get_export_file_name_from_user(screen)
+        geographies = user_selections.get(GEOGRAPHIES)
+        bands = simulation.simulate_bands(geographies, LAST_YEAR,
+                                          projected_years)
+        export_stats = export_dicts(
+            simulation.iter_band_dicts(geographies, projected_years, bands),
+            file_name, simulation.get_band_dict_keys(projected_years))
+        display_export_success_and_return_to_main_menu(screen, export_stats)
+    elif selection == menu_items[0]:
+        view_geographies_and_return_to_main_menu(screen, user_selections)
     elif selection == menu_items[1]:
-        geo_dicts = get_geography_dicts(user_selections)
-        prompt_heading = 'Please enter a name for the CSV file below.'
-        prompt = 'File Name:'
-        file_name = ''
-        while file_name == '':
-            file_name = curses_io.display_string_with_prompt(screen,
-                                                             first_line_num,
-                                                             prompt_heading,
-                                                             prompt)
-        csv_dicts.dicts_to_csv(geo_dicts, '%s/%s' % (EXPORT_FOLDER, file_name))
-        display_export_success_and_return_to_main_menu(screen, file_name)
+        sort_geographies(user_selections)
+        file_name = get_export_file_name_from_user(screen)
+        export_stats = export_dicts(iter_geography_dicts(user_selections),
+                                    file_name,
+                                    get_geography_dict_keys(user_selections))
+        display_export_success_and_return_to_main_menu(screen, export_stats)
     elif selection == menu_items[2]:
-        user_selections[SEARCH_GEO] = search_for_geography(screen,
+        user_selections[SEARCH_ROW] = search_for_geography(screen,
                                                            user_selections)
         geo_dicts = get_geography_dicts(user_selections)
         display_geo_dicts_and_return_to_main_menu(screen, geo_dicts,
                                                   user_selections)
 
 
+def prefetch_datasets():
+    # Starts loading every division in the background, largest CSV file first,
+    # since the largest divisions take the longest to load. The menus get each
+    # division from DATASETS, which only waits if it is still loading.
+    return DATASETS.prefetch(sorted(POP_CSVS, key=os.path.getsize,
+                                    reverse=True))
+
+
 def main():
+    prefetch_datasets()
     screen = curses.initscr()
     try:
         while main_menu(screen):
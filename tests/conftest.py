@@ -0,0 +1,10 @@
+"""
+Configuration shared by the tests of the population_estimator, which import
+its modules the same way that they import each other.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'population_estimator'))
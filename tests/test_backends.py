@@ -0,0 +1,84 @@
+"""
+Tests that the 'cache', 'mmap', and 'sqlite' storage backends export and
+search the same geographies in the same order.
+"""
+
+import batch_export
+import pytest
+import tui_app
+
+# Command line names of the divisions, types of estimates, and filters of the
+# compared exports.
+EXPORTS = [
+    ('state', 'most-recent-pop', {}),
+    ('state', 'cagr', {}),
+    ('state', 'projected-pop', {'model': 'log-linear'}),
+    ('county', 'most-recent-pop', {'low': 50000, 'high': 250000,
+                                   'id_prefix': '48'}),
+    ('county', 'cagr', {'low': 0.01}),
+    ('county', 'projected-pop', {}),
+    ('metro', 'cagr', {'high': 0})]
+
+SEARCH_TERMS = ['a', 'wash', 'county, ohio', 'san', '06', '06037', 'Berca',
+                'New Yrok']
+
+
+def use_backend(monkeypatch, tmp_path, backend):
+    # Points a backend's files at a temporary folder and forgets the tables
+    # of the previous backend.
+    cache_folder = str(tmp_path / 'cache')
+    monkeypatch.setattr(tui_app, 'BACKEND', backend)
+    monkeypatch.setattr(tui_app, 'CACHE_FOLDER', cache_folder)
+    monkeypatch.setattr(tui_app, 'SHARED_FOLDER', str(tmp_path / 'shared'))
+    monkeypatch.setattr(tui_app, 'SQLITE_DB_FILE',
+                        str(tmp_path / 'population_estimates.sqlite'))
+    monkeypatch.setattr(tui_app, 'SQLITE_STORE', None)
+    tui_app.DATASETS.clear()
+    if backend == 'mmap':
+        tui_app.publish_geographies(
+            [csv_file for _, csv_file in batch_export.DIVISIONS.values()],
+            tui_app.SHARED_FOLDER)
+
+
+def export_and_search(monkeypatch, tmp_path, backend):
+    # Returns the contents of the compared exports and the search results of
+    # the search terms in every division with a backend.
+    use_backend(monkeypatch, tmp_path, backend)
+    exports = []
+    for index, (division, sort, filters) in enumerate(EXPORTS):
+        export_stats = batch_export.export_division(
+            division, sort, 2030, str(tmp_path / ('export_%s' % (index))),
+            **filters)
+        with open(export_stats.path) as export_file:
+            exports.append(export_file.read())
+
+    searches = []
+    for _, csv_file in batch_export.DIVISIONS.values():
+        geographies = tui_app.DATASETS.get(csv_file)
+        search_index = tui_app.get_search_index(geographies)
+        searches.append([
+            [geographies.names[row] for row in search_index.search(term)]
+            for term in SEARCH_TERMS])
+
+    return exports, searches
+
+
+@pytest.fixture
+def cache_results(tmp_path_factory):
+    monkeypatch = pytest.MonkeyPatch()
+    try:
+        yield export_and_search(monkeypatch,
+                                tmp_path_factory.mktemp('cache'), 'cache')
+    finally:
+        tui_app.DATASETS.clear()
+        monkeypatch.undo()
+
+
+@pytest.mark.parametrize('backend', ['mmap', 'sqlite'])
+def test_backends_match_cache(monkeypatch, tmp_path, cache_results, backend):
+    exports, searches = export_and_search(monkeypatch, tmp_path, backend)
+    tui_app.DATASETS.clear()
+
+    assert all(exports)
+    assert exports == cache_results[0]
+    assert searches == cache_results[1]
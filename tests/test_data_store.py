@@ -0,0 +1,100 @@
+"""
+Tests that merging a new vintage into a saved division store gives the same
+store as building it from every vintage, and that unreadable saved stores are
+rebuilt.
+"""
+
+import csv
+import os
+import pickle
+
+import data_store
+import pytest
+from constants import CSV_PATH
+
+STATE_CSV = os.path.join(CSV_PATH, 'state_PEP_2018_PEPANNRES_with_ann.csv')
+
+# Number of the header rows of the CSV files.
+NUM_HEADER_ROWS = 2
+
+
+def read_state_csv():
+    with open(STATE_CSV, newline='', encoding='latin-1') as input_file:
+        return list(csv.reader(input_file))
+
+
+def write_vintage(folder, year, rows):
+    path = os.path.join(folder, 'state_PEP_%s_PEPANNRES_with_ann.csv' % (year))
+    with open(path, 'w', newline='', encoding='latin-1') as output_file:
+        csv.writer(output_file).writerows(rows)
+    return path
+
+
+def write_old_vintage(folder):
+    # Writes a 2017 vintage without the last year or the last state.
+    write_vintage(folder, 2017, [row[:-1] for row in read_state_csv()[:-1]])
+
+
+def write_new_vintage(folder):
+    # Writes the 2018 vintage with a renamed first state.
+    rows = read_state_csv()
+    rows[NUM_HEADER_ROWS][2] = 'Renamed ' + rows[NUM_HEADER_ROWS][2]
+    write_vintage(folder, 2018, rows)
+
+
+def get_contents(store):
+    return (store.keys, store.names, store.ids, store.years,
+            {year: list(column) for year, column in store.columns.items()},
+            list(store.cagrs))
+
+
+def test_merged_vintage_equals_full_rebuild(tmp_path, monkeypatch):
+    csv_folder = str(tmp_path / 'csv')
+    os.makedirs(csv_folder)
+    write_old_vintage(csv_folder)
+    merged_cache = str(tmp_path / 'merged')
+    old_store = data_store.load_division_store('state', csv_folder,
+                                               merged_cache)
+    assert old_store.years[-1] == 2017
+
+    write_new_vintage(csv_folder)
+    merged_years = []
+    merge_vintage = data_store.DivisionStore.merge_vintage
+    monkeypatch.setattr(
+        data_store.DivisionStore, 'merge_vintage',
+        lambda store, year, path: merged_years.append(year) or merge_vintage(
+            store, year, path))
+    merged_store = data_store.load_division_store('state', csv_folder,
+                                                  merged_cache)
+    assert merged_years == [2018]
+    rebuilt_store = data_store.load_division_store('state', csv_folder,
+                                                   str(tmp_path / 'rebuilt'))
+
+    assert merged_store.years[-1] == 2018
+    assert merged_store.names[0].startswith('Renamed ')
+    assert len(merged_store) == len(old_store) + 1
+    assert get_contents(merged_store) == get_contents(rebuilt_store)
+    assert (merged_store.to_geography_table().names ==
+            rebuilt_store.to_geography_table().names)
+
+
+@pytest.mark.parametrize('contents', [
+    b'', b'not a pickle',
+    pickle.dumps(data_store.DivisionStore('state'))[:-5],
+    b'cmissing_module\nDivisionStore\n.', b'cdata_store\nMissingStore\n.'])
+def test_unreadable_store_is_rebuilt(tmp_path, contents):
+    csv_folder = str(tmp_path / 'csv')
+    os.makedirs(csv_folder)
+    write_old_vintage(csv_folder)
+    write_new_vintage(csv_folder)
+    cache_folder = str(tmp_path / 'cache')
+    os.makedirs(cache_folder)
+    store_file = data_store.get_store_file('state', cache_folder)
+    with open(store_file, 'wb') as output_file:
+        output_file.write(contents)
+
+    assert data_store.read_store(store_file) is None
+    store = data_store.load_division_store('state', csv_folder, cache_folder)
+
+    assert store.years[-1] == 2018
+    assert data_store.read_store(store_file) is not None
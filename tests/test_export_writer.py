@@ -0,0 +1,106 @@
+"""
+Tests that exports are written completely or not at all, and that compressed
+and JSON Lines exports hold the same rows as plain CSV exports.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+
+import export_writer
+import pytest
+
+KEYS = ['Id', 'Geography Name', 'Population']
+
+
+def get_dicts(num_rows):
+    return [{'Id': str(row), 'Geography Name': 'Place, "%s"' % (row),
+             'Population': row * 1000} for row in range(num_rows)]
+
+
+def read_csv(data):
+    return list(csv.DictReader(io.StringIO(data.decode('utf-8'))))
+
+
+def test_csv_export(tmp_path):
+    dicts = get_dicts(5000)
+    export_stats = export_writer.write_dicts(dicts, str(tmp_path / 'out'))
+
+    assert export_stats.path == str(tmp_path / 'out.csv')
+    assert export_stats.num_rows == 5000
+    with open(export_stats.path, 'rb') as input_file:
+        data = input_file.read()
+    assert export_stats.num_bytes == export_stats.file_size == len(data)
+    assert read_csv(data) == [
+        dict((key, str(value)) for key, value in row.items())
+        for row in dicts]
+    assert os.listdir(str(tmp_path)) == ['out.csv']
+
+
+@pytest.mark.parametrize('compression',
+                         sorted(export_writer.COMPRESSIONS))
+def test_compressed_export(tmp_path, compression):
+    dicts = get_dicts(5000)
+    plain_stats = export_writer.write_dicts(dicts, str(tmp_path / 'plain'))
+    export_stats = export_writer.write_dicts(
+        dicts, str(tmp_path / 'out'), compression=compression)
+
+    assert export_stats.path.endswith(
+        '.csv' + export_writer.COMPRESSIONS[compression])
+    assert export_stats.num_bytes == plain_stats.num_bytes
+    assert export_stats.file_size < export_stats.num_bytes
+    if compression == 'gzip':
+        with gzip.open(export_stats.path) as input_file:
+            data = input_file.read()
+    else:
+        with export_writer.zstd.open(export_stats.path) as input_file:
+            data = input_file.read()
+    with open(plain_stats.path, 'rb') as input_file:
+        assert data == input_file.read()
+
+
+def test_jsonl_export_keeps_column_order(tmp_path):
+    dicts = get_dicts(3)
+    dicts[1]['Extra'] = 'left out'
+    del dicts[2]['Population']
+    export_stats = export_writer.write_dicts(dicts, str(tmp_path / 'out'),
+                                             KEYS, 'jsonl')
+
+    with open(export_stats.path, encoding='utf-8') as input_file:
+        lines = input_file.read().splitlines()
+    assert [list(json.loads(line)) for line in lines] == [KEYS] * 3
+    assert json.loads(lines[2])['Population'] == ''
+
+
+def test_empty_export(tmp_path):
+    export_stats = export_writer.write_dicts(iter([]), str(tmp_path / 'out'))
+
+    assert export_stats.num_rows == 0
+    assert os.path.getsize(export_stats.path) == export_stats.file_size
+
+
+def test_failed_export_keeps_earlier_export(tmp_path):
+    file_name = str(tmp_path / 'out')
+    export_writer.write_dicts(get_dicts(10), file_name)
+    with open(file_name + '.csv', 'rb') as input_file:
+        earlier_data = input_file.read()
+
+    def iter_dicts():
+        yield from get_dicts(50000)
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        export_writer.write_dicts(iter_dicts(), file_name)
+
+    with open(file_name + '.csv', 'rb') as input_file:
+        assert input_file.read() == earlier_data
+    assert os.listdir(str(tmp_path)) == ['out.csv']
+
+
+def test_unsupported_compression(tmp_path):
+    with pytest.raises(KeyError):
+        export_writer.write_dicts(get_dicts(1), str(tmp_path / 'out'),
+                                  compression='lzma')
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,103 @@
+"""
+Tests of how a GeographyTable ranks its rows, breaks ties, and finds the rows
+in a range of sort keys or with an ID prefix.
+"""
+
+import geography
+import pytest
+
+NAMES = ['A', 'B', 'C', 'D', 'E', 'F']
+IDS = ['01001', '01003', '02010', '02020', '10001', '01005']
+MOST_RECENT_POP_ESTS = [500, 900, 500, 100, 900, 300]
+
+
+@pytest.fixture
+def geographies():
+    pop_ests = []
+    for pop in MOST_RECENT_POP_ESTS:
+        pop_ests.extend([100, pop])
+    return geography.GeographyTable(list(NAMES), pop_ests, 2, ids=list(IDS))
+
+
+def get_names(geographies, rows):
+    return [geographies.names[row] for row in rows]
+
+
+def test_sort_by_keeps_csv_order_of_ties(geographies):
+    geographies.sort_by(geographies.most_recent_pop_ests, 'pop')
+
+    assert get_names(geographies, geographies.order) == [
+        'B', 'E', 'A', 'C', 'F', 'D']
+    assert [geographies.get_rank(row, None, 'pop')
+            for row in range(len(geographies))] == [3, 1, 4, 6, 2, 5]
+
+
+def test_ranked_and_bottom_rows_match_full_sort(geographies):
+    keys = geographies.most_recent_pop_ests
+    expected = sorted(range(len(geographies)), key=keys.__getitem__,
+                      reverse=True)
+
+    for start, stop in [(0, 3), (2, 5), (4, 100), (6, 7)]:
+        assert geographies.get_ranked_rows(keys, start, stop) == (
+            expected[start:stop])
+    for num_rows in range(len(geographies) + 2):
+        assert geographies.get_bottom_rows(keys, num_rows) == (
+            expected[::-1][:num_rows])
+
+    geographies.sort_by(keys, 'pop')
+    assert list(geographies.get_ranked_rows(keys, 2, 5, 'pop')) == (
+        expected[2:5])
+    assert list(geographies.get_bottom_rows(keys, 3, 'pop')) == (
+        expected[::-1][:3])
+
+
+@pytest.mark.parametrize('low, high, names', [
+    (None, None, ['B', 'E', 'A', 'C', 'F', 'D']),
+    (500, 900, ['B', 'E', 'A', 'C']),
+    (500, 500, ['A', 'C']),
+    (501, 899, []),
+    (None, 300, ['F', 'D']),
+    (900, None, ['B', 'E']),
+    (901, None, []),
+    (None, 99, []),
+    (600, 400, [])])
+def test_rows_in_range_include_both_bounds(geographies, low, high, names):
+    rows = geographies.get_rows_in_range(geographies.most_recent_pop_ests,
+                                         low, high, 'pop')
+
+    assert get_names(geographies, rows) == names
+
+
+def test_rows_in_range_of_growth_rates(geographies):
+    # F grows from 100 to 300, exactly at the lower bound.
+    rows = geographies.get_rows_in_range(geographies.cagrs, 2.0, None, 'cagr')
+
+    assert get_names(geographies, rows) == ['B', 'E', 'A', 'C', 'F']
+
+
+@pytest.mark.parametrize('prefix, names', [
+    ('01', ['A', 'B', 'F']),
+    ('02', ['C', 'D']),
+    ('0', ['A', 'B', 'C', 'D', 'F']),
+    ('020', ['C', 'D']),
+    ('01003', ['B']),
+    ('99', []),
+    ('', NAMES)])
+def test_rows_with_id_prefix_keep_csv_order(geographies, prefix, names):
+    assert get_names(geographies,
+                     geographies.get_rows_with_id_prefix(prefix)) == names
+
+
+def test_filter_rows_combines_range_and_prefix(geographies):
+    rows = geographies.filter_rows(geographies.most_recent_pop_ests, 300,
+                                   None, '01', 'pop')
+
+    assert get_names(geographies, rows) == ['B', 'A', 'F']
+
+
+def test_find_row_returns_first_match(geographies):
+    geographies.names[4] = 'A'
+
+    assert geographies.find_row('names', 'A') == 0
+    assert geographies.find_row('ids', '02020') == 3
+    assert geographies.find_row('ids', '99') is None
@@ -0,0 +1,109 @@
+"""
+Tests that GeographyTables round-trip through cache files, both read and
+memory-mapped, and that cache files are ignored once they are stale or
+unreadable.
+"""
+
+import os
+
+import geography
+import geography_cache
+import pytest
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = str(tmp_path / 'state.csv')
+    with open(path, 'w') as output_file:
+        output_file.write('GEO.id,GEO.id2\n')
+    return path
+
+
+def get_geographies():
+    geographies = geography.GeographyTable(
+        ['Texas', 'Ohio', 'Dona Ana County, New Mexico'],
+        [100, 150, 300, 310, 50, 40], 2, ids=['48', '39', '35013'])
+    geographies.sort_by(geographies.most_recent_pop_ests, 'pop')
+    geographies.sort_by(geographies.cagrs, 'cagr')
+    geographies.sort_by(geographies.first_pop_ests)
+    return geographies
+
+
+def assert_same_tables(actual, expected):
+    assert actual.names == expected.names
+    assert actual.ids == expected.ids
+    assert actual.num_years == expected.num_years
+    assert list(actual.pop_ests) == list(expected.pop_ests)
+    assert list(actual.cagrs) == list(expected.cagrs)
+    assert set(actual.sort_orders) == {'pop', 'cagr'}
+    for sort_name in actual.sort_orders:
+        assert (list(actual.sort_orders[sort_name]) ==
+                list(expected.sort_orders[sort_name]))
+        assert list(actual.ranks[sort_name]) == list(
+            expected.ranks[sort_name])
+
+
+@pytest.mark.parametrize('read', [geography_cache.read_geographies,
+                                  geography_cache.map_geographies])
+def test_round_trip(tmp_path, csv_file, read):
+    cache_folder = str(tmp_path / 'cache')
+    expected = get_geographies()
+    geography_cache.write_geographies(csv_file, cache_folder, expected)
+
+    actual = read(csv_file, cache_folder)
+
+    assert_same_tables(actual, expected)
+    assert actual.get_rows_in_range(actual.most_recent_pop_ests, 100, None,
+                                    'pop') == expected.sort_orders['pop'][:2]
+
+
+@pytest.mark.parametrize('read', [geography_cache.read_geographies,
+                                  geography_cache.map_geographies])
+def test_changed_csv_file_invalidates_cache(tmp_path, csv_file, read):
+    cache_folder = str(tmp_path / 'cache')
+    geography_cache.write_geographies(csv_file, cache_folder,
+                                      get_geographies())
+
+    with open(csv_file, 'a') as output_file:
+        output_file.write('0400000US48,48\n')
+
+    assert read(csv_file, cache_folder) is None
+
+
+@pytest.mark.parametrize('contents', [b'', b'PEPCACHE', b'x' * 200])
+@pytest.mark.parametrize('read', [geography_cache.read_geographies,
+                                  geography_cache.map_geographies])
+def test_unreadable_cache_is_ignored(tmp_path, csv_file, read, contents):
+    cache_folder = str(tmp_path / 'cache')
+    os.makedirs(cache_folder)
+    with open(geography_cache.get_cache_file(csv_file, cache_folder),
+              'wb') as output_file:
+        output_file.write(contents)
+
+    assert read(csv_file, cache_folder) is None
+
+
+def test_missing_cache_is_ignored(tmp_path, csv_file):
+    assert geography_cache.read_geographies(csv_file,
+                                            str(tmp_path / 'cache')) is None
+
+
+def test_csv_files_with_the_same_name_have_their_own_caches(tmp_path):
+    cache_folder = str(tmp_path / 'cache')
+    csv_files = []
+    for folder in ['2018', '2019']:
+        os.makedirs(str(tmp_path / folder))
+        csv_files.append(str(tmp_path / folder / 'state.csv'))
+        with open(csv_files[-1], 'w') as output_file:
+            output_file.write('GEO.id,GEO.id2\n')
+    tables = [get_geographies(), get_geographies()]
+    tables[1].names[0] = 'Texas, 2019'
+    for csv_file, geographies in zip(csv_files, tables):
+        geography_cache.write_geographies(csv_file, cache_folder, geographies)
+
+    assert len(set(geography_cache.get_cache_file(csv_file, cache_folder)
+                   for csv_file in csv_files)) == 2
+    for csv_file, geographies in zip(csv_files, tables):
+        assert_same_tables(
+            geography_cache.read_geographies(csv_file, cache_folder),
+            geographies)
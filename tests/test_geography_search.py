@@ -0,0 +1,69 @@
+"""
+Tests that the search index ranks exact, prefix, word prefix, substring, and
+fuzzy matches in order, and that short search terms answered from its prefix
+indexes rank their matches the same way as longer ones.
+"""
+
+import geography_search
+
+NAMES = ['Los Angeles County, California', 'Alameda County, California',
+         'Alabama', 'Alamosa County, Colorado', 'Dallas County, Texas',
+         'Salem city, Oregon', 'Doña Ana County, New Mexico', 'Alabama']
+IDS = ['06037', '06001', '01', '08003', '48113', '4164900', '35013', '01']
+
+
+def get_names(index, search_term, limit=10):
+    return [NAMES[row] for row in index.search(search_term, limit)]
+
+
+def test_matches_are_ranked_by_kind_and_then_by_length():
+    index = geography_search.GeographySearchIndex(NAMES, IDS)
+
+    assert get_names(index, 'ala') == [
+        'Alabama', 'Alabama', 'Alamosa County, Colorado',
+        'Alameda County, California']
+    assert get_names(index, 'county', 3) == [
+        'Dallas County, Texas', 'Alamosa County, Colorado',
+        'Alameda County, California']
+    assert get_names(index, 'alem', 2) == ['Salem city, Oregon']
+    assert get_names(index, 'Dona') == ['Doña Ana County, New Mexico']
+    assert get_names(index, 'dallsa county')[0] == 'Dallas County, Texas'
+
+
+def test_ids_match_exactly_or_as_prefixes():
+    index = geography_search.GeographySearchIndex(NAMES, IDS)
+
+    assert index.search('06037', 1) == [0]
+    assert get_names(index, '060') == ['Alameda County, California',
+                                       'Los Angeles County, California']
+
+
+def test_search_stops_once_enough_better_matches_are_found(monkeypatch):
+    index = geography_search.GeographySearchIndex(NAMES, IDS)
+
+    def fail(*args):
+        raise AssertionError('substring matches were searched')
+
+    monkeypatch.setattr(index, 'find_substring', fail)
+    monkeypatch.setattr(index, 'find_fuzzy', fail)
+
+    assert len(index.search('a', 3)) == 3
+
+
+def test_indexed_prefixes_match_scanned_prefixes(monkeypatch):
+    names = ['%s %s' % (first, second) for first in ['ab', 'abc', 'b', 'ba']
+             for second in ['x', 'xy', 'xyz', 'ab']]
+    index = geography_search.GeographySearchIndex(names)
+    indexed = dict((term, index.search(term, 5))
+                   for term in ['a', 'ab', 'b', 'x', 'xy'])
+
+    monkeypatch.setattr(geography_search, 'MAX_INDEXED_PREFIX_LENGTH', 0)
+    for term, rows in indexed.items():
+        assert index.search(term, 5) == rows
+
+
+def test_empty_search_terms_match_nothing():
+    index = geography_search.GeographySearchIndex(NAMES, IDS)
+
+    assert index.search('  ', 5) == []
+    assert index.search('ala', 0) == []
@@ -0,0 +1,83 @@
+"""
+Tests that each growth model recovers the trend of estimates that follow it
+exactly, and that projections too large to be stored raise a
+ProjectionError.
+"""
+
+import geography
+import growth_models
+import pytest
+
+
+def get_table(rows):
+    return geography.GeographyTable(
+        [str(row) for row in range(len(rows))],
+        [pop for pop_ests in rows for pop in pop_ests], len(rows[0]))
+
+
+def test_endpoint_cagr_projects_from_most_recent_estimate():
+    geographies = get_table([[1000, 5000, 1210], [400, 300, 100]])
+    fit = growth_models.get_fit(geographies, growth_models.ENDPOINT_CAGR)
+
+    assert list(fit.get_projected_populations(0)) == [1210, 100]
+    assert list(fit.get_projected_populations(2)) == [1464, 25]
+
+
+def test_log_linear_fits_exponential_growth():
+    geographies = get_table([[1000, 1100, 1210, 1331],
+                             [8000, 4000, 2000, 1000],
+                             [500, 0, 500, 600]])
+    fit = growth_models.get_fit(geographies, growth_models.LOG_LINEAR)
+
+    assert fit.rates[0] == pytest.approx(0.1)
+    assert fit.bases[0] == pytest.approx(1331)
+    assert fit.rates[1] == pytest.approx(-0.5)
+    assert list(fit.get_row_projected_populations(0, [0, 1, 2])) == [
+        1331, 1464, 1611]
+    # Geographies with an estimate that is not positive do not grow.
+    assert fit.rates[2] == 0.0
+    assert list(fit.get_row_projected_populations(2, [10])) == [600]
+
+
+def test_linear_fits_straight_lines_and_stops_at_zero():
+    geographies = get_table([[100, 110, 120, 130], [300, 200, 100, 0]])
+    fit = growth_models.get_fit(geographies, growth_models.LINEAR)
+
+    assert list(fit.rates) == pytest.approx([10, -100])
+    assert list(fit.bases) == pytest.approx([130, 0])
+    assert list(fit.get_projected_population_matrix([1, 5])) == [
+        140, 180, 0, 0]
+
+
+def test_least_squares_fit_of_noisy_estimates():
+    geographies = get_table([[10, 30, 20, 40]])
+    fit = growth_models.get_fit(geographies, growth_models.LINEAR)
+
+    # The least squares line of the estimates is 13 + 8 * year.
+    assert fit.rates[0] == pytest.approx(8)
+    assert fit.bases[0] == pytest.approx(37)
+
+
+def test_fits_are_kept_with_the_table():
+    geographies = get_table([[100, 200]])
+    fit = growth_models.get_fit(geographies, growth_models.LOG_LINEAR)
+
+    assert growth_models.get_fit(geographies, growth_models.LOG_LINEAR) is fit
+    assert set(geographies.growth_fits) == {growth_models.LOG_LINEAR}
+    with pytest.raises(KeyError):
+        growth_models.get_fit(geographies, 'quadratic')
+
+
+@pytest.mark.parametrize('model', list(growth_models.MODELS))
+def test_single_year_does_not_grow(model):
+    geographies = get_table([[1234], [5]])
+    fit = growth_models.get_fit(geographies, model)
+
+    assert list(fit.get_projected_populations(30)) == [1234, 5]
+
+
+@pytest.mark.parametrize('base, rate, num_years', [
+    (10**9, 1.0, 40), (2**62, 1.0, 1), (1.0, 10.0**10, 1000)])
+def test_projection_too_large_to_store(base, rate, num_years):
+    with pytest.raises(growth_models.ProjectionError):
+        growth_models.project(base, rate, num_years)
@@ -0,0 +1,91 @@
+"""
+Tests that timing sessions record the spans of the CSV readers and of the
+worker processes of a simulation, that the spans of generators are recorded
+once per call, and how percentiles are calculated.
+"""
+
+import collections
+import json
+import os
+import subprocess
+import sys
+
+import instrumentation
+import pytest
+
+POPULATION_ESTIMATOR = os.path.dirname(os.path.abspath(
+    instrumentation.__file__))
+
+CODE = '''
+import csv_dicts, itertools
+from constants import *
+csv_dicts.read_csv_columns(STATE_POP_CSV, HEADER_ROW_NUM, [GEO_KEY],
+                           ANN_POP_EST_KEYS)
+for row in csv_dicts.iter_csv_rows_to_dicts(STATE_POP_CSV, HEADER_ROW_NUM):
+    pass
+rows = csv_dicts.iter_csv_rows_to_dicts(STATE_POP_CSV, HEADER_ROW_NUM)
+list(itertools.islice(rows, 3))
+rows.close()
+'''
+
+
+SIMULATION_CODE = '''
+import simulation, sys, tui_app
+from constants import *
+tui_app.CACHE_FOLDER = sys.argv[1]
+simulation.SHARD_ROWS = 10
+simulation.simulate_bands(tui_app.load_cached_geographies(STATE_POP_CSV),
+                          LAST_YEAR, [LAST_YEAR + 1], num_draws=11,
+                          max_workers=2)
+'''
+
+
+def get_spans(tmp_path, code):
+    # Returns the spans of a timing session of a Python script, which is given
+    # a temporary cache folder as its argument.
+    timing_file = str(tmp_path / 'timings.jsonl')
+    environment = dict(os.environ)
+    environment[instrumentation.TIMING_ENV_VAR] = timing_file
+    subprocess.run([sys.executable, '-c', code, str(tmp_path / 'cache')],
+                   cwd=POPULATION_ESTIMATOR, env=environment, check=True)
+
+    with open(timing_file) as input_file:
+        return json.loads(input_file.read())['spans']
+
+
+def test_csv_readers_are_timed(tmp_path):
+    spans = get_spans(tmp_path, CODE)
+
+    assert spans['csv_dicts.read_csv_columns']['count'] == 1
+    assert spans['csv_dicts.iter_csv_rows_to_dicts']['count'] == 2
+
+
+def test_timed_generator_records_time_inside_the_generator(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'ENABLED', True)
+    monkeypatch.setattr(instrumentation, 'durations',
+                        collections.defaultdict(list))
+
+    def values():
+        yield 1
+        yield 2
+
+    values.__module__ = 'test'
+    timed_values = instrumentation.timed(values)
+
+    assert list(timed_values()) == [1, 2]
+    assert len(instrumentation.durations['test.values']) == 1
+
+
+def test_spans_of_worker_processes_are_merged(tmp_path):
+    spans = get_spans(tmp_path, SIMULATION_CODE)
+
+    # The 52 states are simulated in 6 shards.
+    assert spans['simulation.simulate_bands']['count'] == 1
+    assert spans['simulation.simulate_shard']['count'] == 6
+
+
+@pytest.mark.parametrize('percentile, value', [
+    (0, 10), (25, 15), (50, 15), (60, 17), (95, 36), (100, 40)])
+def test_percentiles_are_interpolated(percentile, value):
+    assert instrumentation.get_percentile([10, 15, 15, 20, 40],
+                                          percentile) == pytest.approx(value)
@@ -0,0 +1,105 @@
+"""
+Tests of the responses of the query server, including the 400, 404, and 405
+responses to requests that cannot be answered.
+"""
+
+import asyncio
+
+import geography
+import pytest
+import query_server
+from constants import LAST_YEAR
+
+
+@pytest.fixture
+def datasets():
+    states = geography.GeographyTable(
+        ['Texas', 'Ohio', 'Maine'], [100, 121, 300, 300, 50, 40], 2,
+        ids=['48', '39', '23'])
+    return {'state': states}
+
+
+def get(datasets, target):
+    return query_server.handle_request(datasets, 'GET', target)
+
+
+def test_top(datasets):
+    status, body = get(datasets, '/top?division=state&k=2')
+
+    assert status == 200
+    assert [result['Geography Name'] for result in body['results']] == [
+        'Ohio', 'Texas']
+
+
+def test_projection_by_id_and_name(datasets):
+    target = '/projection?division=state&%%s&last_year=%s' % (LAST_YEAR + 2)
+    by_id = get(datasets, target % ('id=48'))
+    by_name = get(datasets, target % ('name=Texas'))
+
+    assert by_id == by_name
+    status, body = by_id
+    assert status == 200
+    assert (body['name'], body['id']) == ('Texas', '48')
+    # Texas grows by 21% a year from 121.
+    assert [(projection['year'], projection['population'])
+            for projection in body['projections']] == [
+        (LAST_YEAR + 1, 146), (LAST_YEAR + 2, 177)]
+
+
+def test_search(datasets):
+    status, body = get(datasets, '/search?division=state&q=ohi')
+
+    assert status == 200
+    assert body['results'] == [{'name': 'Ohio', 'id': '39'}]
+
+
+@pytest.mark.parametrize('target, status', [
+    ('/top', 400),
+    ('/top?division=state&k=-1', 400),
+    ('/top?division=state&k=many', 400),
+    ('/top?division=state&k=%s' % (query_server.MAX_RESULTS + 1), 400),
+    ('/top?division=state&offset=4', 400),
+    ('/top?division=state&sort=name', 400),
+    ('/top?division=state&sort=projected-pop', 400),
+    ('/top?division=state&sort=projected-pop&year=1999', 400),
+    ('/top?division=state&model=quadratic', 400),
+    ('/search?division=state', 400),
+    ('/projection?division=state&id=48&first_year=2030&last_year=2029', 400),
+    ('/top?division=galaxy', 404),
+    ('/projection?division=state&id=99', 404),
+    ('/projection?division=state&name=texas', 404),
+    ('/projection?division=state', 400),
+    ('/unknown', 404),
+    ('/', 404)])
+def test_errors(datasets, target, status):
+    response_status, body = get(datasets, target)
+
+    assert response_status == status
+    assert body['error']
+
+
+def test_only_get_is_supported(datasets):
+    status, _ = query_server.handle_request(datasets, 'POST', '/top')
+
+    assert status == 405
+
+
+def test_requests_over_a_connection(datasets):
+    async def send_requests():
+        server = await query_server.start_server(datasets, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /top?division=state&k=1 HTTP/1.1\r\n\r\n'
+                     b'GET /top?division=galaxy HTTP/1.1\r\n'
+                     b'Connection: close\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    response = asyncio.run(send_requests())
+
+    assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert b'"Geography Name": "Ohio"' in response
+    assert b'HTTP/1.1 404 Not Found\r\n' in response
@@ -0,0 +1,79 @@
+"""
+Tests that rollups sum the estimates of their groups and that cross_check
+reports every estimate that does not match the reported totals.
+"""
+
+import geography
+import rollups
+
+FIRST_YEAR = 2010
+
+
+def get_table(names, ids, rows):
+    return geography.GeographyTable(
+        names, [pop for pop_ests in rows for pop in pop_ests], len(rows[0]),
+        ids=ids)
+
+
+def get_counties():
+    return get_table(['A County', 'B County', 'C County', 'D County'],
+                     ['01001', '02001', '01003', '04001'],
+                     [[10, 20], [5, 5], [30, 40], [1, 2]])
+
+
+def get_states(texas_pop_ests=(5, 5)):
+    return get_table(['Alabama', 'Texas', 'Maine'], ['01', '02', '03'],
+                     [[40, 60], list(texas_pop_ests), [7, 8]])
+
+
+def test_rollup_by_state_sums_counties():
+    rolled_up = rollups.rollup_by_state(get_counties(), get_states())
+
+    assert rolled_up.ids == ['01', '02', '04']
+    assert rolled_up.names == ['Alabama', 'Texas', '04']
+    assert list(rolled_up.pop_ests) == [40, 60, 5, 5, 1, 2]
+
+
+def test_rollup_by_grouping_leaves_out_ungrouped_rows():
+    grouping = {'01001': 'West', '04001': 'West', '02001': 'East'}
+    rolled_up = rollups.rollup_by_grouping(get_counties(), grouping)
+
+    assert rolled_up.ids == ['East', 'West']
+    assert list(rolled_up.pop_ests) == [5, 5, 11, 22]
+
+
+def test_rollup_of_one_row():
+    rolled_up = rollups.rollup_by_grouping(get_counties(), {'02001': 'X'})
+
+    assert list(rolled_up.pop_ests) == [5, 5]
+
+
+def test_cross_check_of_matching_totals():
+    states = get_table(['Alabama', 'Texas', 'Arizona'], ['01', '02', '04'],
+                       [[40, 60], [5, 5], [1, 2]])
+    rolled_up = rollups.rollup_by_state(get_counties(), states)
+
+    assert rollups.cross_check(rolled_up, states, FIRST_YEAR) == []
+
+
+def test_cross_check_reports_groups_missing_from_either_table():
+    rolled_up = rollups.rollup_by_state(get_counties(), get_states())
+    mismatches = rollups.cross_check(rolled_up, get_states(), FIRST_YEAR)
+
+    assert [(mismatch['Id'], mismatch['Year'],
+             mismatch['Rolled Up Estimate'], mismatch['Reported Estimate'])
+            for mismatch in mismatches] == [
+        ('04', 2010, 1, None), ('04', 2011, 2, None),
+        ('03', 2010, None, 7), ('03', 2011, None, 8)]
+
+
+def test_cross_check_reports_each_mismatched_year():
+    states = get_states(texas_pop_ests=(5, 6))
+    rolled_up = rollups.rollup_by_state(get_counties(), states)
+    mismatches = rollups.cross_check(rolled_up, states, FIRST_YEAR)
+
+    assert mismatches[0] == {'Id': '02', 'Geography Name': 'Texas',
+                             'Year': 2011, 'Rolled Up Estimate': 5,
+                             'Reported Estimate': 6}
+    assert list(mismatches[0]) == ['Id', 'Geography Name', 'Year',
+                                   'Rolled Up Estimate', 'Reported Estimate']
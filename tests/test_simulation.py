@@ -0,0 +1,68 @@
+"""
+Tests that simulated projection bands are reproducible, do not depend on how
+the geographies are sharded or whether NumPy is installed, and that bands too
+large to be stored raise a ProjectionError.
+"""
+
+import geography
+import growth_models
+import pytest
+import simulation
+
+NAMES = ['Fast', 'Slow', 'Shrinking', 'Empty']
+POP_ESTS = [[1000, 1100, 1150, 1300, 1400],
+            [5000, 5010, 5005, 5030, 5040],
+            [800, 790, 770, 760, 700],
+            [300, 0, 0, 0, 250]]
+
+
+def get_table(pop_ests=POP_ESTS):
+    return geography.GeographyTable(
+        NAMES[:len(pop_ests)], [pop for row in pop_ests for pop in row],
+        len(pop_ests[0]))
+
+
+def simulate(monkeypatch, has_numpy, shard_rows=256, pop_ests=POP_ESTS,
+             projected_years=(2019, 2025, 2048)):
+    monkeypatch.setattr(simulation, 'HAS_NUMPY', has_numpy)
+    monkeypatch.setattr(simulation, 'SHARD_ROWS', shard_rows)
+    return list(simulation.simulate_bands(
+        get_table(pop_ests), 2018, list(projected_years), num_draws=101,
+        percentiles=[0, 10, 50, 90, 100], seed=7, max_workers=1))
+
+
+def test_bands_are_ordered_and_reproducible(monkeypatch):
+    bands = simulate(monkeypatch, False)
+
+    assert bands == simulate(monkeypatch, False)
+    assert len(bands) == len(NAMES) * 3 * 5
+    for start in range(0, len(bands), 5):
+        assert bands[start:start + 5] == sorted(bands[start:start + 5])
+    # The fast-growing geography never shrinks, and the one without growth
+    # rates, since some of its estimates are not positive, keeps its most
+    # recent estimate.
+    assert min(bands[:15]) > 1400
+    assert bands[-15:] == [250] * 15
+
+
+def test_bands_do_not_depend_on_sharding(monkeypatch):
+    assert simulate(monkeypatch, False, shard_rows=1) == simulate(
+        monkeypatch, False)
+
+
+def test_numpy_bands_equal_list_bands(monkeypatch):
+    pytest.importorskip('numpy')
+
+    assert simulate(monkeypatch, True) == simulate(monkeypatch, False)
+
+
+@pytest.mark.parametrize('has_numpy', [False, True])
+def test_bands_too_large_to_store_raise_projection_error(monkeypatch,
+                                                         has_numpy):
+    if has_numpy:
+        pytest.importorskip('numpy')
+
+    with pytest.raises(growth_models.ProjectionError):
+        simulate(monkeypatch, has_numpy,
+                 pop_ests=[[10, 10**3, 10**5, 10**7, 10**9]],
+                 projected_years=[2118])
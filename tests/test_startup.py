@@ -0,0 +1,31 @@
+"""
+Tests that the text-based user interface and the batch exports start quickly
+and leave the modules that only some commands need to be imported on first use.
+"""
+
+import benchmarks
+import os
+import pytest
+import subprocess
+import sys
+
+
+@pytest.mark.parametrize('module_name', list(benchmarks.IMPORT_TIME_BUDGETS))
+def test_import_time_is_within_budget(module_name):
+    # The import time is compared with that of a module of the standard
+    # library rather than a number of seconds, which depends on the machine.
+    result = benchmarks.benchmark_import_time(module_name, 5)
+
+    assert (result['baseline_ratio'] <=
+            benchmarks.IMPORT_TIME_BUDGETS[module_name])
+
+
+@pytest.mark.parametrize('module_name', list(benchmarks.IMPORT_TIME_BUDGETS))
+def test_deferred_modules_are_not_imported(module_name):
+    code = 'import sys, %s; print("\\n".join(sys.modules))' % (module_name)
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=os.path.dirname(os.path.abspath(benchmarks.__file__)), check=True,
+        stdout=subprocess.PIPE, text=True).stdout
+
+    assert set(output.split()).isdisjoint(benchmarks.DEFERRED_MODULES)
@@ -0,0 +1,20 @@
+"""
+Tests that streaming a CSV file through the ingest and export pipeline uses
+about the same peak memory whatever the size of the file.
+"""
+
+import benchmarks
+import os
+import synthetic_data
+
+
+def test_streaming_peak_memory_does_not_grow_with_input_size(tmp_path):
+    peaks = []
+    for num_rows in [1000, 50000]:
+        csv_file = os.path.join(str(tmp_path), '%s.csv' % (num_rows))
+        synthetic_data.write_synthetic_pep_csv(csv_file, num_rows)
+        peaks.append(benchmarks.benchmark_streaming_memory(
+            csv_file, os.path.join(str(tmp_path), 'export.csv')))
+
+    assert max(peaks) / float(min(peaks)) <= \
+        benchmarks.MAX_STREAMING_MEMORY_RATIO